@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import Dict, Any
@@ -8,6 +8,11 @@ from app.db.database import get_db
 from app.db import models
 from app.api.deps import get_current_user, RoleChecker
 from app.core.cache import cache
+from app.core.metrics import decision_metrics
+from app.services.explanation_cache import explanation_cache
+from app.services.analysis_store import analysis_store
+from app.services.background_removal import bg_engine
+from app.services.tasks import reanalyze_stale_analyses
 from app.core.celery_app import celery_app
 from celery.result import AsyncResult
 from app.schemas import schemas
@@ -74,12 +79,48 @@ def get_metrics(
             "total_users": total_users,
             "total_items": total_items,
             "items_by_status": dict(items_by_status),
-            "cache_enabled": True # Config check could be added here
+            "cache_enabled": True, # Config check could be added here
+            "cache": cache.stats(),
+            "explanation_cache": explanation_cache.stats(),
+            "deduplication": decision_metrics.rates("deduplication", ("exact", "near")),
+            "analysis_store": analysis_store.stats(db)
         }
     except Exception as e:
         logger.error(f"Failed to fetch metrics: {e}")
         raise HTTPException(status_code=500, detail="Could not retrieve system metrics")
 
+@router.get("/decision-metrics", response_model=Dict[str, Any])
+def get_decision_metrics(
+    reset: bool = False,
+    current_user: models.User = Depends(get_current_user),
+    is_admin=Depends(RoleChecker([models.UserRole.ADMIN]))
+):
+    """
+    Aggregated decision counters, score histograms and sampled full breakdowns.
+    Pass reset=true to clear the aggregates after reading them.
+    """
+    snapshot = decision_metrics.snapshot()
+    if reset:
+        decision_metrics.reset()
+    return snapshot
+
+@router.post("/analyses/reanalyze", response_model=Dict[str, Any])
+def reanalyze_stored_analyses(
+    background_tasks: BackgroundTasks,
+    limit: int = 500,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    is_admin=Depends(RoleChecker([models.UserRole.ADMIN]))
+):
+    """
+    Re-run the AI pipeline for up to `limit` stored analyses made with an older
+    AI_PIPELINE_VERSION, in the background. Items using them are updated in place.
+    """
+    stats = analysis_store.stats(db)
+    if stats["stale"]:
+        background_tasks.add_task(reanalyze_stale_analyses, limit)
+    return {"pipeline_version": stats["pipeline_version"], "queued": min(stats["stale"], limit)}
+
 @router.get("/tasks/{task_id}", response_model=Dict[str, Any])
 def inspect_task(
     task_id: str,
@@ -127,11 +168,18 @@ def readiness_check(db: Session = Depends(get_db)):
         redis_ok = "DOWN"
         status = "DEGRADED"
 
+    # Uploads need the background removal model; a cold (lazy) model is not a failure
+    bg_state = bg_engine.state
+    if bg_state in ("WARMING", "FAILED"):
+        status = "DEGRADED"
+
     return {
         "status": status,
         "database": db_ok,
         "redis": redis_ok,
-        "worker": worker_ok
+        "worker": worker_ok,
+        "background_removal": bg_state,
+        "background_removal_model": bg_engine.model_name
     }
 
 @router.get("/version", response_model=schemas.VersionResponse, tags=["Operations"])
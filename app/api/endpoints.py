@@ -1,23 +1,32 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, BackgroundTasks
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime, date as py_date
 import shutil
 import os
 import uuid
+import json
+import asyncio
+from concurrent.futures import TimeoutError as FuturesTimeout
 
 from app.db.database import get_db
 from app.db import models
 from app.schemas import schemas
 from app.services.ai_service import analyze_image
 from app.services.weather_service import weather_service
-from app.services.calendar_service import calendar_service
+from app.services.calendar_service import calendar_service, calendar_client, CalendarTimeout
+from app.services.analysis_store import analysis_store
+from app.services.calendar_store import calendar_event_store
+from app.services.outfit_planner import outfit_planner
 from app.services.recommendation_engine import recommendation_engine
-from app.services.tasks import process_clothing_ai
+from app.services.tasks import process_clothing_ai, process_clothing_batch
 from app.core.celery_app import celery_app
 from celery.result import AsyncResult
 from app.core.config import settings
+from app.core.geo import geohash_encode
+from app.core.image_hash import dhash, perceptual_hash_columns
 from app.api.deps import get_current_user, RoleChecker
 from app.core.logging_config import setup_logging, request_id_ctx
 
@@ -146,7 +155,7 @@ async def upload_clothing_item(
 ):
     """
     1. Save uploaded file
-    2. Create pending DB record (with SHA256 hash)
+    2. Create pending DB record (with SHA256 and perceptual hashes)
     3. Offload AI processing to Celery
     4. Return task_id and item_id
     """
@@ -182,7 +191,8 @@ async def upload_clothing_item(
         original_image_path=file_path,
         user_id=current_user.id,
         image_hash=image_hash,
-        status="QUEUED"
+        status="QUEUED",
+        **perceptual_hash_columns(await run_in_threadpool(dhash, content))  # Image decode, keep off the event loop
     )
     db.add(db_item)
     db.commit()
@@ -202,6 +212,70 @@ async def upload_clothing_item(
         status="QUEUED"
     )
 
+@router.post("/items/upload/batch", response_model=schemas.BatchUploadResponse, tags=["Clothing"], dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def upload_clothing_items_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Bulk upload (e.g. onboarding a whole closet): same as /items/upload for each file, but all
+    new items are analyzed by one batched background job. Each item keeps its own task_id.
+    """
+    rid = request_id_ctx.get()
+    if len(files) > settings.AI_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Tối đa {settings.AI_BATCH_MAX_FILES} ảnh mỗi lần tải lên")
+
+    import hashlib
+    responses, new_items, seen = [], [], {}
+    for file in files:
+        content = await file.read()
+        image_hash = hashlib.sha256(content).hexdigest()
+
+        # Idempotency, also across files of this request
+        existing_item = seen.get(image_hash) or db.query(models.ClothingItem).filter(
+            models.ClothingItem.image_hash == image_hash,
+            models.ClothingItem.user_id == current_user.id
+        ).first()
+        if existing_item:
+            responses.append(schemas.AsyncUploadResponse(
+                item_id=existing_item.id,
+                task_id=existing_item.task_id or "ALREADY_PROCESSED",
+                status=existing_item.status
+            ))
+            continue
+
+        file_ext = file.filename.split(".")[-1]
+        file_path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4()}.{file_ext}")
+        with open(file_path, "wb") as buffer:
+            buffer.write(content)
+
+        db_item = models.ClothingItem(
+            original_image_path=file_path,
+            user_id=current_user.id,
+            image_hash=image_hash,
+            status="QUEUED"
+        )
+        db.add(db_item)
+        db.flush()
+        db_item.task_id = f"bg_{db_item.id}_{uuid.uuid4().hex[:8]}"
+        seen[image_hash] = db_item
+        new_items.append((db_item, content))
+        responses.append(schemas.AsyncUploadResponse(item_id=db_item.id, task_id=db_item.task_id, status="QUEUED"))
+
+    # Perceptual hashes decode every image: run them concurrently on the threadpool, off the event loop
+    phashes = await asyncio.gather(*(run_in_threadpool(dhash, content) for _, content in new_items))
+    for (db_item, _), phash in zip(new_items, phashes):
+        for column, value in perceptual_hash_columns(phash).items():
+            setattr(db_item, column, value)
+    db.commit()
+
+    if new_items:
+        background_tasks.add_task(process_clothing_batch, [item.id for item, _ in new_items], request_id=rid)
+    logger.info(f"Batch upload for user {current_user.id}: {len(files)} files, {len(new_items)} queued")
+    return schemas.BatchUploadResponse(items=responses, queued=len(new_items))
+
 @router.get("/items/task/{task_id}", response_model=schemas.TaskStatusResponse, tags=["AI"])
 async def get_task_status(task_id: str, db: Session = Depends(get_db)):
     if task_id == "SYNC_PROCESSED":
@@ -261,28 +335,48 @@ async def get_task_status(task_id: str, db: Session = Depends(get_db)):
         retryable=retryable
     )
 
-@router.post("/recommend", response_model=schemas.RecommendationResponse, tags=["Recommendation"], dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def get_recommendations(
-    req: schemas.RecommendationRequest, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    user_id = current_user.id
-    
+def _calendar_result(future, default=(None, None)):
+    """Result of a submitted calendar call; a slow or failing Google API yields `default`."""
+    try:
+        return future.result(timeout=settings.CALENDAR_TIMEOUT_SECONDS)
+    except FuturesTimeout:
+        logger.warning(f"Calendar lookup exceeded {settings.CALENDAR_TIMEOUT_SECONDS}s. Using local events.")
+    except Exception as e:
+        logger.error(f"Calendar lookup failed: {e}")
+    return default
+
+def _resolve_recommendation_context(req: schemas.RecommendationRequest, db: Session, current_user: models.User):
+    """Returns (strategy, weather, occasion, event_context, real_event_name) for a recommendation request."""
     # If version says 1.2.x, user might have ghost processes.
     # Logic is now ultra-permissive for the minimalist UI.
     actual_strategy = schemas.RecommendationStrategy.CONTEXT_AWARE
     if str(req.strategy).upper() == "BASELINE":
         actual_strategy = schemas.RecommendationStrategy.BASELINE
 
+    # Start the calendar sync (if the local mirror is stale) first so its round trip overlaps the weather fetch
+    sync_future = None
+    if current_user.google_token and (req.selected_event_id or not req.force_occasion):
+        due, sync_token = calendar_event_store.sync_due(db, current_user)
+        if due:
+            sync_future = calendar_client.submit(calendar_event_store.pull, current_user.google_token, sync_token)
+
     weather = weather_service.get_current_weather(req.lat, req.lon)
+    outfit_planner.touch(db, current_user, geohash_encode(req.lat, req.lon, settings.WEATHER_GEOHASH_PRECISION))
     real_event_name = None  # Only set when an actual calendar event is selected
 
+    if sync_future is not None:
+        calendar_event_store.save(db, current_user, _calendar_result(sync_future, default=None))
+
     if req.selected_event_id and current_user.google_token:
-        event_info, new_token = calendar_service.get_event_by_id(current_user.google_token, req.selected_event_id)
-        if new_token:
-            current_user.google_token = new_token
-            db.commit()
+        event = calendar_event_store.get_event(db, current_user.id, req.selected_event_id)
+        if event is None:
+            # Not mirrored yet: ask Google directly and keep the answer
+            event, new_token = _calendar_result(calendar_client.submit(calendar_service.fetch_event, current_user.google_token, req.selected_event_id))
+            if new_token:
+                current_user.google_token = new_token
+                db.commit()
+            calendar_event_store.apply(db, current_user.id, event)
+        event_info = calendar_service.format_event_detail(event) if event else None
 
         if event_info:
             occasion = event_info['occasion']
@@ -301,11 +395,7 @@ def get_recommendations(
         # real_event_name stays None - user picked occasion manually, not a specific event
     else:
         if current_user.google_token:
-            cal_info, new_token = calendar_service.get_current_occasion_from_calendar(current_user.google_token)
-            if new_token:
-                current_user.google_token = new_token
-                db.commit()
-
+            cal_info = calendar_event_store.get_current_occasion(db, current_user.id)
             if cal_info:
                 occasion = cal_info["occasion"]
                 event_context = cal_info["summary"]
@@ -317,14 +407,9 @@ def get_recommendations(
             occasion = models.OccasionEnum.CASUAL
             event_context = "Thuong ngay"
 
-    outfits_data = recommendation_engine.recommend(
-        db, user_id, weather, occasion,
-        strategy=actual_strategy,
-        decision_layer_enabled=req.decision_layer_enabled,
-        context_override=req.context_override,
-        event_name=real_event_name  # None when no real calendar event selected
-    )
-    
+    return actual_strategy, weather, occasion, event_context, real_event_name
+
+def _build_outfit_responses(outfits_data) -> List[schemas.OutfitResponse]:
     outfits_pydantic = []
     for outfit in outfits_data:
         items_pydantic = []
@@ -355,33 +440,96 @@ def get_recommendations(
             reason=outfit.get("reason"),
             decision_status=outfit.get("decision_status", "CONFIRMED")
         ))
+    return outfits_pydantic
+
+@router.post("/recommend", response_model=schemas.RecommendationResponse, tags=["Recommendation"], dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+def get_recommendations(
+    req: schemas.RecommendationRequest, 
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    user_id = current_user.id
+    actual_strategy, weather, occasion, event_context, real_event_name = _resolve_recommendation_context(req, db, current_user)
+
+    outfits_data = recommendation_engine.recommend(
+        db, user_id, weather, occasion,
+        strategy=actual_strategy,
+        decision_layer_enabled=req.decision_layer_enabled,
+        context_override=req.context_override,
+        event_name=real_event_name  # None when no real calendar event selected
+    )
         
     return schemas.RecommendationResponse(
-        outfits=outfits_pydantic,
+        outfits=_build_outfit_responses(outfits_data),
+        weather_summary=f"{weather['temp']}°C, {weather['condition']}",
+        occasion_context=event_context,
+        strategy_used=req.strategy,
+        decision_layer_status=req.decision_layer_enabled
+    )
+
+@router.post("/recommend/stream", tags=["Recommendation"], dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+def stream_recommendations(
+    req: schemas.RecommendationRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    NDJSON variant of /recommend. The first line carries the ranked outfits with deterministic
+    reasons (same shape as RecommendationResponse, type "outfits"); each Stylist AI explanation
+    then follows as {"type": "reason", "index", "reason"} as soon as it arrives, and a final
+    {"type": "done"} line closes the stream.
+    """
+    user_id = current_user.id
+    actual_strategy, weather, occasion, event_context, real_event_name = _resolve_recommendation_context(req, db, current_user)
+
+    outfits_data = recommendation_engine.recommend(
+        db, user_id, weather, occasion,
+        strategy=actual_strategy,
+        decision_layer_enabled=req.decision_layer_enabled,
+        context_override=req.context_override,
+        event_name=real_event_name,
+        explain=False
+    )
+    first = schemas.RecommendationResponse(
+        outfits=_build_outfit_responses(outfits_data),
         weather_summary=f"{weather['temp']}°C, {weather['condition']}",
         occasion_context=event_context,
         strategy_used=req.strategy,
         decision_layer_status=req.decision_layer_enabled
     )
 
+    def ndjson():
+        yield json.dumps({"type": "outfits", **first.model_dump(mode="json")}, ensure_ascii=False) + "\n"
+        for index, reason in recommendation_engine.stream_explanations(
+                user_id, outfits_data, weather, occasion,
+                strategy=actual_strategy, context_override=req.context_override, event_name=real_event_name):
+            yield json.dumps({"type": "reason", "index": index, "reason": reason}, ensure_ascii=False) + "\n"
+        yield json.dumps({"type": "done"}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @router.delete("/items/{item_id}", response_model=schemas.MessageResponse, tags=["Clothing"])
 def delete_item(item_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     item = db.query(models.ClothingItem).filter(models.ClothingItem.id == item_id).first()
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    for path_attr in ["original_image_path", "processed_image_path"]:
-        rel_path = getattr(item, path_attr)
-        if rel_path:
-            abs_path = os.path.abspath(rel_path)
-            try:
-                if os.path.exists(abs_path):
-                    os.remove(abs_path)
-            except Exception as e:
-                print(f"Error deleting file {abs_path}: {e}")
-
+    rel_path = item.original_image_path
+    if rel_path:
+        abs_path = os.path.abspath(rel_path)
+        try:
+            if os.path.exists(abs_path):
+                os.remove(abs_path)
+        except Exception as e:
+            print(f"Error deleting file {abs_path}: {e}")
+
+    owner_id = item.user_id
+    processed_path = item.processed_image_path
     db.delete(item)
     db.commit()
+    # Processed cutouts can be shared with other items and the analysis store
+    analysis_store.release_file(db, processed_path)
+    recommendation_engine.bump_wardrobe_version(owner_id)
     return {"message": "Món đồ đã được xóa thành công"}
 
 @router.delete("/items/all", response_model=schemas.MessageResponse, tags=["Clothing"])
@@ -389,18 +537,22 @@ def delete_all_items(db: Session = Depends(get_db), current_user: models.User =
     user_id = current_user.id
     items = db.query(models.ClothingItem).filter(models.ClothingItem.user_id == user_id).all()
     
+    processed_paths = set()
     for item in items:
-        for path_attr in ["original_image_path", "processed_image_path"]:
-            rel_path = getattr(item, path_attr)
-            if rel_path:
-                abs_path = os.path.abspath(rel_path)
-                try:
-                    if os.path.exists(abs_path):
-                        os.remove(abs_path)
-                except: pass
+        rel_path = item.original_image_path
+        if rel_path:
+            abs_path = os.path.abspath(rel_path)
+            try:
+                if os.path.exists(abs_path):
+                    os.remove(abs_path)
+            except: pass
+        processed_paths.add(item.processed_image_path)
         db.delete(item)
     
     db.commit()
+    for path in processed_paths:
+        analysis_store.release_file(db, path)
+    recommendation_engine.bump_wardrobe_version(user_id)
     return {"message": "Đã dọn dẹp toàn bộ tủ đồ cá nhân"}
 
 @router.get("/calendar/login", tags=["Calendar"])
@@ -422,10 +574,10 @@ async def calendar_callback(code: str, db: Session = Depends(get_db)):
     try:
         redirect_uri = "http://localhost:8000/api/v1/calendar/callback"
         flow = calendar_service.get_calendar_flow(redirect_uri)
-        flow.fetch_token(code=code)
+        await calendar_client.run(flow.fetch_token, code=code)
         creds = flow.credentials
         token_json = creds.to_json()
-        user_info = calendar_service.get_user_info(creds)
+        user_info = await calendar_client.run(calendar_service.get_user_info, creds)
         email = user_info.get('email')
         if not email:
             raise HTTPException(status_code=400, detail="Google không trả về Email.")
@@ -451,11 +603,11 @@ async def get_upcoming_events(current_user: models.User = Depends(get_current_us
         return {"connected": False, "events": []}
     
     try:
-        events, new_token = calendar_service.get_upcoming_events_summary(current_user.google_token)
-        if new_token:
-            current_user.google_token = new_token
-            db.commit()
+        await calendar_event_store.refresh(db, current_user)
+        events = calendar_event_store.get_upcoming_events_summary(db, current_user.id)
         return {"connected": True, "events": events}
+    except CalendarTimeout:
+        raise
     except Exception as e:
         logger.error(f"Error fetching upcoming events: {e}")
         raise HTTPException(status_code=500, detail="Không thể tải danh sách sự kiện")
@@ -469,10 +621,8 @@ async def get_daily_events(date: str, current_user: models.User = Depends(get_cu
     
     try:
         target_date = py_date.fromisoformat(date) if isinstance(date, str) else date
-        events, new_token = calendar_service.get_events_for_day(current_user.google_token, target_date)
-        if new_token:
-            current_user.google_token = new_token
-            db.commit()
+        await calendar_event_store.refresh(db, current_user)
+        events = calendar_event_store.get_events_for_day(db, current_user.id, target_date)
         return {"date": date, "events": events}
     except ValueError:
         raise HTTPException(status_code=400, detail="Định dạng ngày không hợp lệ (YYYY-MM-DD)")
@@ -484,11 +634,11 @@ async def get_monthly_events(year: int, month: int, current_user: models.User =
         return {"events": []}
     
     try:
-        events, new_token = calendar_service.get_events_for_month(current_user.google_token, year, month)
-        if new_token:
-            current_user.google_token = new_token
-            db.commit()
+        await calendar_event_store.refresh(db, current_user)
+        events = calendar_event_store.get_events_for_month(db, current_user.id, year, month)
         return {"year": year, "month": month, "events": events}
+    except CalendarTimeout:
+        raise
     except Exception as e:
         logger.error(f"Error fetching monthly events: {e}")
         raise HTTPException(status_code=500, detail="Không thể tải lịch tháng")
@@ -498,14 +648,19 @@ async def get_calendar_event(event_id: str, current_user: models.User = Depends(
     if not current_user.google_token:
         raise HTTPException(status_code=400, detail="Chưa kết nối Google Calendar")
     
-    event, new_token = calendar_service.get_event_by_id(current_user.google_token, event_id)
-    if new_token:
-        current_user.google_token = new_token
-        db.commit()
+    await calendar_event_store.refresh(db, current_user)
+    event = calendar_event_store.get_event(db, current_user.id, event_id)
+    if event is None:
+        # Not mirrored yet: ask Google directly and keep the answer
+        event, new_token = await calendar_client.run(calendar_service.fetch_event, current_user.google_token, event_id)
+        if new_token:
+            current_user.google_token = new_token
+            db.commit()
+        calendar_event_store.apply(db, current_user.id, event)
     
     if not event:
         raise HTTPException(status_code=404, detail="Sự kiện không tồn tại")
-    return event
+    return calendar_service.format_event_detail(event)
 
 
 @router.post("/calendar/events", tags=["Calendar"])
@@ -514,10 +669,11 @@ async def create_calendar_event(event: schemas.CalendarEventBase, current_user:
         raise HTTPException(status_code=400, detail="Chưa kết nối Google Calendar")
     
     event_dict = event.model_dump()
-    created, new_token = calendar_service.create_event(current_user.google_token, event_dict)
+    created, new_token = await calendar_client.create_event(current_user.google_token, event_dict)
     if new_token:
         current_user.google_token = new_token
         db.commit()
+    calendar_event_store.apply(db, current_user.id, created)
     return created
 
 @router.put("/calendar/events/{event_id}", tags=["Calendar"])
@@ -526,10 +682,11 @@ async def update_calendar_event(event_id: str, event: schemas.CalendarEventBase,
         raise HTTPException(status_code=400, detail="Chưa kết nối Google Calendar")
     
     event_dict = event.model_dump()
-    updated, new_token = calendar_service.update_event(current_user.google_token, event_id, event_dict)
+    updated, new_token = await calendar_client.update_event(current_user.google_token, event_id, event_dict)
     if new_token:
         current_user.google_token = new_token
         db.commit()
+    calendar_event_store.apply(db, current_user.id, updated)
     return updated
 
 
@@ -538,10 +695,12 @@ async def delete_calendar_event(event_id: str, current_user: models.User = Depen
     if not current_user.google_token:
         raise HTTPException(status_code=400, detail="Chưa kết nối Google Calendar")
     
-    success, new_token = calendar_service.delete_event(current_user.google_token, event_id)
+    success, new_token = await calendar_client.delete_event(current_user.google_token, event_id)
     if new_token:
         current_user.google_token = new_token
         db.commit()
+    if success:
+        calendar_event_store.remove(db, current_user.id, event_id)
     return {"success": success}
 
 # --- Item Management Enhancements ---
@@ -569,6 +728,7 @@ async def update_item(item_id: int, update_data: schemas.ClothingItemBase, curre
 
     db.commit()
     db.refresh(item)
+    await recommendation_engine.bump_wardrobe_version_async(current_user.id)
     return item
 
 @router.get("/admin/users", response_model=List[schemas.UserResponse], dependencies=[Depends(RoleChecker([models.UserRole.ADMIN]))])
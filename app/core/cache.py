@@ -1,25 +1,171 @@
 import redis
-import json
+import copy
 import logging
-from typing import Any, Optional, Union
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Union
 from app.core.config import settings
+from app.core.serialization import CacheCodec
 
 logger = logging.getLogger("app")
 
+# Envelope marker for values stored by get_or_compute with a stale-while-revalidate window
+SWR_FRESH_UNTIL = "__fresh_until__"
+
+# Compare-and-delete, so a lock that expired and was re-acquired elsewhere is never released by us
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_refresh_pool: Optional[ThreadPoolExecutor] = None
+_refresh_pool_lock = threading.Lock()
+
+
+def _refresh_executor() -> ThreadPoolExecutor:
+    """Shared pool for stale-while-revalidate refreshes (created lazily)."""
+    global _refresh_pool
+    with _refresh_pool_lock:
+        if _refresh_pool is None:
+            _refresh_pool = ThreadPoolExecutor(max_workers=settings.CACHE_REFRESH_WORKERS,
+                                               thread_name_prefix="cache-refresh")
+        return _refresh_pool
+
+class LocalCache:
+    """
+    Bounded in-process cache with per-entry TTL and LRU eviction.
+    Thread-safe; keeps hit/miss/eviction counters for observability.
+    """
+    def __init__(self, max_entries: int = 1024, default_ttl: int = 300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl and ttl > 0 else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        return [self.get(key) for key in keys]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+class CacheOpStats:
+    """Per-operation latency and payload size counters for the Redis backend."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops: Dict[str, Dict[str, float]] = {}
+
+    def record(self, op: str, started: float, nbytes: int = 0, keys: int = 1, error: bool = False):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            stats = self._ops.setdefault(op, {"count": 0, "keys": 0, "errors": 0, "total_ms": 0.0,
+                                              "max_ms": 0.0, "bytes": 0, "max_bytes": 0})
+            stats["count"] += 1
+            stats["keys"] += keys
+            stats["errors"] += error
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["bytes"] += nbytes
+            stats["max_bytes"] = max(stats["max_bytes"], nbytes)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                op: {
+                    **stats,
+                    "total_ms": round(stats["total_ms"], 3),
+                    "max_ms": round(stats["max_ms"], 3),
+                    "avg_ms": round(stats["total_ms"] / stats["count"], 3) if stats["count"] else 0.0,
+                    "avg_bytes": round(stats["bytes"] / stats["count"]) if stats["count"] else 0,
+                }
+                for op, stats in self._ops.items()
+            }
+
 class Cache:
     """
     Centralized caching utility with selective Redis backend.
     If Redis is unavailable or caching is disabled, it fails gracefully.
+
+    A bounded LocalCache tier backs every call: it is the whole store when Redis is down, and an
+    L1 in front of Redis for keys matching CACHE_L1_PREFIXES (hot, read-mostly data like weather).
+    Values go through CacheCodec (pluggable serializer, compression above a size threshold) and
+    are kept encoded locally too, so callers always get a private copy, as with Redis.
+    Per-operation latency and payload sizes are tracked in `op_stats`.
     """
     def __init__(self):
         self.client: Optional[redis.Redis] = None
-        self._memory_cache = {}
+        self.local = LocalCache(max_entries=settings.CACHE_LOCAL_MAX_ENTRIES)
+        self.codec = CacheCodec()
+        self.op_stats = CacheOpStats()
+        self._counters: Dict[str, int] = {}  # Fallback counters, never evicted (see incr)
+        self._sorted_sets: Dict[str, Dict[str, float]] = {}  # Fallback for zadd & co. (same lock)
+        self._counter_lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}  # key -> result of the in-process leader
+        self._refreshing = set()
+        self._flight_lock = threading.Lock()
         if not settings.ENABLE_CACHING:
             logger.info("Caching is globally disabled via settings.")
             return
 
         try:
-            self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+            # Raw bytes: payloads may be binary (msgpack) or compressed
+            self.client = redis.from_url(settings.REDIS_URL, decode_responses=False)
             # Test connection
             self.client.ping()
             logger.info("Cache initialized successfully (Redis backend).")
@@ -31,14 +177,23 @@ class Cache:
         if not settings.ENABLE_CACHING:
             return None
         if not self.client:
-            return self._memory_cache.get(key)
+            return self._local_get(key)
+        if self._use_l1(key):
+            value = self._local_get(key)
+            if value is not None:
+                return value
+        started = time.perf_counter()
         try:
             data = self.client.get(key)
+            self.op_stats.record("get", started, len(data) if data else 0)
             if data:
-                return json.loads(data)
+                if self._use_l1(key):
+                    self.local.set(key, data, ttl=settings.CACHE_L1_TTL_SECONDS)
+                return self.codec.decode(data)
         except Exception as e:
+            self.op_stats.record("get", started, error=True)
             logger.error(f"Cache GET error for key {key}: {e}")
-            return self._memory_cache.get(key)
+            return self._local_get(key)
         return None
 
     def set(self, key: str, value: Any, ttl: int = 300) -> bool:
@@ -46,17 +201,146 @@ class Cache:
         if not settings.ENABLE_CACHING:
             return False
         if not self.client:
-            self._memory_cache[key] = value
-            return True
+            return self.local.set(key, self.codec.encode(value, compress=False), ttl=ttl)
+        started = time.perf_counter()
+        data = self.codec.encode(value)
         try:
-            self.client.setex(key, ttl, json.dumps(value))
+            self.client.setex(key, ttl, data)
+            self.op_stats.record("set", started, len(data))
+            if self._use_l1(key):
+                self.local.set(key, data, ttl=min(ttl, settings.CACHE_L1_TTL_SECONDS))
             return True
         except Exception as e:
+            self.op_stats.record("set", started, error=True)
             logger.error(f"Cache SET error for key {key}: {e}")
-            self._memory_cache[key] = value
+            return self.local.set(key, data, ttl=ttl)
+
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Values for `keys` (None where missing) in one pipelined round trip."""
+        if not settings.ENABLE_CACHING or not keys:
+            return [None] * len(keys)
+        if not self.client:
+            return [self._local_get(key) for key in keys]
+
+        values: List[Optional[Any]] = [None] * len(keys)
+        remote = []
+        for index, key in enumerate(keys):
+            if self._use_l1(key):
+                values[index] = self._local_get(key)
+            if values[index] is None:
+                remote.append(index)
+        if not remote:
+            return values
+
+        started = time.perf_counter()
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for index in remote:
+                pipe.get(keys[index])
+            results = pipe.execute()
+            self.op_stats.record("mget", started, sum(len(d) for d in results if d), keys=len(remote))
+        except Exception as e:
+            self.op_stats.record("mget", started, error=True, keys=len(remote))
+            logger.error(f"Cache MGET error for {len(remote)} keys: {e}")
+            for index in remote:
+                values[index] = self._local_get(keys[index])
+            return values
+
+        for index, data in zip(remote, results):
+            if data:
+                if self._use_l1(keys[index]):
+                    self.local.set(keys[index], data, ttl=settings.CACHE_L1_TTL_SECONDS)
+                values[index] = self.codec.decode(data)
+        return values
+
+    def mset(self, mapping: Dict[str, Any], ttl: int = 300) -> bool:
+        """Set several values with the same TTL in one pipelined round trip."""
+        if not settings.ENABLE_CACHING or not mapping:
+            return False
+        if not self.client:
+            for key, value in mapping.items():
+                self.local.set(key, self.codec.encode(value, compress=False), ttl=ttl)
+            return True
+
+        started = time.perf_counter()
+        encoded = {key: self.codec.encode(value) for key, value in mapping.items()}
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, data in encoded.items():
+                pipe.setex(key, ttl, data)
+            pipe.execute()
+            self.op_stats.record("mset", started, sum(len(d) for d in encoded.values()), keys=len(encoded))
+        except Exception as e:
+            self.op_stats.record("mset", started, error=True, keys=len(encoded))
+            logger.error(f"Cache MSET error for {len(encoded)} keys: {e}")
+            for key, data in encoded.items():
+                self.local.set(key, data, ttl=ttl)
             return True
+        for key, data in encoded.items():
+            if self._use_l1(key):
+                self.local.set(key, data, ttl=min(ttl, settings.CACHE_L1_TTL_SECONDS))
+        return True
+
+    def incr(self, key: str) -> int:
+        """Atomically increment an integer counter (created at 1) and return the new value."""
+        if self.client:
+            try:
+                return int(self.client.incr(key))
+            except Exception as e:
+                logger.error(f"Cache INCR error for key {key}: {e}")
+        # Counters stay out of the LRU tier: evicting one would silently reset it
+        with self._counter_lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key: str) -> int:
+        """Current value of a counter maintained with incr (0 if it was never incremented)."""
+        if self.client:
+            try:
+                return int(self.client.get(key) or 0)
+            except Exception as e:
+                logger.error(f"Cache GET error for key {key}: {e}")
+        with self._counter_lock:
+            return self._counters.get(key, 0)
+
+    def zadd(self, key: str, mapping: Dict[str, float]):
+        """Add members with scores to a sorted set (existing members get the new score)."""
+        if self.client:
+            try:
+                self.client.zadd(key, mapping)
+                return
+            except Exception as e:
+                logger.error(f"Cache ZADD error for key {key}: {e}")
+        with self._counter_lock:
+            self._sorted_sets.setdefault(key, {}).update(mapping)
+
+    def zrangebyscore(self, key: str, min_score: float) -> List[str]:
+        """Members scored >= min_score, lowest score first."""
+        if self.client:
+            try:
+                return [m.decode("utf-8") if isinstance(m, bytes) else m
+                        for m in self.client.zrangebyscore(key, min_score, "+inf")]
+            except Exception as e:
+                logger.error(f"Cache ZRANGEBYSCORE error for key {key}: {e}")
+        with self._counter_lock:
+            members = self._sorted_sets.get(key, {})
+            return [m for m, score in sorted(members.items(), key=lambda kv: kv[1]) if score >= min_score]
+
+    def zremrangebyscore(self, key: str, max_score: float):
+        """Drop members scored <= max_score."""
+        if self.client:
+            try:
+                self.client.zremrangebyscore(key, "-inf", max_score)
+                return
+            except Exception as e:
+                logger.error(f"Cache ZREMRANGEBYSCORE error for key {key}: {e}")
+        with self._counter_lock:
+            members = self._sorted_sets.get(key, {})
+            for member in [m for m, score in members.items() if score <= max_score]:
+                del members[member]
 
     def delete(self, key: str):
+        self.local.delete(key)
         if not self.client:
             return
         try:
@@ -64,5 +348,322 @@ class Cache:
         except Exception as e:
             logger.error(f"Cache DELETE error for key {key}: {e}")
 
-# Global singleton
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: int = 300, stale_ttl: int = 0) -> Any:
+        """
+        Return the cached value for `key`, or run `compute` once and cache its result.
+
+        Concurrent misses are coalesced: one caller per process computes while the others wait for
+        its result, and across processes a Redis `SET NX` lock elects a single computing worker
+        (the rest poll for the value until CACHE_LOCK_TIMEOUT_SECONDS, then compute themselves).
+        With stale_ttl > 0 the value is kept that much longer than `ttl`; in that window it is
+        returned immediately while one background refresh recomputes it.
+        `None` results and exceptions from `compute` are never cached.
+        """
+        if not settings.ENABLE_CACHING:
+            return compute()
+
+        entry = self.get(key)
+        if entry is not None:
+            value, fresh = self._unwrap(entry)
+            if not fresh:
+                self._refresh_in_background(key, compute, ttl, stale_ttl)
+            return value
+
+        return self._single_flight(key, lambda: self._compute_and_store(key, compute, ttl, stale_ttl))
+
+    def mstore(self, mapping: Dict[str, Any], ttl: int = 300, stale_ttl: int = 0) -> bool:
+        """Write values the way get_or_compute stores them (e.g. entries refreshed ahead of expiry)."""
+        return self.mset({key: self._wrap(value, ttl, stale_ttl) for key, value in mapping.items()},
+                         ttl=ttl + stale_ttl)
+
+    @staticmethod
+    def fresh_until(entry: Any) -> Optional[float]:
+        """Epoch time a get_or_compute entry stops being fresh (None if missing or stored without stale_ttl)."""
+        if isinstance(entry, dict) and SWR_FRESH_UNTIL in entry:
+            return entry[SWR_FRESH_UNTIL]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if self.client else "memory",
+            "serializer": self.codec.serializer,
+            "l1_prefixes": list(settings.CACHE_L1_PREFIXES),
+            "local": self.local.stats(),
+            "operations": self.op_stats.snapshot(),
+        }
+
+    def _single_flight(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._flight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            try:
+                # Private copy: the leader's caller may mutate the object it got back
+                return copy.deepcopy(future.result(timeout=settings.CACHE_LOCK_TIMEOUT_SECONDS))
+            except FutureTimeoutError:
+                logger.warning(f"Cache single-flight wait timed out for key {key}")
+                return fn()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._flight_lock:
+                self._inflight.pop(key, None)
+
+    def _compute_and_store(self, key: str, compute: Callable[[], Any], ttl: int, stale_ttl: int,
+                           refresh: bool = False) -> Any:
+        token = self._acquire_lock(key)
+        if token is None:
+            if refresh:
+                return None  # Another worker is already refreshing this key
+            entry = self._wait_for(key)
+            if entry is not None:
+                return self._unwrap(entry)[0]
+            logger.warning(f"Cache lock wait timed out for key {key}; computing anyway")
+        try:
+            if not refresh:
+                # The previous lock holder may have filled the key while we were acquiring
+                entry = self.get(key)
+                if entry is not None:
+                    return self._unwrap(entry)[0]
+            value = compute()
+            if value is not None:
+                self.set(key, self._wrap(value, ttl, stale_ttl), ttl=ttl + stale_ttl)
+            return value
+        finally:
+            self._release_lock(key, token)
+
+    def _refresh_in_background(self, key: str, compute: Callable[[], Any], ttl: int, stale_ttl: int):
+        with self._flight_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._compute_and_store(key, compute, ttl, stale_ttl, refresh=True)
+            except Exception as e:
+                logger.error(f"Cache background refresh failed for key {key}: {e}")
+            finally:
+                with self._flight_lock:
+                    self._refreshing.discard(key)
+
+        _refresh_executor().submit(refresh)
+
+    def _acquire_lock(self, key: str) -> Optional[str]:
+        """Distributed lock token, "local" without Redis (in-process single flight suffices), None if held."""
+        if not self.client:
+            return "local"
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.client.set(f"lock:{key}", token, nx=True,
+                                       px=int(settings.CACHE_LOCK_TIMEOUT_SECONDS * 1000))
+            return token if acquired else None
+        except Exception as e:
+            logger.error(f"Cache LOCK error for key {key}: {e}")
+            return "local"
+
+    def _release_lock(self, key: str, token: Optional[str]):
+        if not self.client or token in (None, "local"):
+            return
+        try:
+            self.client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            logger.error(f"Cache UNLOCK error for key {key}: {e}")
+
+    def _wait_for(self, key: str) -> Optional[Any]:
+        deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(settings.CACHE_LOCK_POLL_SECONDS)
+            entry = self.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+    @staticmethod
+    def _wrap(value: Any, ttl: int, stale_ttl: int) -> Any:
+        if not stale_ttl:
+            return value
+        return {SWR_FRESH_UNTIL: time.time() + ttl, "value": value}
+
+    @staticmethod
+    def _unwrap(entry: Any):
+        """(value, is_fresh) for a stored entry; plain values are always fresh."""
+        if isinstance(entry, dict) and SWR_FRESH_UNTIL in entry:
+            return entry["value"], time.time() < entry[SWR_FRESH_UNTIL]
+        return entry, True
+
+    def _use_l1(self, key: str) -> bool:
+        return key.startswith(tuple(settings.CACHE_L1_PREFIXES))
+
+    def _local_get(self, key: str) -> Optional[Any]:
+        data = self.local.get(key)
+        return self.codec.decode(data) if data is not None else None
+
+class AsyncCache:
+    """
+    asyncio-native counterpart of Cache for `async def` handlers.
+
+    Uses the same keys, codec, local tier and fallback counters as the wrapped sync Cache, so both
+    APIs read each other's values. The redis.asyncio client is bound at startup (main.lifespan)
+    and shares its connection pool with the rate limiter; until then, or if Redis is down, calls
+    are served by the local tier without blocking the event loop.
+    """
+    def __init__(self, sync_cache: Cache):
+        self.sync = sync_cache
+        self.client = None
+
+    async def connect(self, client) -> bool:
+        if not settings.ENABLE_CACHING:
+            return False
+        try:
+            await client.ping()
+            self.client = client
+            logger.info("Async cache bound to shared redis.asyncio pool.")
+            return True
+        except Exception as e:
+            logger.info(f"Async cache unavailable: {e}. Using the in-process tier.")
+            self.client = None
+            return False
+
+    async def get(self, key: str) -> Optional[Any]:
+        if not settings.ENABLE_CACHING:
+            return None
+        sync = self.sync
+        if not self.client:
+            return sync._local_get(key)
+        if sync._use_l1(key):
+            value = sync._local_get(key)
+            if value is not None:
+                return value
+        started = time.perf_counter()
+        try:
+            data = await self.client.get(key)
+            sync.op_stats.record("async_get", started, len(data) if data else 0)
+            if data:
+                if sync._use_l1(key):
+                    sync.local.set(key, data, ttl=settings.CACHE_L1_TTL_SECONDS)
+                return sync.codec.decode(data)
+        except Exception as e:
+            sync.op_stats.record("async_get", started, error=True)
+            logger.error(f"Async cache GET error for key {key}: {e}")
+            return sync._local_get(key)
+        return None
+
+    async def set(self, key: str, value: Any, ttl: int = 300) -> bool:
+        if not settings.ENABLE_CACHING:
+            return False
+        sync = self.sync
+        if not self.client:
+            return sync.local.set(key, sync.codec.encode(value, compress=False), ttl=ttl)
+        started = time.perf_counter()
+        data = sync.codec.encode(value)
+        try:
+            await self.client.setex(key, ttl, data)
+            sync.op_stats.record("async_set", started, len(data))
+            if sync._use_l1(key):
+                sync.local.set(key, data, ttl=min(ttl, settings.CACHE_L1_TTL_SECONDS))
+            return True
+        except Exception as e:
+            sync.op_stats.record("async_set", started, error=True)
+            logger.error(f"Async cache SET error for key {key}: {e}")
+            return sync.local.set(key, data, ttl=ttl)
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        if not settings.ENABLE_CACHING or not keys:
+            return [None] * len(keys)
+        sync = self.sync
+        if not self.client:
+            return [sync._local_get(key) for key in keys]
+
+        # L1 first, like Cache.mget, so both clients see the same tiers
+        values: List[Optional[Any]] = [None] * len(keys)
+        remote = []
+        for index, key in enumerate(keys):
+            if sync._use_l1(key):
+                values[index] = sync._local_get(key)
+            if values[index] is None:
+                remote.append(index)
+        if not remote:
+            return values
+
+        started = time.perf_counter()
+        try:
+            results = await self.client.mget([keys[index] for index in remote])
+            sync.op_stats.record("async_mget", started, sum(len(d) for d in results if d), keys=len(remote))
+        except Exception as e:
+            sync.op_stats.record("async_mget", started, error=True, keys=len(remote))
+            logger.error(f"Async cache MGET error for {len(remote)} keys: {e}")
+            for index in remote:
+                values[index] = sync._local_get(keys[index])
+            return values
+
+        for index, data in zip(remote, results):
+            if data:
+                if sync._use_l1(keys[index]):
+                    sync.local.set(keys[index], data, ttl=settings.CACHE_L1_TTL_SECONDS)
+                values[index] = sync.codec.decode(data)
+        return values
+
+    async def mset(self, mapping: Dict[str, Any], ttl: int = 300) -> bool:
+        if not settings.ENABLE_CACHING or not mapping:
+            return False
+        sync = self.sync
+        if not self.client:
+            for key, value in mapping.items():
+                sync.local.set(key, sync.codec.encode(value, compress=False), ttl=ttl)
+            return True
+        started = time.perf_counter()
+        encoded = {key: sync.codec.encode(value) for key, value in mapping.items()}
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, data in encoded.items():
+                    pipe.setex(key, ttl, data)
+                await pipe.execute()
+            sync.op_stats.record("async_mset", started, sum(len(d) for d in encoded.values()), keys=len(encoded))
+        except Exception as e:
+            sync.op_stats.record("async_mset", started, error=True, keys=len(encoded))
+            logger.error(f"Async cache MSET error for {len(encoded)} keys: {e}")
+            for key, data in encoded.items():
+                sync.local.set(key, data, ttl=ttl)
+        return True
+
+    async def incr(self, key: str) -> int:
+        if self.client:
+            try:
+                return int(await self.client.incr(key))
+            except Exception as e:
+                logger.error(f"Async cache INCR error for key {key}: {e}")
+        with self.sync._counter_lock:
+            self.sync._counters[key] = self.sync._counters.get(key, 0) + 1
+            return self.sync._counters[key]
+
+    async def get_counter(self, key: str) -> int:
+        if self.client:
+            try:
+                return int(await self.client.get(key) or 0)
+            except Exception as e:
+                logger.error(f"Async cache GET error for key {key}: {e}")
+        with self.sync._counter_lock:
+            return self.sync._counters.get(key, 0)
+
+    async def delete(self, key: str):
+        self.sync.local.delete(key)
+        if not self.client:
+            return
+        try:
+            await self.client.delete(key)
+        except Exception as e:
+            logger.error(f"Async cache DELETE error for key {key}: {e}")
+
+# Global singletons
 cache = Cache()
+async_cache = AsyncCache(cache)
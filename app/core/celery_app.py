@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.schedules import crontab
 from celery.signals import setup_logging, task_prerun, task_postrun
 from app.core.config import settings
 from app.core.logging_config import setup_logging as app_setup_logging, task_id_ctx, request_id_ctx
@@ -8,11 +9,28 @@ import logging
 celery_app = Celery(
     "outfit_ai",
     broker=settings.CELERY_BROKER_URL,
-    backend=settings.CELERY_RESULT_BACKEND
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=["app.services.periodic_tasks"]
 )
 
 celery_app.conf.task_routes = {
-    "process_clothing_ai": {"queue": "default"}
+    "process_clothing_ai": {"queue": "default"},
+    "prefetch_weather": {"queue": "default"},
+    "plan_next_day_outfits": {"queue": "default"},
+    "plan_user_outfits": {"queue": "default"}
+}
+
+# Periodic jobs (run `celery -A app.core.celery_app beat` next to the worker)
+celery_app.conf.beat_schedule = {
+    "prefetch-weather": {
+        "task": "prefetch_weather",
+        "schedule": settings.WEATHER_PREFETCH_INTERVAL_SECONDS,
+        "options": {"expires": settings.WEATHER_PREFETCH_INTERVAL_SECONDS},
+    },
+    "plan-next-day-outfits": {
+        "task": "plan_next_day_outfits",
+        "schedule": crontab(hour=settings.OUTFIT_PLAN_HOUR_UTC, minute=0),
+    },
 }
 
 # --- Celery Logging Strategy ---
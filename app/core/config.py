@@ -25,11 +25,96 @@ class Settings(BaseSettings):
     # Redis for Rate Limiting & Caching
     REDIS_URL: str = "redis://localhost:6379/0"
     ENABLE_CACHING: bool = True
+    CACHE_LOCAL_MAX_ENTRIES: int = 4096  # In-process tier (Redis fallback + L1)
+    CACHE_L1_PREFIXES: list[str] = ["weather:"]  # Keys also served from the in-process tier
+    CACHE_L1_TTL_SECONDS: int = 30  # Bounds cross-process staleness of L1 entries
+    CACHE_LOCK_TIMEOUT_SECONDS: float = 10.0  # get_or_compute: lock lease and max wait for another computer
+    CACHE_LOCK_POLL_SECONDS: float = 0.05
+    CACHE_REFRESH_WORKERS: int = 4  # Background stale-while-revalidate refreshes
+    CACHE_SERIALIZER: str = "json"  # json | orjson | msgpack (optional packages, json if missing)
+    CACHE_COMPRESS_MIN_BYTES: int = 1024  # zlib-compress larger payloads (0 disables)
+    CACHE_COMPRESS_LEVEL: int = 3
+    
+    # Recommendation scoring backend: "search" (branch-and-bound) | "vectorized" (NumPy)
+    RECOMMENDATION_BACKEND: str = "search"
+    VECTORIZED_MAX_COMBINATIONS: int = 2_000_000  # Larger wardrobes fall back to "search"
+    RECOMMENDATION_CACHE_TTL: int = 86400  # Keys carry the wardrobe version, so edits never serve stale outfits
+    
+    # Decision metrics: fraction of events whose full breakdown is kept for /admin/decision-metrics
+    DECISION_METRICS_SAMPLE_RATE: float = 0.01
+    DECISION_METRICS_MAX_SAMPLES: int = 100
+    
+    # Background removal (rembg): u2net (best) | silueta (u2net quality, smaller) | u2netp (fastest, rougher edges)
+    BG_MODEL: str = "u2net"
+    BG_INTRA_OP_THREADS: int = 2  # ONNX Runtime threads per inference (0 = all cores)
+    BG_INTER_OP_THREADS: int = 1  # Parallel graph branches (the U-2-Net graph is mostly sequential)
+    BG_WARMUP_ON_STARTUP: bool = True  # Load the model and run one inference when the API starts
+    
+    # Shared analysis store: bump after changing models or prompts; older analyses are re-run (BG_MODEL is included)
+    AI_PIPELINE_VERSION: str = "1"
+    
+    # Upload deduplication: max differing dHash bits for a near-duplicate (<= 3, the bands index finds all within 3)
+    NEAR_DUPLICATE_MAX_DISTANCE: int = 3
+    
+    # Color extraction
+    COLOR_PALETTE_SIZE: int = 5  # Colors kept per item (with coverage) in raw_model_output["palette"]
+    COLOR_MERGE_DISTANCE: float = 40.0  # RGB distance under which histogram bins count as one color
+    
+    # Bulk ingestion (/items/upload/batch)
+    AI_BATCH_MAX_FILES: int = 100  # Images per batch upload request
+    AI_INGEST_CHUNK_SIZE: int = 16  # Items analyzed and saved together by the batch worker
+    AI_BG_BATCH_SIZE: int = 8  # Images per stacked U-2-Net inference
+    AI_CLASSIFY_BATCH_SIZE: int = 8  # Images per multi-image vision prompt
+    AI_ENHANCE_BATCH_SIZE: int = 16  # Items per DeepSeek enhancement call
+    AI_BATCH_TIMEOUT_SECONDS: float = 30.0  # Cap of a batched LLM call (grows with batch size)
     
     # External APIs
     OPENWEATHER_API_KEY: str = "your_openweather_api_key_here"
+    WEATHER_CACHE_TTL_SECONDS: int = 1200
+    WEATHER_STALE_TTL_SECONDS: int = 600  # Serve expired forecasts this long while refreshing
+    WEATHER_GEOHASH_PRECISION: int = 5  # Forecast cache cell (~4.9 km); nearby requests share an entry
+    GEOCODE_GEOHASH_PRECISION: int = 5  # Reverse-geocode cache cell
+    GEOCODE_CACHE_TTL_SECONDS: int = 30 * 86400  # City names rarely change
+    WEATHER_DEADLINE_SECONDS: float = 5.0  # Overall budget for one forecast fetch on a cache miss
+    WEATHER_GEOCODE_TIMEOUT_SECONDS: float = 3.0
+    WEATHER_GEOCODE_GRACE_SECONDS: float = 0.1  # Max wait for the geocoder once the forecast is in
+    WEATHER_GEOCODE_WORKERS: int = 4
+    WEATHER_HTTP_POOL_SIZE: int = 10  # Keep-alive connections per upstream host
+    WEATHER_ACTIVE_WINDOW_SECONDS: int = 3600  # Cells requested this recently are prefetched
+    WEATHER_PREFETCH_INTERVAL_SECONDS: int = 300  # Celery beat period of prefetch_weather
+    WEATHER_PREFETCH_LEAD_SECONDS: int = 420  # Refresh entries going stale within this (> interval)
+    WEATHER_PREFETCH_BATCH_SIZE: int = 50  # Locations per Open-Meteo call
+    OUTFIT_PLAN_ENABLED: bool = True  # Serve /recommend from nightly precomputed plans when they match
+    OUTFIT_PLAN_TIMEZONE: str = "Asia/Ho_Chi_Minh"  # Defines "tomorrow" for plans and calendar days
+    OUTFIT_PLAN_HOUR_UTC: int = 15  # Celery beat hour of the nightly run (22:00 in Asia/Ho_Chi_Minh)
+    OUTFIT_PLAN_OCCASIONS: list[str] = ["casual", "formal", "sport"]  # Planned even without calendar events
+    OUTFIT_PLAN_ACTIVE_DAYS: int = 14  # Only users who asked for outfits this recently are planned
+    OUTFIT_PLAN_TEMP_TOLERANCE: float = 4.0  # Max forecast vs actual difference (°C) to serve a plan
+    OUTFIT_PLAN_TASK_TIME_LIMIT: int = 300  # Per-user planning task (scoring + LLM reasons)
+    GOOGLE_CALENDAR_API_ENDPOINT: str = ""  # Override Google's endpoint (e.g. a local fake server)
+    CALENDAR_MAX_WORKERS: int = 8  # Thread pool for blocking Google Calendar calls
+    CALENDAR_TIMEOUT_SECONDS: float = 8.0  # Per call, as awaited by async handlers
+    CALENDAR_HTTP_TIMEOUT_SECONDS: float = 6.0  # Socket timeout of the Google API client
+    CALENDAR_SERVICE_CACHE_SIZE: int = 512  # Built Google services kept per token fingerprint
+    CALENDAR_SERVICE_CACHE_TTL: int = 3600
+    CALENDAR_SYNC_INTERVAL_SECONDS: int = 60  # Min age of a user's local event mirror before it is re-synced
+    # Event summary keywords per occasion, checked in order (diacritics optional, matched at word start)
+    OCCASION_KEYWORDS: dict[str, list[str]] = {
+        "sport": ["gym", "sport", "chạy", "đá bóng", "yoga", "tập"],
+        "formal": ["meeting", "họp", "office", "công ty", "làm việc", "phỏng vấn", "đối tác"],
+        "casual": ["party", "tiệc", "wedding", "cưới", "đi chơi", "date", "hẹn hò"],
+    }
+    OCCASION_MEMO_SIZE: int = 8192  # Classified events kept per (event id, etag)
     DEEPSEEK_API_KEY: str = ""
     
+    # LLM outfit explanations: "parallel" (one call per outfit) | "batched" (one call for all)
+    EXPLANATION_MODE: str = "parallel"
+    EXPLANATION_DEADLINE_SECONDS: float = 6.0  # Shared budget for all explanations of one request
+    EXPLANATION_MAX_WORKERS: int = 8
+    EXPLANATION_CACHE_TTL: int = 604800          # 7 days; texts only depend on the cache key
+    EXPLANATION_CACHE_LOCAL_SIZE: int = 2048     # In-process LRU tier entries
+    EXPLANATION_CACHE_SCORE_BUCKET: int = 5      # Suitability points per score bucket
+    
     # Celery
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
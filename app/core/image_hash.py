@@ -0,0 +1,39 @@
+import io
+from typing import Dict, List, Optional, Union
+import numpy as np
+from PIL import Image
+
+HASH_BANDS = 4  # 64-bit hash split into 16-bit bands, one indexed column each
+
+
+def dhash(image: Union[bytes, Image.Image], size: int = 8) -> Optional[str]:
+    """
+    64-bit difference hash as 16 hex chars: the grayscale image shrunk to 9x8, one bit per
+    horizontal neighbour pair (left brighter than right). Resizing, recompression and small
+    exposure changes flip few bits. None if the image cannot be decoded.
+    """
+    try:
+        if isinstance(image, (bytes, bytearray)):
+            image = Image.open(io.BytesIO(image))
+            image.draft("L", (size * 16, size * 16))  # JPEG: decode at reduced scale, much faster on photos
+        pixels = np.asarray(image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS), dtype=np.int16)
+    except Exception:
+        return None
+    bits = (pixels[:, :-1] > pixels[:, 1:]).flatten()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):0{size * size // 4}x}"
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def hash_bands(phash: str) -> List[int]:
+    """The hash as HASH_BANDS integers. Hashes within HASH_BANDS - 1 bits share at least one band."""
+    width = len(phash) // HASH_BANDS
+    return [int(phash[i * width:(i + 1) * width], 16) for i in range(HASH_BANDS)]
+
+
+def perceptual_hash_columns(phash: Optional[str]) -> Dict[str, Optional[Union[str, int]]]:
+    """ClothingItem column values for a perceptual hash (all None when there is none)."""
+    bands = hash_bands(phash) if phash else [None] * HASH_BANDS
+    return {"perceptual_hash": phash, **{f"phash_band{i}": band for i, band in enumerate(bands)}}
@@ -0,0 +1,143 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Union
+from app.core.config import settings
+
+logger = logging.getLogger("app")
+
+# Histogram bucket upper bounds per action type (values above the last bound go to "+inf")
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+HISTOGRAM_BUCKETS = {
+    "recommendation": (0, 20, 40, 60, 80, 100),
+    "classification": (0.5, 0.85, 0.95, 1.0),
+    # Bulk ingestion: images per call of each stage
+    "background_removal_batch": BATCH_SIZE_BUCKETS,
+    "classification_batch": BATCH_SIZE_BUCKETS,
+    "enhancement_batch": BATCH_SIZE_BUCKETS,
+}
+DEFAULT_BUCKETS = (0, 1, 10, 100)
+
+
+def _bucket_labels(bounds) -> list:
+    return [f"<={b}" for b in bounds] + ["+inf"]
+
+
+class MetricsBatch:
+    """
+    Per-request accumulator. Counters and histograms are aggregated locally
+    and merged into the global sink once, when the batch is flushed.
+    """
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.perf_counter()
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, list] = {}
+        self.samples: list = []
+
+    def add(self, action_type: str, status: str, value: Optional[float], sample: Optional[Dict]):
+        key = f"{action_type}:{status}"
+        self.counters[key] = self.counters.get(key, 0) + 1
+        if value is not None:
+            bounds = HISTOGRAM_BUCKETS.get(action_type, DEFAULT_BUCKETS)
+            hist = self.histograms.setdefault(action_type, [0] * (len(bounds) + 1))
+            hist[bisect.bisect_left(bounds, value)] += 1
+        if sample is not None:
+            self.samples.append(sample)
+
+
+class DecisionMetrics:
+    """
+    Structured, sampled sink for non-ML decision metrics.
+    Replaces per-event log lines: events are counted in memory, and only a
+    configurable fraction keep their full metadata (breakdown, weather, ...).
+    """
+    def __init__(self, sample_rate: float = None, max_samples: int = None):
+        self.sample_rate = settings.DECISION_METRICS_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._lock = threading.Lock()
+        self._current: ContextVar[Optional[MetricsBatch]] = ContextVar("decision_metrics_batch", default=None)
+        self._max_samples = max_samples or settings.DECISION_METRICS_MAX_SAMPLES
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters: Dict[str, int] = {}
+            self.histograms: Dict[str, list] = {}
+            self.samples = deque(maxlen=self._max_samples)
+            self.flushes = 0
+
+    def record(self, action_type: str, status: str, value: Optional[float] = None,
+               metadata: Union[Dict, Callable[[], Dict], None] = None):
+        """
+        Count one decision. `metadata` may be a callable so the (expensive) payload
+        is only built when this event is sampled.
+        """
+        sample = None
+        if metadata is not None and self.sample_rate > 0 and random.random() < self.sample_rate:
+            payload = metadata() if callable(metadata) else metadata
+            sample = {"action_type": action_type, "status": status, "value": value, "metadata": payload}
+
+        batch = self._current.get()
+        if batch is not None:
+            batch.add(action_type, status, value, sample)
+            return
+
+        single = MetricsBatch(action_type)
+        single.add(action_type, status, value, sample)
+        self._merge(single)
+
+    @contextmanager
+    def batch(self, label: str):
+        """Aggregate all records made inside the block and flush them once on exit."""
+        current = MetricsBatch(label)
+        token = self._current.set(current)
+        try:
+            yield current
+        finally:
+            self._current.reset(token)
+            self._merge(current)
+            if current.counters:
+                logger.info("[DECISION_METRIC] Batch: %s | Counts: %s | Duration: %.1fms",
+                            label, current.counters, (time.perf_counter() - current.started) * 1000)
+
+    def rates(self, action_type: str, hit_statuses) -> Dict[str, Any]:
+        """Counts per status of one action type plus the share of `hit_statuses` (None before any event)."""
+        prefix = f"{action_type}:"
+        with self._lock:
+            counts = {key[len(prefix):]: n for key, n in self.counters.items() if key.startswith(prefix)}
+        total = sum(counts.values())
+        hits = sum(counts.get(status, 0) for status in hit_statuses)
+        return {"counts": counts, "total": total, "hit_rate": round(hits / total, 4) if total else None}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "flushes": self.flushes,
+                "counters": dict(self.counters),
+                "histograms": {
+                    action: dict(zip(_bucket_labels(HISTOGRAM_BUCKETS.get(action, DEFAULT_BUCKETS)), hist))
+                    for action, hist in self.histograms.items()
+                },
+                "samples": list(self.samples),
+            }
+
+    def _merge(self, batch: MetricsBatch):
+        with self._lock:
+            for key, count in batch.counters.items():
+                self.counters[key] = self.counters.get(key, 0) + count
+            for action, hist in batch.histograms.items():
+                total = self.histograms.setdefault(action, [0] * len(hist))
+                for i, count in enumerate(hist):
+                    total[i] += count
+            self.samples.extend(batch.samples)
+            self.flushes += 1
+
+
+# Global singleton
+decision_metrics = DecisionMetrics()
@@ -0,0 +1,81 @@
+import json
+import logging
+import zlib
+from typing import Any, Union
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger("app")
+
+# Header byte of encoded payloads: 0x80 | compressed flag | serializer id.
+# Plain JSON (what Cache wrote before this codec) always starts with an ASCII byte < 0x80.
+HEADER_BIT = 0x80
+COMPRESSED_BIT = 0x40
+SERIALIZER_IDS = {"json": 1, "orjson": 2, "msgpack": 3}
+
+
+def _available(name: str) -> bool:
+    return name == "json" or (name == "orjson" and orjson is not None) or (name == "msgpack" and msgpack is not None)
+
+
+class CacheCodec:
+    """
+    Value <-> bytes codec for Cache payloads.
+
+    The serializer is pluggable (stdlib json, or the optional orjson / msgpack packages) and
+    payloads above `compress_min_bytes` are zlib-compressed. Every payload records how it was
+    written, so values stay readable after the configured serializer changes.
+    """
+    def __init__(self, serializer: str = None, compress_min_bytes: int = None, compress_level: int = None):
+        serializer = serializer or settings.CACHE_SERIALIZER
+        if serializer not in SERIALIZER_IDS:
+            raise ValueError(f"Unknown cache serializer: {serializer}")
+        if not _available(serializer):
+            logger.warning(f"Cache serializer '{serializer}' is not installed. Falling back to json.")
+            serializer = "json"
+        self.serializer = serializer
+        self.compress_min_bytes = settings.CACHE_COMPRESS_MIN_BYTES if compress_min_bytes is None else compress_min_bytes
+        self.compress_level = settings.CACHE_COMPRESS_LEVEL if compress_level is None else compress_level
+
+    def encode(self, value: Any, compress: bool = True) -> bytes:
+        body = self._dumps(value)
+        header = HEADER_BIT | SERIALIZER_IDS[self.serializer]
+        if compress and 0 < self.compress_min_bytes <= len(body):
+            compressed = zlib.compress(body, self.compress_level)
+            if len(compressed) < len(body):
+                body = compressed
+                header |= COMPRESSED_BIT
+        return bytes([header]) + body
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data or data[0] < HEADER_BIT:
+            return json.loads(data)  # Legacy plain JSON value (or a raw INCR counter)
+        header, body = data[0], data[1:]
+        if header & COMPRESSED_BIT:
+            body = zlib.decompress(body)
+        serializer_id = header & ~(HEADER_BIT | COMPRESSED_BIT)
+        if serializer_id == SERIALIZER_IDS["msgpack"]:
+            if msgpack is None:
+                raise ValueError("Cached value was written with msgpack, which is not installed")
+            return msgpack.unpackb(body, raw=False)
+        if serializer_id == SERIALIZER_IDS["orjson"] and orjson is not None:
+            return orjson.loads(body)
+        return json.loads(body)
+
+    def _dumps(self, value: Any) -> bytes:
+        if self.serializer == "orjson":
+            return orjson.dumps(value)
+        if self.serializer == "msgpack":
+            return msgpack.packb(value, use_bin_type=True)
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SqEnum, JSON, Float
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Enum as SqEnum, JSON, Float, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
@@ -41,6 +41,10 @@ class User(Base):
     age = Column(Integer, nullable=True)
     height = Column(Integer, nullable=True) # cm
     weight = Column(Integer, nullable=True) # kg
+
+    # Last recommendation context (feeds the nightly outfit plans)
+    last_location_cell = Column(String, nullable=True) # Geohash cell of the last /recommend location
+    last_active_at = Column(DateTime, nullable=True) # Naive UTC, updated at most once per day
     
     items = relationship("ClothingItem", back_populates="owner")
     logs = relationship("OutfitLog", back_populates="user")
@@ -60,6 +64,14 @@ class ClothingItem(Base):
     category_raw = Column(String, nullable=True) # e.g. "sunglass"
     main_color_hex = Column(String) # e.g. "#00FF00"
     image_hash = Column(String, index=True, nullable=True) # SHA256 for deduplication
+    # 64-bit dHash (hex) for near-duplicate lookups; the bands are its 16-bit quarters, indexed
+    # so candidates within a few bits are found by exact band matches (see app.core.image_hash)
+    perceptual_hash = Column(String, nullable=True)
+    phash_band0 = Column(Integer, index=True, nullable=True)
+    phash_band1 = Column(Integer, index=True, nullable=True)
+    phash_band2 = Column(Integer, index=True, nullable=True)
+    phash_band3 = Column(Integer, index=True, nullable=True)
+    analysis_id = Column(Integer, ForeignKey("image_analyses.id"), index=True, nullable=True) # Shared analysis of this image
     
     # Classification for Logic
     category = Column(SqEnum(FashionCategory), default=FashionCategory.UNKNOWN)
@@ -92,3 +104,68 @@ class OutfitLog(Base):
     worn_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="logs")
+
+class CalendarEvent(Base):
+    """Local copy of a user's Google Calendar event, kept current by incremental sync."""
+    __tablename__ = "calendar_events"
+    __table_args__ = (UniqueConstraint("user_id", "event_id", name="uq_calendar_events_user_event"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    event_id = Column(String, nullable=False) # Google event ID
+    etag = Column(String, nullable=True)
+    summary = Column(String, nullable=True)
+
+    # Naive UTC bounds for range queries (all-day events start at 00:00)
+    start_at = Column(DateTime, index=True)
+    end_at = Column(DateTime, index=True)
+    all_day = Column(Boolean, default=False)
+    raw = Column(JSON) # Event resource as returned by Google
+
+    synced_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class CalendarSyncState(Base):
+    __tablename__ = "calendar_sync_state"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    sync_token = Column(String, nullable=True) # Google nextSyncToken for incremental events.list
+    last_synced_at = Column(DateTime, nullable=True) # Naive UTC
+
+class OutfitPlan(Base):
+    """Ranked outfits precomputed overnight for one user, day and context (occasion + calendar event)."""
+    __tablename__ = "outfit_plans"
+    __table_args__ = (UniqueConstraint("user_id", "plan_date", "occasion", "event_name", name="uq_outfit_plans_context"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    plan_date = Column(Date, index=True) # Local date (OUTFIT_PLAN_TIMEZONE)
+    occasion = Column(String, nullable=False) # OccasionEnum value
+    event_name = Column(String, nullable=False, default="") # "" for occasion-only plans
+
+    weather = Column(JSON) # Forecast the outfits were scored for
+    outfits = Column(JSON) # [{"items": [ids], "score", "reason", "decision_status"}]
+    wardrobe_version = Column(Integer, default=0) # Stale once the wardrobe changes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ImageAnalysis(Base):
+    """
+    AI analysis of one image content (SHA-256), shared by every item uploaded with that image,
+    whoever uploaded it. Entries of an older AI_PIPELINE_VERSION are re-run rather than served.
+    """
+    __tablename__ = "image_analyses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    image_hash = Column(String, unique=True, index=True, nullable=False)
+    pipeline_version = Column(String, nullable=False)
+
+    processed_image_path = Column(String) # Owned by the store, never deleted with an item
+    color_hex = Column(String)
+    palette = Column(JSON) # [{"hex", "coverage"}]
+    category_raw = Column(String)
+    confidence = Column(Float)
+    raw_output = Column(JSON)
+    occasion = Column(String) # LLM enhancement
+    style_tag = Column(String)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
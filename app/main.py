@@ -13,6 +13,9 @@ from fastapi.staticfiles import StaticFiles
 from app.api import endpoints
 from app.db.database import engine, Base
 from app.core.config import settings
+from app.core.cache import async_cache
+from app.services.calendar_service import calendar_service, CalendarTimeout
+from app.services.background_removal import bg_engine
 from app.core.logging_config import setup_logging
 from app.middleware.logging_middleware import LoggingMiddleware
 from app.api.auth import router as auth_router
@@ -44,11 +47,17 @@ async def lifespan(app: FastAPI):
     # --- Startup ---
     logger.info("Application starting up...")
     
-    # Initialize Redis for Rate Limiting
+    # One redis.asyncio pool shared by the rate limiter and the async cache.
+    # Raw bytes (no decode_responses): cache payloads may be binary or compressed.
     redis_client = None
-    if FastApiLimiter:
+    try:
+        redis_client = redis.from_url(settings.REDIS_URL)
+    except Exception as e:
+        logger.debug(f"Async Redis client could not be created: {e}")
+
+    # Initialize Redis for Rate Limiting
+    if FastApiLimiter and redis_client:
         try:
-            redis_client = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
             await FastApiLimiter.init(redis_client)
             logger.info("FastAPI Limiter initialized with Redis")
         except Exception as e:
@@ -56,6 +65,19 @@ async def lifespan(app: FastAPI):
     else:
         logger.debug("FastApiLimiter not available (Redis off)")
 
+    if redis_client:
+        await async_cache.connect(redis_client)
+
+    # Parse Google API discovery documents once instead of on every calendar call
+    try:
+        calendar_service.load_discovery_documents()
+    except Exception as e:
+        logger.debug(f"Discovery documents could not be loaded: {e}")
+
+    # Load the background removal model off the event loop; /admin/readiness reports progress
+    if settings.BG_WARMUP_ON_STARTUP:
+        bg_engine.warm_up_in_background()
+
     # Optional: Validate DB Connection
     try:
         engine.connect()
@@ -68,8 +90,12 @@ async def lifespan(app: FastAPI):
     # --- Shutdown ---
     logger.info("Application shutting down...")
     if redis_client:
-        await redis_client.close()
-        logger.info("Redis connection closed gracefully")
+        async_cache.client = None
+        try:
+            await redis_client.close()
+            logger.info("Redis connection closed gracefully")
+        except Exception as e:
+            logger.debug(f"Redis connection close failed: {e}")
 
 app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
@@ -124,6 +150,17 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         }
     )
 
+@app.exception_handler(CalendarTimeout)
+async def calendar_timeout_handler(request: Request, exc: CalendarTimeout):
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={
+            "error_code": "CALENDAR_TIMEOUT",
+            "message": "Google Calendar phản hồi quá chậm, vui lòng thử lại.",
+            "request_id": request_id_ctx.get() or "unknown"
+        }
+    )
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     return JSONResponse(
@@ -51,6 +51,10 @@ class AsyncUploadResponse(BaseModel):
     task_id: str
     status: str # QUEUED
 
+class BatchUploadResponse(BaseModel):
+    items: List[AsyncUploadResponse]  # In upload order; duplicates point at the existing item
+    queued: int
+
 class TaskStatusResponse(BaseModel):
     task_id: str
     status: str # PENDING, STARTED, SUCCESS, FAILURE
@@ -174,6 +178,8 @@ class ReadinessResponse(BaseModel):
     database: str
     redis: str
     worker: str
+    background_removal: str = "COLD" # COLD, WARMING, READY, FAILED
+    background_removal_model: Optional[str] = None
 
 class VersionResponse(BaseModel):
     service_name: str
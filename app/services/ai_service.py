@@ -4,17 +4,14 @@ import certifi
 import numpy as np
 import logging
 from PIL import Image
-from rembg import remove, new_session
-from sklearn.cluster import KMeans
-from collections import Counter
+from typing import List, Optional
 import cv2
 from app.core.config import settings
+from app.services.background_removal import bg_engine
+from app.services.color_palette import extract_palette
 import requests
 import json
 
-# Initialize persistent session for rembg (avoids loading model on every call)
-bg_session = new_session()
-
 # Fix for model download SSL verification
 os.environ['SSL_CERT_FILE'] = certifi.where()
 os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
@@ -22,73 +19,100 @@ os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
 logger = logging.getLogger("app")
 
 # --- 1. Background Removal ---
+def _to_png(img: Image.Image) -> bytes:
+    buffered = io.BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
 def remove_background(image_bytes: bytes) -> bytes:
     """
-    Removes background using U-2-Net (via rembg).
-    Returns PNG bytes with alpha channel.
-    Optimized: Resizes large images to 800px max before processing.
+    Removes background with the configured rembg model (see background_removal).
+    Returns PNG bytes with alpha channel, or the original bytes on failure.
     """
     logger.info("Running background removal")
-    try:
-        # Optimization: Resize for speed if image is too large
-        img = Image.open(io.BytesIO(image_bytes))
-        orig_size = img.size
-        max_dim = 640 # Reduced from 800 for even more speed
-        
-        if max(orig_size) > max_dim:
-            logger.info(f"Resizing image from {orig_size} for faster BG removal")
-            img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
-            buffered = io.BytesIO()
-            img.save(buffered, format="PNG")
-            image_bytes = buffered.getvalue()
-
-        output_data = remove(image_bytes, session=bg_session)
-        return output_data
-    except Exception as e:
-        logger.error(f"Background removal failed: {e}", exc_info=True)
-        return image_bytes # Fallback to original
+    return bg_engine.remove(image_bytes)
+
+def remove_background_batch(images: List[bytes]) -> List[bytes]:
+    """
+    Background removal for several images in one stacked ONNX inference. Like
+    remove_background, an image that fails keeps its original bytes.
+    """
+    return bg_engine.remove_batch(images)
 
 # --- 2. Feature Extraction ---
 
-# A. Color Extraction (K-Means)
-def get_dominant_color(image: Image.Image, k=3) -> str:
+# A. Color Extraction (NumPy color quantization, see color_palette)
+def get_color_palette(image: Image.Image) -> list:
     """
-    Extracts the most dominant color from the image (ignoring transparent background).
-    Returns Hex code (e.g., #FFFFFF).
+    Main colors of the image (ignoring transparent background) with their coverage,
+    e.g. [{"hex": "#1f2a44", "coverage": 0.71}, ...]. Empty if extraction fails.
     """
     try:
-        # Resize for speed
-        image = image.resize((100, 100))
-        img_np = np.array(image)
-        
-        # If RGBA, filter out transparent pixels
-        if img_np.shape[2] == 4:
-            mask = img_np[:, :, 3] > 0
-            pixels = img_np[mask][:, :3] # Take only RGB of non-transparent
-        else:
-            pixels = img_np.reshape(-1, 3)
-
-        if len(pixels) == 0:
-            return "#000000"
-
-        kmeans = KMeans(n_clusters=k, n_init=10)
-        kmeans.fit(pixels)
-        
-        # Find most frequent cluster
-        counts = Counter(kmeans.labels_)
-        dominant_cluster = counts.most_common(1)[0][0]
-        dominant_rgb = kmeans.cluster_centers_[dominant_cluster]
-        
-        # Convert to Hex
-        return "#{:02x}{:02x}{:02x}".format(int(dominant_rgb[0]), int(dominant_rgb[1]), int(dominant_rgb[2]))
+        return extract_palette(image)
     except Exception as e:
         logger.error(f"Color extraction failed: {e}", exc_info=True)
-        return "#000000"
+        return []
+
+def get_dominant_color(image: Image.Image) -> str:
+    """
+    Extracts the most dominant color from the image (ignoring transparent background).
+    Returns Hex code (e.g., #FFFFFF).
+    """
+    palette = get_color_palette(image)
+    return palette[0]["hex"] if palette else "#000000"
 
 # B. Classification (Gemini Vision API via OpenRouter)
 
 import base64
 
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+VALID_LABELS = ["TOP", "BOTTOM", "OUTERWEAR", "FOOTWEAR", "FULL_BODY", "ACCESSORY"]
+CATEGORY_PROMPT = "TOP (Áo), BOTTOM (Quần, Chân váy), OUTERWEAR (Áo khoác ngoài), FOOTWEAR (Giày dép), FULL_BODY (Váy liền thân, Đầm), ACCESSORY (Phụ kiện)"
+CATEGORY_VI_MAP = {
+    "TOP": "Áo",
+    "BOTTOM": "Quần hoặc Chân váy",
+    "OUTERWEAR": "Áo khoác",
+    "FOOTWEAR": "Giày dép",
+    "FULL_BODY": "Váy liền thân",
+    "ACCESSORY": "Phụ kiện"
+}
+ENHANCE_SYSTEM_PROMPT = "You are a JSON-only fashion categorizer bot. Always output strictly valid JSON."
+
+def _llm_enabled() -> bool:
+    return bool(settings.DEEPSEEK_API_KEY) and "your_" not in settings.DEEPSEEK_API_KEY
+
+def _openrouter_headers() -> dict:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
+        "HTTP-Referer": "http://localhost:8000",
+        "X-Title": "OutfitAI"
+    }
+
+def _vision_image_part(image_bytes: bytes) -> dict:
+    """Image content part, resized to save bandwidth and speed up the API."""
+    img = Image.open(io.BytesIO(image_bytes))
+    img.thumbnail((512, 512), Image.Resampling.LANCZOS)
+    b64_img = base64.b64encode(_to_png(img)).decode("utf-8")
+    return {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64_img}"}}
+
+def _parse_json_content(content: str):
+    content = content.strip()
+    # In case OpenRouter wrapper ignores response_format and adds markdown ticks
+    if content.startswith("```json"):
+        content = content[7:-3].strip()
+    elif content.startswith("```"):
+        content = content[3:-3].strip()
+    return json.loads(content)
+
+def _match_label(text: str) -> dict:
+    label = str(text).strip().upper()
+    for v in VALID_LABELS:
+        if v in label:
+            return {"label": v, "confidence": 0.99}
+    logger.warning(f"Unexpected vision output: {label}")
+    return {"label": "UNKNOWN", "confidence": 0.5}
+
 def classify_apparel(image_bytes: bytes) -> dict:
     """
     Uses Google Gemini 2.5 Flash Vision via OpenRouter to predict class.
@@ -96,27 +120,12 @@ def classify_apparel(image_bytes: bytes) -> dict:
     """
     logger.info("Running apparel classification via Gemini Vision API")
     
-    if not settings.DEEPSEEK_API_KEY or "your_" in settings.DEEPSEEK_API_KEY:
+    if not _llm_enabled():
         logger.warning("No API key found. Falling back to UNKNOWN.")
         return {"label": "UNKNOWN", "confidence": 0.0}
 
     try:
-        # Resize image to save bandwidth and speed up API
-        img = Image.open(io.BytesIO(image_bytes))
-        img.thumbnail((512, 512), Image.Resampling.LANCZOS)
-        buffered = io.BytesIO()
-        img.save(buffered, format="PNG")
-        b64_img = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        
-        url = "https://openrouter.ai/api/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-            "HTTP-Referer": "http://localhost:8000",
-            "X-Title": "OutfitAI"
-        }
-        
-        prompt = "Hãy nhìn bức ảnh món đồ thời trang này. Nó thuộc thể loại nào trong danh sách sau: TOP (Áo), BOTTOM (Quần, Chân váy), OUTERWEAR (Áo khoác ngoài), FOOTWEAR (Giày dép), FULL_BODY (Váy liền thân, Đầm), ACCESSORY (Phụ kiện). Chỉ in ra đúng duy nhất 1 từ tiếng Anh in hoa trong danh sách đó."
+        prompt = f"Hãy nhìn bức ảnh món đồ thời trang này. Nó thuộc thể loại nào trong danh sách sau: {CATEGORY_PROMPT}. Chỉ in ra đúng duy nhất 1 từ tiếng Anh in hoa trong danh sách đó."
         
         payload = {
             "model": "google/gemini-2.5-flash",
@@ -125,7 +134,7 @@ def classify_apparel(image_bytes: bytes) -> dict:
                     "role": "user",
                     "content": [
                         {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64_img}"}}
+                        _vision_image_part(image_bytes)
                     ]
                 }
             ],
@@ -133,19 +142,10 @@ def classify_apparel(image_bytes: bytes) -> dict:
             "max_tokens": 10
         }
         
-        response = requests.post(url, headers=headers, json=payload, timeout=8.0)
+        response = requests.post(OPENROUTER_URL, headers=_openrouter_headers(), json=payload, timeout=8.0)
         if response.status_code == 200:
             data = response.json()
-            label = data["choices"][0]["message"]["content"].strip().upper()
-            
-            valid_labels = ["TOP", "BOTTOM", "OUTERWEAR", "FOOTWEAR", "FULL_BODY", "ACCESSORY"]
-            for v in valid_labels:
-                if v in label:
-                    return {"label": v, "confidence": 0.99}
-                    
-            logger.warning(f"Unexpected vision output: {label}")
-            return {"label": "UNKNOWN", "confidence": 0.5}
-            
+            return _match_label(data["choices"][0]["message"]["content"])
         else:
             logger.error(f"Vision API error: {response.text}")
             return {"label": "UNKNOWN", "confidence": 0.0}
@@ -154,31 +154,61 @@ def classify_apparel(image_bytes: bytes) -> dict:
         logger.error(f"Classification failed: {e}", exc_info=True)
         return {"label": "UNKNOWN", "confidence": 0.0}
 
+def classify_apparel_batch(images: List[bytes]) -> List[dict]:
+    """
+    Classifies several images with one multi-image Gemini prompt (images numbered in order,
+    answer is a JSON list of labels). If the answer cannot be matched to the images, each
+    image is classified on its own instead.
+    """
+    if len(images) < 2 or not _llm_enabled():
+        return [classify_apparel(b) for b in images]
+
+    logger.info(f"Running batched apparel classification for {len(images)} images")
+    try:
+        content = [{"type": "text", "text":
+                    f"Dưới đây là {len(images)} bức ảnh món đồ thời trang, đánh số theo thứ tự. "
+                    f"Với mỗi ảnh, chọn thể loại trong danh sách sau: {CATEGORY_PROMPT}. "
+                    f'Chỉ trả về JSON hợp lệ dạng {{"labels": [...]}} gồm đúng {len(images)} từ tiếng Anh in hoa, theo thứ tự ảnh.'}]
+        for index, image_bytes in enumerate(images, start=1):
+            content.append({"type": "text", "text": f"Ảnh {index}:"})
+            content.append(_vision_image_part(image_bytes))
+
+        payload = {
+            "model": "google/gemini-2.5-flash",
+            "messages": [{"role": "user", "content": content}],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.1,
+            "max_tokens": 16 * len(images) + 32
+        }
+        timeout = min(8.0 + 1.0 * len(images), settings.AI_BATCH_TIMEOUT_SECONDS)
+        response = requests.post(OPENROUTER_URL, headers=_openrouter_headers(), json=payload, timeout=timeout)
+        if response.status_code == 200:
+            labels = _parse_json_content(response.json()["choices"][0]["message"]["content"]).get("labels", [])
+            if len(labels) == len(images):
+                return [_match_label(label) for label in labels]
+            logger.warning(f"Batched vision output has {len(labels)} labels for {len(images)} images")
+        else:
+            logger.error(f"Vision API error: {response.text}")
+    except Exception as e:
+        logger.error(f"Batched classification failed: {e}", exc_info=True)
+    return [classify_apparel(b) for b in images]
+
+def _parse_enhancement(parsed: dict, raw_label: str) -> dict:
+    # Validate output
+    occ = str(parsed.get("occasion", "casual")).lower()
+    if occ not in ["casual", "formal", "sport"]:
+        occ = "casual"
+    return {"occasion": occ, "style_tag": parsed.get("style_tag") or raw_label}
+
 def enhance_classification_with_llm(raw_label: str, color_hex: str) -> dict:
     """
     Uses DeepSeek to enhance the deterministic label with an Occasion and a Style Tag.
     """
-    if not settings.DEEPSEEK_API_KEY or "your_" in settings.DEEPSEEK_API_KEY:
+    if not _llm_enabled():
         return {"occasion": "casual", "style_tag": raw_label}
 
     try:
-        url = "https://openrouter.ai/api/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-            "HTTP-Referer": "http://localhost:8000",
-            "X-Title": "OutfitAI"
-        }
-        
-        category_vi_map = {
-            "TOP": "Áo",
-            "BOTTOM": "Quần hoặc Chân váy",
-            "OUTERWEAR": "Áo khoác",
-            "FOOTWEAR": "Giày dép",
-            "FULL_BODY": "Váy liền thân",
-            "ACCESSORY": "Phụ kiện"
-        }
-        vi_label = category_vi_map.get(raw_label.upper(), raw_label)
+        vi_label = CATEGORY_VI_MAP.get(raw_label.upper(), raw_label)
         
         prompt = f"Tôi có một món quần áo là '{vi_label}' màu {color_hex}.\n" \
                  f"1. Phân loại nó vào 1 trong 3 dịp sau: 'casual', 'formal', hoặc 'sport'.\n" \
@@ -188,7 +218,7 @@ def enhance_classification_with_llm(raw_label: str, color_hex: str) -> dict:
         payload = {
             "model": "deepseek/deepseek-chat",
             "messages": [
-                {"role": "system", "content": "You are a JSON-only fashion categorizer bot. Always output strictly valid JSON."},
+                {"role": "system", "content": ENHANCE_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             "response_format": {"type": "json_object"},
@@ -196,30 +226,72 @@ def enhance_classification_with_llm(raw_label: str, color_hex: str) -> dict:
             "max_tokens": 100
         }
         
-        response = requests.post(url, headers=headers, json=payload, timeout=4.0)
+        response = requests.post(OPENROUTER_URL, headers=_openrouter_headers(), json=payload, timeout=4.0)
         if response.status_code == 200:
             data = response.json()
-            content = data["choices"][0]["message"]["content"].strip()
-            # In case OpenRouter wrapper ignores response_format and adds markdown ticks
-            if content.startswith("```json"):
-                content = content[7:-3].strip()
-            elif content.startswith("```"):
-                content = content[3:-3].strip()
-                
-            parsed = json.loads(content)
-            # Validate output
-            occ = parsed.get("occasion", "casual").lower()
-            if occ not in ["casual", "formal", "sport"]:
-                occ = "casual"
-            return {"occasion": occ, "style_tag": parsed.get("style_tag", raw_label)}
+            return _parse_enhancement(_parse_json_content(data["choices"][0]["message"]["content"]), raw_label)
     except Exception as e:
         logger.warning(f"DeepSeek enhancement failed: {e}")
         
     return {"occasion": "casual", "style_tag": raw_label}
 
-def analyze_image(image_bytes: bytes):
+def enhance_classifications_with_llm(pairs: List[tuple]) -> List[dict]:
+    """
+    Batched enhance_classification_with_llm for (raw_label, color_hex) pairs: one DeepSeek call
+    returning a JSON list in order. Falls back to one call per item if the list does not line up.
+    """
+    if len(pairs) < 2 or not _llm_enabled():
+        return [enhance_classification_with_llm(label, color) for label, color in pairs]
+
+    try:
+        lines = "\n".join(f"{i}. '{CATEGORY_VI_MAP.get(label.upper(), label)}' màu {color}"
+                          for i, (label, color) in enumerate(pairs, start=1))
+        prompt = f"Tôi có {len(pairs)} món quần áo:\n{lines}\n" \
+                 f"Với mỗi món, theo đúng thứ tự:\n" \
+                 f"1. Phân loại nó vào 1 trong 3 dịp sau: 'casual', 'formal', hoặc 'sport'.\n" \
+                 f"2. Đặt một tên tiếng Việt hay, ngắn gọn kèm phong cách (Ví dụ: 'Áo khoác Thanh lịch', 'Giày Thể thao Năng động').\n" \
+                 f"Chỉ trả về JSON hợp lệ dạng {{\"items\": [{{\"occasion\": ..., \"style_tag\": ...}}, ...]}}. Không giải thích gì thêm."
+
+        payload = {
+            "model": "deepseek/deepseek-chat",
+            "messages": [
+                {"role": "system", "content": ENHANCE_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.1,
+            "max_tokens": 60 * len(pairs) + 40
+        }
+        timeout = min(4.0 + 0.5 * len(pairs), settings.AI_BATCH_TIMEOUT_SECONDS)
+        response = requests.post(OPENROUTER_URL, headers=_openrouter_headers(), json=payload, timeout=timeout)
+        if response.status_code == 200:
+            items = _parse_json_content(response.json()["choices"][0]["message"]["content"]).get("items", [])
+            if len(items) == len(pairs):
+                return [_parse_enhancement(item if isinstance(item, dict) else {}, label)
+                        for item, (label, _) in zip(items, pairs)]
+            logger.warning(f"Batched enhancement has {len(items)} entries for {len(pairs)} items")
+    except Exception as e:
+        logger.warning(f"Batched DeepSeek enhancement failed: {e}")
+    return [enhance_classification_with_llm(label, color) for label, color in pairs]
+
+def _save_processed(clean_bytes: bytes) -> str:
+    import uuid
+    filename = f"proc_{uuid.uuid4()}.png"
+    processed_path = os.path.join(settings.PROCESSED_DIR, filename)
+    with open(processed_path, "wb") as f:
+        f.write(clean_bytes)
+    return processed_path
+
+def record_batch_size(stage: str, size: int):
+    """Batch size of one ingestion stage call, as a "<stage>_batch" histogram in /admin/decision-metrics."""
+    from app.core.metrics import decision_metrics
+    decision_metrics.record(f"{stage}_batch", "batched" if size > 1 else "single", value=size)
+
+def analyze_image(image_bytes: bytes, classification: dict = None):
     """
     Pipeline: BG Removal -> Color -> Classification
+    A known `classification` (e.g. of a near-duplicate photo) skips step 3; the cutout and
+    color are always computed from this image.
     """
     logger.info("Starting image analysis pipeline")
     
@@ -228,21 +300,63 @@ def analyze_image(image_bytes: bytes):
     clean_image = Image.open(io.BytesIO(clean_bytes))
     
     # 2. Color
-    hex_color = get_dominant_color(clean_image)
+    palette = get_color_palette(clean_image)
     
     # 3. Classify (Now takes bytes of cleaned image)
-    classification = classify_apparel(clean_bytes)
+    if classification is None:
+        classification = classify_apparel(clean_bytes)
     
-    import uuid
-    filename = f"proc_{uuid.uuid4()}.png"
-    processed_path = os.path.join(settings.PROCESSED_DIR, filename)
-    with open(processed_path, "wb") as f:
-        f.write(clean_bytes)
-
     return {
-        "processed_image_path": processed_path,
-        "color_hex": hex_color,
+        "processed_image_path": _save_processed(clean_bytes),
+        "color_hex": palette[0]["hex"] if palette else "#000000",
+        "palette": palette,
         "category_raw": classification["label"],
         "confidence": classification["confidence"],
         "raw_output": classification
     }
+
+def analyze_images(images: List[bytes], classifications: List[Optional[dict]] = None) -> List[dict]:
+    """
+    Batched analyze_image for bulk uploads: background removal runs AI_BG_BATCH_SIZE images per
+    ONNX inference and classification AI_CLASSIFY_BATCH_SIZE images per vision prompt. Returns
+    one analyze_image-shaped dict per input, in order; an image that cannot be processed gets
+    {"error": ...} instead. Images with a known entry in `classifications` are not classified.
+    """
+    classifications = list(classifications or [None] * len(images))
+    logger.info(f"Starting batched image analysis pipeline for {len(images)} images")
+
+    # 1. BG Removal
+    clean = []
+    for start in range(0, len(images), settings.AI_BG_BATCH_SIZE):
+        chunk = images[start:start + settings.AI_BG_BATCH_SIZE]
+        record_batch_size("background_removal", len(chunk))
+        clean.extend(remove_background_batch(chunk))
+
+    # 2. Color (cheap, per image)
+    results, palettes = [None] * len(images), {}
+    for index, clean_bytes in enumerate(clean):
+        try:
+            palettes[index] = get_color_palette(Image.open(io.BytesIO(clean_bytes)))
+        except Exception as e:
+            logger.error(f"Image {index} of batch is unreadable: {e}")
+            results[index] = {"error": f"Unreadable image: {e}"}
+
+    # 3. Classify
+    unclassified = [index for index in palettes if classifications[index] is None]
+    for start in range(0, len(unclassified), settings.AI_CLASSIFY_BATCH_SIZE):
+        chunk = unclassified[start:start + settings.AI_CLASSIFY_BATCH_SIZE]
+        record_batch_size("classification", len(chunk))
+        for index, classification in zip(chunk, classify_apparel_batch([clean[i] for i in chunk])):
+            classifications[index] = classification
+
+    for index, palette in palettes.items():
+        classification = classifications[index]
+        results[index] = {
+            "processed_image_path": _save_processed(clean[index]),
+            "color_hex": palette[0]["hex"] if palette else "#000000",
+            "palette": palette,
+            "category_raw": classification["label"],
+            "confidence": classification["confidence"],
+            "raw_output": classification
+        }
+    return results
@@ -0,0 +1,120 @@
+import logging
+import os
+from typing import Dict, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import decision_metrics
+from app.db.models import ClothingItem, ImageAnalysis
+
+logger = logging.getLogger("app")
+
+
+class AnalysisStore:
+    """
+    Content-addressed store of AI analyses (cutout, color palette, label, confidence and LLM
+    enhancement), keyed by the SHA-256 of the uploaded image. Any user uploading the same
+    image gets the stored result without running the pipeline.
+
+    Each entry records the pipeline version (AI_PIPELINE_VERSION and BG_MODEL) it was produced with; entries of another
+    version count as "stale" misses and are refreshed on the next upload or by
+    `reanalyze_stale_analyses`. Lookups are counted as "analysis_store" decision metrics.
+    """
+
+    def current_version(self) -> str:
+        return f"{settings.AI_PIPELINE_VERSION}/{settings.BG_MODEL}"
+
+    def get(self, db: Session, image_hash: Optional[str]) -> Optional[ImageAnalysis]:
+        """Stored analysis of this image content, of any version (not counted)."""
+        if not image_hash:
+            return None
+        return db.query(ImageAnalysis).filter(ImageAnalysis.image_hash == image_hash).first()
+
+    def lookup(self, db: Session, image_hash: Optional[str]) -> Optional[ImageAnalysis]:
+        """Current-version analysis of this image content, or None."""
+        if not image_hash:
+            return None
+        analysis = self.get(db, image_hash)
+        if analysis is None:
+            decision_metrics.record("analysis_store", "miss")
+            return None
+        if analysis.pipeline_version != self.current_version():
+            decision_metrics.record("analysis_store", "stale")
+            return None
+        decision_metrics.record("analysis_store", "hit")
+        return analysis
+
+    def put(self, db: Session, image_hash: Optional[str], ai_results: Dict, enhancement: Dict) -> Optional[ImageAnalysis]:
+        """
+        Store (or refresh) the analysis of an image. Flushed in a savepoint, not committed, so it
+        lands with the caller's item updates; if another worker stored the same image first,
+        that entry is returned instead. Refreshing an entry of another version leaves the items
+        linked to it and its old cutout to the caller (see tasks._store).
+        """
+        if not image_hash:
+            return None
+        try:
+            with db.begin_nested():
+                analysis = db.query(ImageAnalysis).filter(ImageAnalysis.image_hash == image_hash).first()
+                if analysis is None:
+                    analysis = ImageAnalysis(image_hash=image_hash)
+                    db.add(analysis)
+                analysis.pipeline_version = self.current_version()
+                analysis.processed_image_path = ai_results["processed_image_path"]
+                analysis.color_hex = ai_results["color_hex"]
+                analysis.palette = ai_results.get("palette", [])
+                analysis.category_raw = ai_results["category_raw"]
+                analysis.confidence = ai_results["confidence"]
+                analysis.raw_output = ai_results["raw_output"]
+                analysis.occasion = enhancement.get("occasion")
+                analysis.style_tag = enhancement.get("style_tag")
+            return analysis
+        except IntegrityError:
+            logger.info(f"Analysis of image {image_hash[:12]} stored concurrently. Using the stored one.")
+            return db.query(ImageAnalysis).filter(ImageAnalysis.image_hash == image_hash).first()
+
+    def results(self, analysis: ImageAnalysis) -> Dict:
+        """The analysis in `analyze_image` result shape."""
+        return {
+            "processed_image_path": analysis.processed_image_path,
+            "color_hex": analysis.color_hex,
+            "palette": analysis.palette or [],
+            "category_raw": analysis.category_raw,
+            "confidence": analysis.confidence,
+            "raw_output": analysis.raw_output or {}
+        }
+
+    def enhancement(self, analysis: ImageAnalysis) -> Dict:
+        return {"occasion": analysis.occasion or "casual", "style_tag": analysis.style_tag or analysis.category_raw}
+
+    def stale(self, db: Session, limit: int = None) -> List[ImageAnalysis]:
+        query = db.query(ImageAnalysis).filter(ImageAnalysis.pipeline_version != self.current_version()) \
+            .order_by(ImageAnalysis.id)
+        return query.limit(limit).all() if limit else query.all()
+
+    def release_file(self, db: Session, path: Optional[str]):
+        """Delete a processed image once neither an item nor a stored analysis refers to it."""
+        if not path or not os.path.exists(path):
+            return
+        in_use = db.query(ClothingItem.id).filter(ClothingItem.processed_image_path == path).first() or \
+            db.query(ImageAnalysis.id).filter(ImageAnalysis.processed_image_path == path).first()
+        if in_use:
+            return
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not delete processed image {path}: {e}")
+
+    def stats(self, db: Session) -> Dict:
+        total = db.query(ImageAnalysis).count()
+        stale = db.query(ImageAnalysis).filter(ImageAnalysis.pipeline_version != self.current_version()).count()
+        return {
+            "pipeline_version": self.current_version(),
+            "entries": total,
+            "stale": stale,
+            **decision_metrics.rates("analysis_store", ("hit",))
+        }
+
+
+# Singleton instance
+analysis_store = AnalysisStore()
@@ -0,0 +1,175 @@
+import io
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from PIL import Image
+from app.core.config import settings
+
+logger = logging.getLogger("app")
+
+# U-2-Net family models shipped by rembg; they share the input normalization below,
+# which the batched path relies on
+MODELS = ("u2net", "u2netp", "silueta")
+U2NET_MEAN = (0.485, 0.456, 0.406)
+U2NET_STD = (0.229, 0.224, 0.225)
+U2NET_SIZE = (320, 320)
+MAX_DIM = 640  # Larger uploads are shrunk before inference (masks are 320x320 anyway)
+
+
+def _to_png(img: Image.Image) -> bytes:
+    buffered = io.BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+class BackgroundRemovalEngine:
+    """
+    rembg background removal with an explicit model and ONNX Runtime thread budget.
+
+    BG_MODEL trades quality against CPU: u2net (best), silueta (u2net quality, smaller file)
+    or u2netp (several times faster, rougher edges). BG_INTRA_OP_THREADS/BG_INTER_OP_THREADS
+    bound each inference so co-located workers do not oversubscribe the host. The session is
+    loaded on first use or by `warm_up` (run at startup), which also runs one inference so the
+    first upload does not pay model download, load and allocation; `status()` reports readiness.
+    """
+    def __init__(self, model_name: str = None, intra_op_threads: int = None, inter_op_threads: int = None):
+        self.model_name = model_name or settings.BG_MODEL
+        if self.model_name not in MODELS:
+            raise ValueError(f"Unsupported background removal model '{self.model_name}' (expected one of {MODELS})")
+        self.intra_op_threads = settings.BG_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+        self.inter_op_threads = settings.BG_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+        self._session = None
+        self._lock = threading.Lock()
+        self.state = "COLD"  # COLD -> WARMING -> READY | FAILED
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_ms: Optional[float] = None
+        # Set once the model rejects a stacked batch (fixed batch axis); later batches go image by image
+        self.batch_unsupported = False
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "READY"
+
+    def session(self):
+        """The rembg session, loaded (and the model downloaded if needed) on first use."""
+        with self._lock:
+            if self._session is None:
+                import onnxruntime as ort
+                from rembg import new_session
+
+                started = time.perf_counter()
+                opts = ort.SessionOptions()
+                opts.intra_op_num_threads = self.intra_op_threads
+                opts.inter_op_num_threads = self.inter_op_threads
+                session = new_session(self.model_name, sess_opts=opts)
+                if session is None:
+                    raise RuntimeError(f"rembg returned no session for '{self.model_name}'")
+                self._session = session
+                self.load_seconds = round(time.perf_counter() - started, 2)
+                logger.info(f"Background removal model '{self.model_name}' loaded in {self.load_seconds}s "
+                            f"(intra_op={self.intra_op_threads}, inter_op={self.inter_op_threads})")
+            return self._session
+
+    def warm_up(self) -> bool:
+        """Load the model and run one inference. Never raises; the outcome is in `status()`."""
+        self.state, self.error = "WARMING", None
+        try:
+            session = self.session()
+            started = time.perf_counter()
+            session.inner_session.run(None, session.normalize(Image.new("RGB", U2NET_SIZE), U2NET_MEAN, U2NET_STD, U2NET_SIZE))
+            self.warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.state = "READY"
+            logger.info(f"Background removal warm-up inference took {self.warmup_ms}ms")
+        except Exception as e:
+            self.state, self.error = "FAILED", str(e)
+            logger.error(f"Background removal warm-up failed: {e}")
+        return self.ready
+
+    def warm_up_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.warm_up, name="bg-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict:
+        return {
+            "model": self.model_name,
+            "state": self.state,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "warmup_ms": self.warmup_ms,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+        }
+
+    # --- Inference ---
+
+    def _shrink(self, image_bytes: bytes) -> Image.Image:
+        img = Image.open(io.BytesIO(image_bytes))
+        if max(img.size) > MAX_DIM:
+            logger.info(f"Resizing image from {img.size} for faster BG removal")
+            img.thumbnail((MAX_DIM, MAX_DIM), Image.Resampling.LANCZOS)
+        return img
+
+    def remove(self, image_bytes: bytes) -> bytes:
+        """PNG bytes with alpha channel; the original bytes if removal fails."""
+        from rembg import remove
+
+        try:
+            output_data = remove(_to_png(self._shrink(image_bytes)), session=self.session())
+            if self.state == "COLD":
+                self.state = "READY"
+            return output_data
+        except Exception as e:
+            logger.error(f"Background removal failed: {e}", exc_info=True)
+            return image_bytes
+
+    def remove_batch(self, images: List[bytes]) -> List[bytes]:
+        """
+        Several images with one ONNX inference over the stacked input tensors (N x 3 x 320 x 320),
+        then the same per-image mask scaling and cutout as rembg's U-2-Net sessions.
+        """
+        from rembg.bg import naive_cutout
+
+        if len(images) < 2 or self.batch_unsupported:
+            return [self.remove(b) for b in images]
+
+        logger.info(f"Running batched background removal for {len(images)} images")
+        decoded = {}
+        for index, image_bytes in enumerate(images):
+            try:
+                decoded[index] = self._shrink(image_bytes).convert("RGB")
+            except Exception as e:
+                logger.error(f"Background removal failed: {e}", exc_info=True)
+        if not decoded:
+            return list(images)
+
+        try:
+            session = self.session()
+        except Exception as e:
+            logger.error(f"Background removal failed: {e}", exc_info=True)
+            return list(images)
+        try:
+            inputs = [session.normalize(img, U2NET_MEAN, U2NET_STD, U2NET_SIZE) for img in decoded.values()]
+            input_name = next(iter(inputs[0]))
+            stacked = np.concatenate([tensor[input_name] for tensor in inputs], axis=0)
+            preds = session.inner_session.run(None, {input_name: stacked})[0][:, 0, :, :]
+        except Exception as e:
+            logger.warning(f"Batched background removal unavailable ({e}). Falling back to per-image inference.")
+            self.batch_unsupported = True
+            return [self.remove(b) for b in images]
+
+        results = list(images)
+        for pred, (index, img) in zip(preds, decoded.items()):
+            # Min-max scaling per image, as rembg's U2netSession.predict does
+            ma, mi = np.max(pred), np.min(pred)
+            pred = (pred - mi) / max(ma - mi, 1e-6)
+            mask = Image.fromarray((pred.clip(0, 1) * 255).astype("uint8"), mode="L").resize(img.size, Image.Resampling.LANCZOS)
+            results[index] = _to_png(naive_cutout(img, mask))
+        return results
+
+
+# Singleton instance
+bg_engine = BackgroundRemovalEngine()
@@ -1,11 +1,26 @@
 import os
+import asyncio
 import datetime
+import hashlib
 import json
+import logging
+import threading
+import httplib2
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import HttpRequest
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from app.core.cache import LocalCache
+from app.core.config import settings
 from app.db.models import OccasionEnum
+from app.services.occasion_matcher import occasion_matcher
+
+logger = logging.getLogger("app")
 
 # Use absolute paths for production-like reliability
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -20,11 +35,44 @@ SCOPES = [
     'https://www.googleapis.com/auth/userinfo.profile'
 ]
 
+# Parsed static discovery documents, keyed by (api, version)
+_DISCOVERY_DOCS: dict = {}
+
+_calendar_pool: Optional[ThreadPoolExecutor] = None
+_calendar_pool_lock = threading.Lock()
+
+
+def _calendar_executor() -> ThreadPoolExecutor:
+    """Bounded pool for blocking Google API calls (created lazily, shared by all requests)."""
+    global _calendar_pool
+    with _calendar_pool_lock:
+        if _calendar_pool is None:
+            _calendar_pool = ThreadPoolExecutor(max_workers=settings.CALENDAR_MAX_WORKERS,
+                                                thread_name_prefix="calendar")
+        return _calendar_pool
+
+
+class CalendarTimeout(Exception):
+    """A Google Calendar call did not finish within CALENDAR_TIMEOUT_SECONDS."""
+
+
+class _CachedCalendar:
+    """A built calendar service and the credentials it signs requests with."""
+    __slots__ = ("creds", "service", "lock")
+
+    def __init__(self, creds, service):
+        self.creds = creds
+        self.service = service
+        self.lock = threading.Lock()
+
+
 class CalendarService:
     def __init__(self):
         self.SCOPES = SCOPES
         self.CLIENT_SECRETS_FILE = CLIENT_SECRETS_FILE
         self.TOKEN_FILE = TOKEN_FILE
+        self._services = LocalCache(max_entries=settings.CALENDAR_SERVICE_CACHE_SIZE,
+                                    default_ttl=settings.CALENDAR_SERVICE_CACHE_TTL)
 
     def get_calendar_flow(self, redirect_uri: str):
         if not os.path.exists(self.CLIENT_SECRETS_FILE):
@@ -38,30 +86,81 @@ class CalendarService:
 
     def get_user_info(self, creds):
         """Fetch user profile from Google"""
-        service = build('oauth2', 'v2', credentials=creds)
+        service = build_from_document(self._discovery_doc('oauth2', 'v2'), http=self._authorized_http(creds))
         return service.userinfo().get().execute()
 
+    def load_discovery_documents(self):
+        """Parse the bundled static discovery documents once (called at startup)."""
+        for api, version in (('calendar', 'v3'), ('oauth2', 'v2')):
+            self._discovery_doc(api, version)
+
+    def _discovery_doc(self, api: str, version: str) -> dict:
+        key = (api, version)
+        doc = _DISCOVERY_DOCS.get(key)
+        if doc is None:
+            doc = _DISCOVERY_DOCS[key] = json.loads(discovery_cache.get_static_doc(api, version))
+        return doc
+
+    def _build_calendar(self, creds):
+        # GOOGLE_CALENDAR_API_ENDPOINT lets a local fake server stand in for Google (tests, offline dev)
+        client_options = {"api_endpoint": settings.GOOGLE_CALENDAR_API_ENDPOINT} if settings.GOOGLE_CALENDAR_API_ENDPOINT else None
+        local = threading.local()
+
+        def request_builder(http, *args, **kwargs):
+            # The service object is shared across pool threads, but httplib2 is not thread-safe:
+            # each thread gets its own authorized connection (all backed by the same credentials)
+            if getattr(local, "http", None) is None:
+                local.http = self._authorized_http(creds)
+            return HttpRequest(local.http, *args, **kwargs)
+
+        return build_from_document(self._discovery_doc('calendar', 'v3'), http=self._authorized_http(creds),
+                                   requestBuilder=request_builder, client_options=client_options)
+
+    def _authorized_http(self, creds):
+        """Per-socket timeout, so a hung Google response cannot pin a pool thread forever."""
+        return AuthorizedHttp(creds, http=httplib2.Http(timeout=settings.CALENDAR_HTTP_TIMEOUT_SECONDS))
+
+    def _fingerprint(self, info: dict) -> str:
+        """Stable per grant: the refresh token survives access-token refreshes, so the entry does too."""
+        secret = info.get("refresh_token") or info.get("token") or ""
+        raw = f"{info.get('client_id', '')}|{secret}|{settings.GOOGLE_CALENDAR_API_ENDPOINT}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
     def get_calendar_service(self, token_json: str = None):
-        """Build service from token JSON string"""
+        """
+        Calendar service for a stored token JSON string, as (service, new_token).
+        Built services and their credentials are cached per token fingerprint, so a warm call costs
+        only the HTTP request. Credentials are refreshed in place when expired; new_token is set
+        whenever the access token differs from the stored one and must be saved back to the DB.
+        """
         if not token_json:
-            return None
+            return None, None
             
         try:
-            creds = Credentials.from_authorized_user_info(json.loads(token_json), self.SCOPES)
-            
-            if not creds or not creds.valid:
-                if creds and creds.expired and creds.refresh_token:
+            info = json.loads(token_json)
+            key = self._fingerprint(info)
+            entry = self._services.get(key)
+            if entry is None:
+                creds = Credentials.from_authorized_user_info(info, self.SCOPES)
+                entry = _CachedCalendar(creds, self._build_calendar(creds))
+                self._services.set(key, entry)
+
+            with entry.lock:
+                creds = entry.creds
+                if not creds.valid:
+                    if not (creds.expired and creds.refresh_token):
+                        self._services.delete(key)
+                        return None, None
                     try:
                         creds.refresh(Request())
-                        # Note: The caller must save the refreshed token back to DB
-                        return build('calendar', 'v3', credentials=creds), creds.to_json()
                     except Exception as e:
                         print(f"DEBUG: Refresh failed: {e}")
+                        self._services.delete(key)
                         return None, None
-                else:
-                    return None, None
-            
-            return build('calendar', 'v3', credentials=creds), None
+
+            # Note: The caller must save the refreshed token back to DB
+            new_token = creds.to_json() if creds.token != info.get("token") else None
+            return entry.service, new_token
         except Exception as e:
             print(f"DEBUG: Error building service: {e}")
             return None, None
@@ -85,51 +184,51 @@ class CalendarService:
         """Fetch formatted summary of upcoming events"""
         try:
             events, new_token = self.get_upcoming_events(token_json, max_results=max_results)
-            summary_list = []
-            
-            for event in events:
-                start_full = event['start'].get('dateTime', event['start'].get('date'))
-                # Extract date (YYYY-MM-DD -> DD/MM)
-                date_part = start_full.split('T')[0]
-                try:
-                    dt_obj = datetime.date.fromisoformat(date_part)
-                    formatted_date = dt_obj.strftime("%d/%m")
-                except:
-                    formatted_date = ""
-
-                time_part = "Cả ngày"
-                if 'T' in start_full:
-                    # Handle timezone offset if present (+07:00)
-                    time_part = start_full.split('T')[1][:5]
-                    
-                summary_list.append({
-                    "id": event.get('id'),
-                    "title": event.get('summary', 'Sự kiện không tên'),
-                    "date": formatted_date,
-                    "time": time_part,
-                    "occasion": self.map_event_to_occasion(event.get('summary', ''))
-                })
-            # Deduplicate by event ID before returning
-            seen_ids = set()
-            unique_list = []
-            for ev in summary_list:
-                if ev['id'] not in seen_ids:
-                    seen_ids.add(ev['id'])
-                    unique_list.append(ev)
-            return unique_list, new_token
+            return self.format_events_summary(events), new_token
         except Exception as e:
             print(f"DEBUG: Error in events summary: {e}")
             return [], None
 
+    def format_events_summary(self, events: list) -> list:
+        summary_list = []
+        
+        for event in events:
+            start_full = event['start'].get('dateTime', event['start'].get('date'))
+            # Extract date (YYYY-MM-DD -> DD/MM)
+            date_part = start_full.split('T')[0]
+            try:
+                dt_obj = datetime.date.fromisoformat(date_part)
+                formatted_date = dt_obj.strftime("%d/%m")
+            except:
+                formatted_date = ""
+
+            time_part = "Cả ngày"
+            if 'T' in start_full:
+                # Handle timezone offset if present (+07:00)
+                time_part = start_full.split('T')[1][:5]
+                
+            summary_list.append({
+                "id": event.get('id'),
+                "title": event.get('summary', 'Sự kiện không tên'),
+                "date": formatted_date,
+                "time": time_part,
+                "occasion": self.classify_event(event)
+            })
+        # Deduplicate by event ID before returning
+        seen_ids = set()
+        unique_list = []
+        for ev in summary_list:
+            if ev['id'] not in seen_ids:
+                seen_ids.add(ev['id'])
+                unique_list.append(ev)
+        return unique_list
+
     def map_event_to_occasion(self, summary: str) -> OccasionEnum:
-        summary = (summary or "").lower()
-        if any(kw in summary for kw in ['gym', 'sport', 'chạy', 'đá bóng', 'yoga', 'tập']):
-            return OccasionEnum.SPORT
-        if any(kw in summary for kw in ['meeting', 'họp', 'office', 'công ty', 'làm việc', 'phỏng vấn', 'đối tác']):
-            return OccasionEnum.FORMAL
-        if any(kw in summary for kw in ['party', 'tiệc', 'wedding', 'cưới', 'đi chơi', 'date', 'hẹn hò']):
-            return OccasionEnum.CASUAL
-        return OccasionEnum.CASUAL
+        return occasion_matcher.match(summary)
+
+    def classify_event(self, event: dict) -> OccasionEnum:
+        """Occasion of an event resource, memoized per event ID + etag"""
+        return occasion_matcher.classify_event(event)
 
     def get_events_for_range(self, token_json: str, start_time: datetime.datetime, end_time: datetime.datetime):
         """Fetch all events for a specific time range"""
@@ -162,20 +261,18 @@ class CalendarService:
         end_time = datetime.datetime(year, month, last_day, 23, 59, 59)
         
         events, new_token = self.get_events_for_range(token_json, start_time, end_time)
-        
-        formatted_events = []
-        for event in events:
-            start_str = event['start'].get('dateTime', event['start'].get('date'))
-            date_only = start_str.split('T')[0]
-            
-            formatted_events.append({
-                'id': event['id'],
-                'summary': event.get('summary', 'Sự kiện không tên'),
-                'date': date_only,
-                'time': start_str.split('T')[1][:5] if 'T' in start_str else "Cả ngày",
-                'occasion': self.map_event_to_occasion(event.get('summary', ''))
-            })
-        return formatted_events, new_token
+        return [self.format_month_event(event) for event in events], new_token
+
+    def format_month_event(self, event: dict) -> dict:
+        start_str = event['start'].get('dateTime', event['start'].get('date'))
+        date_only = start_str.split('T')[0]
+        return {
+            'id': event['id'],
+            'summary': event.get('summary', 'Sự kiện không tên'),
+            'date': date_only,
+            'time': start_str.split('T')[1][:5] if 'T' in start_str else "Cả ngày",
+            'occasion': self.classify_event(event)
+        }
 
     def get_events_for_day(self, token_json: str, target_date: datetime.date):
         """
@@ -190,42 +287,35 @@ class CalendarService:
         events, new_token = self.get_events_for_range(token_json, start_time, end_time)
         
         # Format events with occasion mapping
-        formatted_events = []
-        for event in events:
-            start_str = event['start'].get('dateTime', event['start'].get('date'))
-            end_str = event['end'].get('dateTime', event['end'].get('date'))
-            
-            formatted_events.append({
-                'id': event['id'],
-                'summary': event.get('summary', 'Sự kiện không tên'),
-                'start_time': start_str,
-                'end_time': end_str,
-                'occasion': self.map_event_to_occasion(event.get('summary', '')),
-                'description': event.get('description', '')
-            })
-        
-        return formatted_events, new_token
+        return [self.format_event_detail(event) for event in events], new_token
+
+    def format_event_detail(self, event: dict) -> dict:
+        return {
+            'id': event['id'],
+            'summary': event.get('summary', 'Sự kiện không tên'),
+            'start_time': event['start'].get('dateTime', event['start'].get('date')),
+            'end_time': event['end'].get('dateTime', event['end'].get('date')),
+            'occasion': self.classify_event(event),
+            'description': event.get('description', '')
+        }
     
-    def get_event_by_id(self, token_json: str, event_id: str):
-        """Fetch a specific event by its ID"""
+    def fetch_event(self, token_json: str, event_id: str):
+        """Raw Google event by ID, as (event, new_token)"""
         service, new_token = self.get_calendar_service(token_json)
         if not service:
             return None, None
             
         try:
-            event = service.events().get(calendarId='primary', eventId=event_id).execute()
-            return {
-                'id': event['id'],
-                'summary': event.get('summary', 'Sự kiện không tên'),
-                'start_time': event['start'].get('dateTime', event['start'].get('date')),
-                'end_time': event['end'].get('dateTime', event['end'].get('date')),
-                'occasion': self.map_event_to_occasion(event.get('summary', '')),
-                'description': event.get('description', '')
-            }, new_token
+            return service.events().get(calendarId='primary', eventId=event_id).execute(), new_token
         except Exception as e:
             print(f"Error fetching event {event_id}: {e}")
             return None, new_token
 
+    def get_event_by_id(self, token_json: str, event_id: str):
+        """Fetch a specific event by its ID"""
+        event, new_token = self.fetch_event(token_json, event_id)
+        return (self.format_event_detail(event) if event else None), new_token
+
 
     def create_event(self, token_json: str, event_data: dict):
         """
@@ -281,27 +371,78 @@ class CalendarService:
 
     def get_current_occasion_from_calendar(self, token_json: str):
         events, new_token = self.get_upcoming_events(token_json, max_results=1)
-        if not events:
-            return None, new_token
-            
-        event = events[0]
+        return self.occasion_from_next_event(events[0] if events else None), new_token
+
+    def occasion_from_next_event(self, event: Optional[dict]):
+        """Occasion of the next event if it starts within the next 2 hours (or started < 1 hour ago)."""
+        if not event:
+            return None
         start_str = event['start'].get('dateTime', event['start'].get('date'))
         try:
             # Handle both Z and +HH:MM formats
             dt_str = start_str.replace('Z', '+00:00')
             start_time = datetime.datetime.fromisoformat(dt_str)
         except:
-            return None, new_token
+            return None
             
         now = datetime.datetime.now(datetime.timezone.utc)
         
-        diff = start_time - now
+        try:
+            diff = start_time - now
+        except TypeError:
+            return None  # All-day event (date only): no start time to compare
         if -datetime.timedelta(hours=1) < diff < datetime.timedelta(hours=2):
             return {
-                "occasion": self.map_event_to_occasion(event.get('summary', '')),
+                "occasion": self.classify_event(event),
                 "summary": event.get('summary', 'Sự kiện sắp tới')
-            }, new_token
-        return None, new_token
+            }
+        return None
+
+class AsyncCalendarClient:
+    """
+    Awaitable access layer over CalendarService for `async def` handlers.
+
+    googleapiclient is blocking, so every call runs on a bounded thread pool
+    (CALENDAR_MAX_WORKERS) and is awaited with CALENDAR_TIMEOUT_SECONDS; a slow Google response
+    raises CalendarTimeout instead of freezing the event loop. `submit` exposes the same pool to
+    sync code that wants to overlap a calendar fetch with other work.
+    """
+    def __init__(self, service: CalendarService):
+        self.service = service
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return _calendar_executor().submit(fn, *args, **kwargs)
+
+    async def run(self, fn: Callable, *args, timeout: float = None, **kwargs):
+        timeout = settings.CALENDAR_TIMEOUT_SECONDS if timeout is None else timeout
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Calendar call {getattr(fn, '__name__', fn)} exceeded {timeout}s")
+            raise CalendarTimeout(f"Google Calendar did not respond within {timeout}s")
+
+    async def get_upcoming_events_summary(self, token_json: str, max_results=10):
+        return await self.run(self.service.get_upcoming_events_summary, token_json, max_results)
+
+    async def get_events_for_day(self, token_json: str, target_date: datetime.date):
+        return await self.run(self.service.get_events_for_day, token_json, target_date)
+
+    async def get_events_for_month(self, token_json: str, year: int, month: int):
+        return await self.run(self.service.get_events_for_month, token_json, year, month)
+
+    async def get_event_by_id(self, token_json: str, event_id: str):
+        return await self.run(self.service.get_event_by_id, token_json, event_id)
+
+    async def create_event(self, token_json: str, event_data: dict):
+        return await self.run(self.service.create_event, token_json, event_data)
+
+    async def update_event(self, token_json: str, event_id: str, event_data: dict):
+        return await self.run(self.service.update_event, token_json, event_id, event_data)
+
+    async def delete_event(self, token_json: str, event_id: str):
+        return await self.run(self.service.delete_event, token_json, event_id)
 
-# Singleton instance
+# Singleton instances
 calendar_service = CalendarService()
+calendar_client = AsyncCalendarClient(calendar_service)
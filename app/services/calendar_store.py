@@ -0,0 +1,229 @@
+import calendar
+import datetime
+import logging
+from typing import Dict, List, Optional, Tuple
+from googleapiclient.errors import HttpError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import CalendarEvent, CalendarSyncState, User
+from app.services.calendar_service import calendar_service, calendar_client, CalendarTimeout
+
+logger = logging.getLogger("app")
+
+
+def _to_utc_naive(value: Optional[Dict]) -> Tuple[Optional[datetime.datetime], bool]:
+    """(naive UTC datetime, all_day) from a Google start/end object ({dateTime} or {date})."""
+    if not value:
+        return None, False
+    if "dateTime" in value:
+        dt = datetime.datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return dt, False
+    if "date" in value:
+        return datetime.datetime.combine(datetime.date.fromisoformat(value["date"]), datetime.time.min), True
+    return None, False
+
+
+class CalendarChanges:
+    """Result of one pull from Google: changed events, the next sync token and a refreshed OAuth token."""
+    def __init__(self, items: List[Dict], sync_token: Optional[str], new_token: Optional[str], full: bool):
+        self.items = items
+        self.sync_token = sync_token
+        self.new_token = new_token
+        self.full = full  # True when the mirror must be replaced rather than patched
+
+
+class CalendarEventStore:
+    """
+    Per-user mirror of the primary Google Calendar in the database.
+
+    Changes are pulled with `events.list` sync tokens, so after the first full sync each refresh
+    only transfers what changed (a 410 Gone from Google falls back to a full sync). A user is
+    refreshed at most once per CALENDAR_SYNC_INTERVAL_SECONDS; calendar views and occasion
+    detection otherwise answer from indexed range queries. Read methods return the same shapes
+    as the matching CalendarService methods.
+
+    Google I/O (`pull`) never touches the database, so it can run on the calendar thread pool
+    while the request session stays on its own thread; `save` applies the result.
+    """
+
+    # --- Sync ---
+
+    def sync_due(self, db: Session, user: User) -> Tuple[bool, Optional[str]]:
+        """(refresh needed?, stored sync token) for this user."""
+        if not user.google_token:
+            return False, None
+        state = db.get(CalendarSyncState, user.id)
+        if state is None or state.last_synced_at is None:
+            return True, None
+        age = (datetime.datetime.utcnow() - state.last_synced_at).total_seconds()
+        return age >= settings.CALENDAR_SYNC_INTERVAL_SECONDS, state.sync_token
+
+    def has_synced(self, db: Session, user_id: int) -> bool:
+        state = db.get(CalendarSyncState, user_id)
+        return state is not None and state.last_synced_at is not None
+
+    def pull(self, token_json: str, sync_token: Optional[str] = None) -> Optional[CalendarChanges]:
+        """Fetch changes since `sync_token` (everything when None). Blocking; no database access."""
+        service, new_token = calendar_service.get_calendar_service(token_json)
+        if not service:
+            return None
+        full = sync_token is None
+        try:
+            items, next_token = self._list_changes(service, sync_token)
+        except HttpError as e:
+            if full or e.resp.status != 410:
+                raise
+            logger.info("Calendar sync token expired. Running full sync.")
+            items, next_token = self._list_changes(service, None)
+            full = True
+        return CalendarChanges(items, next_token, new_token, full)
+
+    def save(self, db: Session, user: User, changes: Optional[CalendarChanges]):
+        """Apply pulled changes to the mirror and record the new sync token."""
+        if changes is None:
+            return
+        if changes.new_token:
+            user.google_token = changes.new_token
+        try:
+            if changes.full:
+                db.query(CalendarEvent).filter(CalendarEvent.user_id == user.id).delete()
+            for event in changes.items:
+                self.apply(db, user.id, event, commit=False)
+            state = db.get(CalendarSyncState, user.id)
+            if state is None:
+                state = CalendarSyncState(user_id=user.id)
+                db.add(state)
+            state.sync_token = changes.sync_token
+            state.last_synced_at = datetime.datetime.utcnow()
+            db.commit()
+            logger.info(f"Calendar sync for user {user.id}: {len(changes.items)} change(s)")
+        except IntegrityError:
+            # Another request synced the same user concurrently; its result is as good as ours
+            db.rollback()
+
+    def sync(self, db: Session, user: User, force: bool = False) -> bool:
+        """Blocking refresh for sync callers (workers, scripts). Returns True if a sync ran."""
+        due, sync_token = self.sync_due(db, user)
+        if not (due or (force and user.google_token)):
+            return False
+        try:
+            changes = self.pull(user.google_token, sync_token)
+        except Exception as e:
+            logger.warning(f"Calendar sync failed for user {user.id}: {e}. Serving local events.")
+            return False
+        self.save(db, user, changes)
+        return changes is not None
+
+    async def refresh(self, db: Session, user: User):
+        """
+        Awaitable refresh for async handlers: the pull runs on the calendar pool.
+        If Google is slow or failing, previously synced events are served; a user who has never
+        been synced gets CalendarTimeout since there is nothing local to fall back to.
+        """
+        due, sync_token = self.sync_due(db, user)
+        if not due:
+            return
+        try:
+            changes = await calendar_client.run(self.pull, user.google_token, sync_token)
+        except CalendarTimeout:
+            if not self.has_synced(db, user.id):
+                raise
+            logger.warning(f"Calendar sync timed out for user {user.id}. Serving local events.")
+            return
+        except Exception as e:
+            logger.warning(f"Calendar sync failed for user {user.id}: {e}. Serving local events.")
+            return
+        self.save(db, user, changes)
+
+    def _list_changes(self, service, sync_token: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+        """All pages of events.list: every event on a full sync, only changes since `sync_token` otherwise."""
+        params = {"calendarId": "primary", "singleEvents": True, "maxResults": 2500}
+        if sync_token:
+            params["syncToken"] = sync_token
+        items, page_token = [], None
+        while True:
+            response = service.events().list(pageToken=page_token, **params).execute()
+            items.extend(response.get("items", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return items, response.get("nextSyncToken")
+
+    # --- Local reads ---
+
+    def get_upcoming_events_summary(self, db: Session, user_id: int, max_results: int = 10) -> List[Dict]:
+        return calendar_service.format_events_summary(self.upcoming(db, user_id, max_results))
+
+    def get_events_for_day(self, db: Session, user_id: int, target_date: datetime.date) -> List[Dict]:
+        start = datetime.datetime.combine(target_date, datetime.time.min)
+        end = datetime.datetime.combine(target_date, datetime.time.max)
+        return [calendar_service.format_event_detail(e) for e in self.events_between(db, user_id, start, end)]
+
+    def get_events_for_month(self, db: Session, user_id: int, year: int, month: int) -> List[Dict]:
+        start = datetime.datetime(year, month, 1, 0, 0, 0)
+        end = datetime.datetime(year, month, calendar.monthrange(year, month)[1], 23, 59, 59)
+        return [calendar_service.format_month_event(e) for e in self.events_between(db, user_id, start, end)]
+
+    def get_event(self, db: Session, user_id: int, event_id: str) -> Optional[Dict]:
+        """Raw mirrored event, or None if it is not (yet) in the mirror."""
+        row = db.query(CalendarEvent).filter(CalendarEvent.user_id == user_id,
+                                             CalendarEvent.event_id == event_id).first()
+        return row.raw if row else None
+
+    def get_current_occasion(self, db: Session, user_id: int) -> Optional[Dict]:
+        upcoming = self.upcoming(db, user_id, 1)
+        return calendar_service.occasion_from_next_event(upcoming[0] if upcoming else None)
+
+    def upcoming(self, db: Session, user_id: int, limit: int) -> List[Dict]:
+        # Start of TODAY (UTC), matching CalendarService.get_upcoming_events
+        today_start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        rows = db.query(CalendarEvent).filter(
+            CalendarEvent.user_id == user_id,
+            CalendarEvent.end_at > today_start
+        ).order_by(CalendarEvent.start_at).limit(limit).all()
+        return [r.raw for r in rows]
+
+    def events_between(self, db: Session, user_id: int, start: datetime.datetime, end: datetime.datetime) -> List[Dict]:
+        """Raw events overlapping [start, end] (naive UTC), ordered by start time, like Google's timeMin/timeMax."""
+        rows = db.query(CalendarEvent).filter(
+            CalendarEvent.user_id == user_id,
+            CalendarEvent.start_at <= end,
+            CalendarEvent.end_at > start
+        ).order_by(CalendarEvent.start_at).all()
+        return [r.raw for r in rows]
+
+    # --- Local writes ---
+
+    def apply(self, db: Session, user_id: int, event: Optional[Dict], commit: bool = True):
+        """Upsert one Google event resource (cancelled events are removed). Used for sync and write-through."""
+        if not event or not event.get("id"):
+            return
+        row = db.query(CalendarEvent).filter(CalendarEvent.user_id == user_id,
+                                             CalendarEvent.event_id == event["id"]).first()
+        if event.get("status") == "cancelled":
+            if row:
+                db.delete(row)
+        else:
+            start_at, all_day = _to_utc_naive(event.get("start"))
+            end_at, _ = _to_utc_naive(event.get("end"))
+            if row is None:
+                row = CalendarEvent(user_id=user_id, event_id=event["id"])
+                db.add(row)
+            row.etag = event.get("etag")
+            row.summary = event.get("summary")
+            row.start_at = start_at
+            row.end_at = end_at or start_at
+            row.all_day = all_day
+            row.raw = event
+        if commit:
+            db.commit()
+
+    def remove(self, db: Session, user_id: int, event_id: str):
+        db.query(CalendarEvent).filter(CalendarEvent.user_id == user_id, CalendarEvent.event_id == event_id).delete()
+        db.commit()
+
+
+# Singleton instance
+calendar_event_store = CalendarEventStore()
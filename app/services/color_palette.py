@@ -0,0 +1,66 @@
+from typing import Dict, List
+import numpy as np
+from PIL import Image
+from app.core.config import settings
+
+_LEVELS = 8  # Quantization levels per channel (8^3 = 512 histogram bins)
+_SHIFT = 5   # 256 / _LEVELS == 1 << _SHIFT
+
+
+def _hex(rgb) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*(int(round(c)) for c in rgb))
+
+
+def opaque_pixels(image: Image.Image, sample_size: int = 100) -> np.ndarray:
+    """(N, 3) uint8 RGB of the non-transparent pixels of a downscaled copy of the image."""
+    img = np.asarray(image.convert("RGBA").resize((sample_size, sample_size)))
+    return img[img[:, :, 3] > 0][:, :3]
+
+
+def extract_palette(image: Image.Image, max_colors: int = None, merge_distance: float = None) -> List[Dict]:
+    """
+    Main colors of an image (transparent background ignored) as
+    [{"hex": "#rrggbb", "coverage": 0.62}, ...], most covering first.
+
+    Pixels are counted in a 3D histogram of 8 levels per channel, each bin colored by the mean
+    of its pixels rather than its corner. Bins are then merged greedily, largest first, into the
+    nearest palette color within `merge_distance` (RGB Euclidean), so shading of one fabric
+    spread over neighbouring bins ends up as a single color. Coverage is the pixel share.
+    """
+    max_colors = max_colors or settings.COLOR_PALETTE_SIZE
+    merge_distance = settings.COLOR_MERGE_DISTANCE if merge_distance is None else merge_distance
+
+    pixels = opaque_pixels(image)
+    if len(pixels) == 0:
+        return []
+
+    rgb = pixels.astype(np.int64)
+    bins = ((rgb[:, 0] >> _SHIFT) * _LEVELS + (rgb[:, 1] >> _SHIFT)) * _LEVELS + (rgb[:, 2] >> _SHIFT)
+    counts = np.bincount(bins, minlength=_LEVELS ** 3)
+    sums = np.stack([np.bincount(bins, weights=rgb[:, c], minlength=_LEVELS ** 3) for c in range(3)], axis=1)
+    used = np.flatnonzero(counts)
+    used = used[np.argsort(-counts[used], kind="stable")]
+
+    # Greedy merge of occupied bins (at most 512) into weighted-mean clusters
+    centers, weights = [], []
+    for b in used:
+        color = sums[b] / counts[b]
+        if centers:
+            dist = np.linalg.norm(np.asarray(centers) - color, axis=1)
+            nearest = int(np.argmin(dist))
+            if dist[nearest] <= merge_distance:
+                total = weights[nearest] + counts[b]
+                centers[nearest] = (centers[nearest] * weights[nearest] + sums[b]) / total
+                weights[nearest] = total
+                continue
+        centers.append(color)
+        weights.append(int(counts[b]))
+
+    order = np.argsort(-np.asarray(weights), kind="stable")[:max_colors]
+    return [{"hex": _hex(centers[i]), "coverage": round(float(weights[i]) / len(pixels), 4)} for i in order]
+
+
+def dominant_color(image: Image.Image) -> str:
+    """Hex of the most covering palette color, "#000000" for a fully transparent image."""
+    palette = extract_palette(image, max_colors=1)
+    return palette[0]["hex"] if palette else "#000000"
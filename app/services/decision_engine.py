@@ -1,10 +1,25 @@
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from typing import Optional, Dict, Any, List
 from app.domain.fashion_taxonomy import ClassificationStatus
 
 logger = logging.getLogger("app")
 
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _explanation_executor() -> ThreadPoolExecutor:
+    """Shared, bounded pool for concurrent LLM explanation calls (created on first use)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from app.core.config import settings
+            _executor = ThreadPoolExecutor(max_workers=settings.EXPLANATION_MAX_WORKERS, thread_name_prefix="explain")
+        return _executor
+
 class FailureCode(str, Enum):
     LOW_CONFIDENCE = "LOW_CONFIDENCE"
     CONFLICTING_CONTEXT = "CONFLICTING_CONTEXT"
@@ -49,12 +64,36 @@ class DecisionEngine:
             "reason": "Phân loại chính xác cao."
         }
 
+    STYLIST_SYSTEM_PROMPT = "You are an expert personal stylist AI. Provide a deep, analytical explanation for an outfit's suitability score (0-100). Focus on pros/cons, weather logic, and occasion alignment. Use friendly but professional Vietnamese."
+    LLM_URL = "https://openrouter.ai/api/v1/chat/completions"
+    LLM_TIMEOUT_SECONDS = 5.0
+
     @classmethod
     def get_recommendation_explanation(cls, items: List[Any], weather: Dict, occasion: str, score: int, breakdown: List[str], event_name: str = None) -> str:
         """
         Generates dynamic, item-aware explanations (XAI-Lite) using DeepSeek LLM if available,
         falling back to deterministic reasoning if the API fails or is disabled.
         """
+        from app.services.explanation_cache import explanation_cache
+
+        fallback_text = cls.get_fallback_explanation(items, weather, occasion, score, event_name)
+        if not cls._llm_enabled():
+            return fallback_text
+
+        suitability_pct = min(100, max(0, round(score)))
+        cache_key = explanation_cache.make_key(items, score, weather, occasion, event_name)
+        ai_text = explanation_cache.get(cache_key)
+        if ai_text is None:
+            ai_text = cls._request_llm_explanation(items, weather, occasion, suitability_pct, event_name, cls.LLM_TIMEOUT_SECONDS)
+            explanation_cache.set(cache_key, ai_text)
+        if ai_text:
+            # Ensure the response includes the required prefix for UI consistency
+            return f"🎯 Độ phù hợp: {suitability_pct}/100 | ✨ Stylist AI: {ai_text}"
+        return fallback_text
+
+    @classmethod
+    def get_fallback_explanation(cls, items: List[Any], weather: Dict, occasion: str, score: int, event_name: str = None) -> str:
+        """Base deterministic explanation, used when the LLM is disabled, fails or misses its deadline."""
         temp = weather.get("temp", 25)
         condition = weather.get("condition", "Nắng")
         item_names = [getattr(i, 'category_label', 'đồ') for i in items]
@@ -62,7 +101,6 @@ class DecisionEngine:
         # Score from algorithm: max possible score is exactly 100 points.
         suitability_pct = min(100, max(0, round(score)))
         
-        # Base deterministic explanation (Fallback)
         event_ctx = f" sự kiện '{event_name}'" if event_name else ""
         base = f"🎯 Độ phù hợp: {suitability_pct}/100 | ✨ Phân tích: "
         
@@ -82,25 +120,111 @@ class DecisionEngine:
             status_desc = "chưa thực sự tối ưu"
 
         action = f"Sự kết hợp giữa {', '.join(item_names)} {status_desc} cho {weather_desc} ({temp}°C) và bối cảnh {occasion}{event_ctx}."
-        fallback_text = f"{base}{action}"
+        return f"{base}{action}"
+
+    @classmethod
+    def get_recommendation_explanations(cls, outfits: List[Dict], weather: Dict, occasion: str,
+                                        event_name: str = None, deadline: float = None) -> List[str]:
+        """
+        Explains several outfits at once (each a dict with 'items' and 'score').
+        LLM calls share one deadline; outfits that miss it get the deterministic fallback.
+        """
+        reasons = [None] * len(outfits)
+        for index, reason in cls.iter_recommendation_explanations(outfits, weather, occasion, event_name, deadline):
+            reasons[index] = reason
+        return reasons
 
-        # Attempt to use DeepSeek LLM
+    @classmethod
+    def iter_recommendation_explanations(cls, outfits: List[Dict], weather: Dict, occasion: str,
+                                         event_name: str = None, deadline: float = None):
+        """
+        Yields (index, reason) pairs as explanations become available.
+        EXPLANATION_MODE=parallel fans out one bounded call per outfit;
+        EXPLANATION_MODE=batched explains all outfits in a single LLM round trip.
+        """
+        from app.core.config import settings
+        from concurrent.futures import as_completed, TimeoutError as FuturesTimeout
+
+        fallbacks = [cls.get_fallback_explanation(o["items"], weather, occasion, o["score"], event_name) for o in outfits]
+        if not outfits or not cls._llm_enabled():
+            yield from enumerate(fallbacks)
+            return
+
+        from app.services.explanation_cache import explanation_cache
+
+        budget = settings.EXPLANATION_DEADLINE_SECONDS if deadline is None else deadline
+        expires_at = time.monotonic() + budget
+        pcts = [min(100, max(0, round(o["score"]))) for o in outfits]
+
+        # Repeat outfits in the same context never pay LLM latency twice
+        keys = [explanation_cache.make_key(o["items"], o["score"], weather, occasion, event_name) for o in outfits]
+        misses = []
+        for index, ai_text in enumerate(explanation_cache.get_many(keys)):
+            if ai_text:
+                yield index, f"🎯 Độ phù hợp: {pcts[index]}/100 | ✨ Stylist AI: {ai_text}"
+            else:
+                misses.append(index)
+        if not misses:
+            return
+
+        if settings.EXPLANATION_MODE == "batched":
+            texts = cls._request_llm_batch_explanations([outfits[i] for i in misses], weather, occasion,
+                                                        [pcts[i] for i in misses], event_name,
+                                                        min(budget, cls.LLM_TIMEOUT_SECONDS * 2))
+            for position, index in enumerate(misses):
+                ai_text = texts.get(position)
+                explanation_cache.set(keys[index], ai_text)
+                yield index, f"🎯 Độ phù hợp: {pcts[index]}/100 | ✨ Stylist AI: {ai_text}" if ai_text else fallbacks[index]
+            return
+
+        timeout = min(budget, cls.LLM_TIMEOUT_SECONDS)
+        futures = {
+            _explanation_executor().submit(cls._request_llm_explanation, outfits[index]["items"], weather, occasion,
+                                           pcts[index], event_name, timeout): index
+            for index in misses
+        }
+        pending = set(futures.values())
+        try:
+            for future in as_completed(futures, timeout=max(0.0, expires_at - time.monotonic())):
+                index = futures[future]
+                pending.discard(index)
+                ai_text = future.result()
+                explanation_cache.set(keys[index], ai_text)
+                yield index, f"🎯 Độ phù hợp: {pcts[index]}/100 | ✨ Stylist AI: {ai_text}" if ai_text else fallbacks[index]
+        except FuturesTimeout:
+            logger.warning(f"Explanation deadline ({budget}s) exceeded for {len(pending)} outfit(s). Using deterministic fallback.")
+            for future, index in futures.items():
+                if index in pending:
+                    future.cancel()
+            for index in sorted(pending):
+                yield index, fallbacks[index]
+
+    @classmethod
+    def _llm_enabled(cls) -> bool:
         from app.core.config import settings
-        import requests
-        
         # Verify the key is not default/missing
-        if not settings.DEEPSEEK_API_KEY or "your_" in settings.DEEPSEEK_API_KEY:
-            return fallback_text
+        return bool(settings.DEEPSEEK_API_KEY) and "your_" not in settings.DEEPSEEK_API_KEY
 
+    @classmethod
+    def _llm_headers(cls) -> Dict[str, str]:
+        from app.core.config import settings
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
+            "HTTP-Referer": "http://localhost:8000",
+            "X-Title": "OutfitAI"
+        }
+
+    @classmethod
+    def _request_llm_explanation(cls, items: List[Any], weather: Dict, occasion: str, suitability_pct: int,
+                                 event_name: Optional[str], timeout: float) -> Optional[str]:
+        """Single-outfit DeepSeek call. Returns the cleaned stylist text, or None on any failure."""
+        import requests
+
+        temp = weather.get("temp", 25)
+        condition = weather.get("condition", "Nắng")
+        item_names = [getattr(i, 'category_label', 'đồ') for i in items]
         try:
-            url = "https://openrouter.ai/api/v1/chat/completions"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-                "HTTP-Referer": "http://localhost:8000",
-                "X-Title": "OutfitAI"
-            }
-            
             event_line = f"Sự kiện: '{event_name}'.\n" if event_name else ""
             prompt = f"Bối cảnh: {occasion}. Thời tiết: {condition}, {temp}°C.\n" \
                      f"{event_line}" \
@@ -115,30 +239,81 @@ class DecisionEngine:
             payload = {
                 "model": "deepseek/deepseek-chat",
                 "messages": [
-                    {"role": "system", "content": "You are an expert personal stylist AI. Provide a deep, analytical explanation for an outfit's suitability score (0-100). Focus on pros/cons, weather logic, and occasion alignment. Use friendly but professional Vietnamese."},
+                    {"role": "system", "content": cls.STYLIST_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 "temperature": 0.5,
                 "max_tokens": 400
             }
             
-            # Use a slightly longer timeout (max 5 seconds) to ensure response
-            response = requests.post(url, headers=headers, json=payload, timeout=5.0)
+            response = requests.post(cls.LLM_URL, headers=cls._llm_headers(), json=payload, timeout=timeout)
             
             if response.status_code == 200:
                 data = response.json()
                 if "choices" in data and len(data["choices"]) > 0:
                     ai_text = data["choices"][0]["message"]["content"].strip()
-                    ai_text = ai_text.replace('"', '').replace("'", "")
-                    # Ensure the response includes the required prefix for UI consistency
-                    return f"🎯 Độ phù hợp: {suitability_pct}/100 | ✨ Stylist AI: {ai_text}"
+                    return ai_text.replace('"', '').replace("'", "")
             else:
                 logger.warning(f"DeepSeek API returned {response.status_code}: {response.text}")
                 
         except (requests.exceptions.RequestException, Exception) as e:
             logger.warning(f"DeepSeek API Call failed: {e}. Using deterministic fallback.")
-            
-        return fallback_text
+        return None
+
+    @classmethod
+    def _request_llm_batch_explanations(cls, outfits: List[Dict], weather: Dict, occasion: str, pcts: List[int],
+                                        event_name: Optional[str], timeout: float) -> Dict[int, str]:
+        """
+        Explains all outfits in one DeepSeek round trip.
+        Returns {outfit_index: cleaned text}; outfits missing from the reply are simply absent.
+        """
+        import requests
+        import json
+
+        temp = weather.get("temp", 25)
+        condition = weather.get("condition", "Nắng")
+        try:
+            event_line = f"Sự kiện: '{event_name}'.\n" if event_name else ""
+            outfit_lines = "".join(
+                f"{n}. {', '.join(getattr(i, 'category_label', 'đồ') for i in o['items'])} (Điểm phù hợp: {pcts[n - 1]}/100)\n"
+                for n, o in enumerate(outfits, start=1)
+            )
+            prompt = f"Bối cảnh: {occasion}. Thời tiết: {condition}, {temp}°C.\n" \
+                     f"{event_line}" \
+                     f"Có {len(outfits)} bộ trang phục:\n{outfit_lines}" \
+                     f"Hãy đóng vai Stylist AI giàu kinh nghiệm. Với MỖI bộ, viết 2-3 câu tiếng Việt giải thích số điểm " \
+                     f"(ưu/nhược điểm về màu sắc, thời tiết hoặc bối cảnh) và nêu điểm chưa ổn nếu điểm thấp.\n" \
+                     f"Chỉ trả về JSON hợp lệ dạng {{\"1\": \"...\", \"2\": \"...\"}} với key là số thứ tự bộ đồ. Không dùng ngoặc kép trong nội dung."
+
+            payload = {
+                "model": "deepseek/deepseek-chat",
+                "messages": [
+                    {"role": "system", "content": cls.STYLIST_SYSTEM_PROMPT + " Always output strictly valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                "response_format": {"type": "json_object"},
+                "temperature": 0.5,
+                "max_tokens": 300 * len(outfits)
+            }
+
+            response = requests.post(cls.LLM_URL, headers=cls._llm_headers(), json=payload, timeout=timeout)
+            if response.status_code == 200:
+                content = response.json()["choices"][0]["message"]["content"].strip()
+                # In case OpenRouter wrapper ignores response_format and adds markdown ticks
+                if content.startswith("```json"):
+                    content = content[7:-3].strip()
+                elif content.startswith("```"):
+                    content = content[3:-3].strip()
+                parsed = json.loads(content)
+                texts = {}
+                for key, text in parsed.items():
+                    if str(key).isdigit() and 1 <= int(key) <= len(outfits) and isinstance(text, str) and text.strip():
+                        texts[int(key) - 1] = text.strip().replace('"', '').replace("'", "")
+                return texts
+            logger.warning(f"DeepSeek batch API returned {response.status_code}: {response.text}")
+        except Exception as e:
+            logger.warning(f"DeepSeek batch explanation failed: {e}. Using deterministic fallback.")
+        return {}
 
     @classmethod
     def validate_outfit_safety(cls, items: List[Any], weather: Dict) -> Dict[str, Any]:
@@ -164,12 +339,13 @@ class DecisionEngine:
         return {"status": "CONFIRMED", "reason": "Safe combination."}
 
     @classmethod
-    def log_decision_metrics(cls, action_type: str, status: str, metadata: Dict = None):
+    def log_decision_metrics(cls, action_type: str, status: str, metadata: Dict = None, value: float = None):
         """
-        Logs non-ML decision metrics for audit and improvement.
+        Records non-ML decision metrics for audit and improvement.
+        Events are counted in the sampled metrics sink; the log line is only formatted when INFO is enabled.
         """
-        logger.info(
-            f"[DECISION_METRIC] Type: {action_type} | Status: {status} | Details: {metadata or {}}"
-        )
+        from app.core.metrics import decision_metrics
+        decision_metrics.record(action_type, str(getattr(status, "value", status)), value=value, metadata=metadata)
+        logger.info("[DECISION_METRIC] Type: %s | Status: %s | Details: %s", action_type, status, metadata or {})
 
 decision_engine = DecisionEngine()
@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from app.core.cache import cache, LocalCache
+from app.core.config import settings
+
+logger = logging.getLogger("app")
+
+
+class ExplanationCache:
+    """
+    Content-addressed cache for Stylist AI explanation texts.
+
+    The key is derived from the outfit signature (sorted item IDs) and its context:
+    score bucket, weather bucket (rounded temperature + condition), occasion and event name.
+    Lookups go to a bounded in-process LRU/TTL tier first, then to the shared `Cache` (Redis).
+    Only LLM texts are stored; the score prefix is rebuilt by the caller, and
+    deterministic fallbacks are never cached so a later LLM success can replace them.
+    """
+    KEY_PREFIX = "expl:v1:"
+
+    def __init__(self, backend=None, local_size: int = None, ttl: int = None):
+        self.backend = backend or cache
+        self.ttl = ttl or settings.EXPLANATION_CACHE_TTL
+        self.local = LocalCache(max_entries=local_size or settings.EXPLANATION_CACHE_LOCAL_SIZE, default_ttl=self.ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.remote_hits = 0
+
+    def make_key(self, items: List[Any], score: float, weather: Dict, occasion: str, event_name: str = None) -> str:
+        item_ids = ",".join(str(i) for i in sorted(getattr(item, "id", 0) or 0 for item in items))
+        score_bucket = min(100, max(0, round(score))) // settings.EXPLANATION_CACHE_SCORE_BUCKET
+        temp_bucket = int(round(weather.get("temp", 25)))
+        condition = weather.get("condition", "")
+        signature = f"{item_ids}|{score_bucket}|{temp_bucket}|{condition}|{occasion}|{event_name or ''}"
+        return self.KEY_PREFIX + hashlib.sha1(signature.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not settings.ENABLE_CACHING:
+            return None
+        text = self.local.get(key)
+        if text is None:
+            text = self.backend.get(key)
+            if text is not None:
+                self.local.set(key, text)
+                with self._lock:
+                    self.remote_hits += 1
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Like get() for several keys; local misses are fetched from the backend in one round trip."""
+        if not settings.ENABLE_CACHING:
+            return [None] * len(keys)
+        texts = [self.local.get(key) for key in keys]
+        remote = [i for i, text in enumerate(texts) if text is None]
+        if remote:
+            for index, text in zip(remote, self.backend.mget([keys[i] for i in remote])):
+                if text is not None:
+                    self.local.set(keys[index], text)
+                    texts[index] = text
+        found_remote = sum(1 for i in remote if texts[i] is not None)
+        with self._lock:
+            self.remote_hits += found_remote
+            self.hits += sum(1 for text in texts if text is not None)
+            self.misses += sum(1 for text in texts if text is None)
+        return texts
+
+    def set(self, key: str, text: str):
+        if not text or not settings.ENABLE_CACHING:
+            return
+        self.local.set(key, text)
+        self.backend.set(key, text, ttl=self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "remote_hits": self.remote_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "local": self.local.stats(),
+            }
+
+
+# Global singleton
+explanation_cache = ExplanationCache()
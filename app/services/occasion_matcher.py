@@ -0,0 +1,78 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional
+from app.core.cache import LocalCache
+from app.core.config import settings
+from app.db.models import OccasionEnum
+
+_COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+
+
+def fold_text(text: str) -> str:
+    """Lowercase and strip Vietnamese diacritics ("Họp Đối tác" -> "hop doi tac")."""
+    text = unicodedata.normalize("NFD", (text or "").lower()).replace("đ", "d")
+    return _COMBINING_MARKS.sub("", text)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, NFC-composed text (so precomposed and combining forms compare equal)."""
+    return unicodedata.normalize("NFC", (text or "").lower())
+
+
+class OccasionMatcher:
+    """
+    Event summary -> occasion classifier.
+
+    The rule table (occasion -> keywords, checked in order, first occasion with a hit wins) is
+    compiled once into a single regex. Summaries written with diacritics are matched against the
+    accented keywords, since folding would merge distinct words ("chay"/"chạy", "hộp"/"họp");
+    summaries typed without any ("hop team") are matched against the folded keywords. Keywords
+    match at the start of a word. Results are memoized per event ID and etag, since Google
+    changes the etag whenever an event is edited.
+    """
+    def __init__(self, rules: Dict[str, List[str]] = None, default: OccasionEnum = OccasionEnum.CASUAL,
+                 memo_size: int = None):
+        rules = settings.OCCASION_KEYWORDS if rules is None else rules
+        self.default = default
+        self.occasions = [OccasionEnum(name) for name in rules]
+        self.pattern = self._compile(rules, normalize_text)
+        self.folded_pattern = self._compile(rules, fold_text)
+        self.memo = LocalCache(max_entries=memo_size or settings.OCCASION_MEMO_SIZE, default_ttl=0)
+
+    @staticmethod
+    def _compile(rules: Dict[str, List[str]], transform) -> Optional[re.Pattern]:
+        alternatives = []
+        for index, keywords in enumerate(rules.values()):
+            forms = sorted({transform(kw) for kw in keywords if kw}, key=len, reverse=True)
+            if forms:
+                alternatives.append(f"(?P<o{index}>{'|'.join(re.escape(kw) for kw in forms)})")
+        return re.compile(r"\b(?:" + "|".join(alternatives) + ")") if alternatives else None
+
+    def match(self, summary: str) -> OccasionEnum:
+        text = normalize_text(summary)
+        folded = fold_text(text)
+        pattern = self.pattern if folded != text else self.folded_pattern
+        if pattern is None:
+            return self.default
+        found = {m.lastgroup for m in pattern.finditer(text)}
+        if not found:
+            return self.default
+        return self.occasions[min(int(group[1:]) for group in found)]
+
+    def classify_event(self, event: Optional[Dict]) -> OccasionEnum:
+        """Occasion of a Google event resource, memoized by (id, etag) when both are present."""
+        if not event:
+            return self.default
+        key = f"{event['id']}:{event['etag']}" if event.get("id") and event.get("etag") else None
+        if key is not None:
+            occasion = self.memo.get(key)
+            if occasion is not None:
+                return occasion
+        occasion = self.match(event.get("summary", ""))
+        if key is not None:
+            self.memo.set(key, occasion)
+        return occasion
+
+
+# Global singleton
+occasion_matcher = OccasionMatcher()
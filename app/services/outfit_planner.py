@@ -0,0 +1,164 @@
+import datetime
+import logging
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.geo import geohash_decode
+from app.db.database import SessionLocal
+from app.db.models import OccasionEnum, OutfitPlan, User
+from app.services.calendar_service import calendar_service
+from app.services.calendar_store import calendar_event_store
+from app.services.recommendation_engine import recommendation_engine
+from app.services.weather_service import WeatherUnavailable, weather_service
+
+logger = logging.getLogger("app")
+
+
+class OutfitPlanner:
+    """
+    Nightly next-day outfit plans.
+
+    For every recently active user, the planner takes the forecast for their last known grid
+    cell and their calendar events for the day, and stores the ranked outfits (with Stylist AI
+    reasons) per context: one per event plus one per OUTFIT_PLAN_OCCASIONS entry. /recommend
+    serves a plan instead of scoring when the context matches, the wardrobe is unchanged and the
+    actual weather is within OUTFIT_PLAN_TEMP_TOLERANCE of the forecast with the same condition.
+    """
+
+    def local_today(self) -> datetime.date:
+        return datetime.datetime.now(ZoneInfo(settings.OUTFIT_PLAN_TIMEZONE)).date()
+
+    def active_user_ids(self, db: Session) -> List[int]:
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=settings.OUTFIT_PLAN_ACTIVE_DAYS)
+        rows = db.query(User.id).filter(User.last_location_cell.isnot(None), User.last_active_at >= since).all()
+        return [row.id for row in rows]
+
+    def touch(self, db: Session, user: User, cell: str):
+        """Remember where and when a user last asked for outfits (one write per day or move)."""
+        now = datetime.datetime.utcnow()
+        if user.last_location_cell != cell or user.last_active_at is None or user.last_active_at.date() != now.date():
+            user.last_location_cell = cell
+            user.last_active_at = now
+            db.commit()
+
+    # --- Planning ---
+
+    def plan_user(self, db: Session, user: User, plan_date: datetime.date) -> int:
+        """
+        Compute and store all plans of one user for `plan_date`. Returns the number of plans; none
+        are made while the forecast is unavailable (plans must not be scored against placeholder weather).
+        """
+        if not user.last_location_cell:
+            return 0
+        try:
+            weather = self.forecast_for(user.last_location_cell, plan_date)
+        except WeatherUnavailable:
+            logger.warning(f"No forecast for cell {user.last_location_cell}. Skipping outfit planning for user {user.id}.")
+            return 0
+        version = recommendation_engine.wardrobe_version(user.id)
+        stored = 0
+        for occasion, event_name in self.contexts_for(db, user, plan_date):
+            outfits = recommendation_engine.plan(db, user.id, dict(weather), occasion, event_name)
+            if not outfits:
+                continue
+            self._store(db, user.id, plan_date, occasion, event_name, weather, outfits, version)
+            stored += 1
+
+        # Keep yesterday's plans (a late-night request may still need them), drop anything older
+        db.query(OutfitPlan).filter(OutfitPlan.user_id == user.id,
+                                    OutfitPlan.plan_date < plan_date - datetime.timedelta(days=1)).delete()
+        db.commit()
+        return stored
+
+    def plan_all(self, plan_date: datetime.date = None) -> Dict[str, int]:
+        """Plan every active user in one session (the Celery path fans out per user instead)."""
+        plan_date = plan_date or self.local_today() + datetime.timedelta(days=1)
+        db = SessionLocal()
+        users = plans = failed = 0
+        try:
+            for user_id in self.active_user_ids(db):
+                users += 1
+                try:
+                    plans += self.plan_user(db, db.get(User, user_id), plan_date)
+                except Exception as e:
+                    db.rollback()
+                    failed += 1
+                    logger.error(f"Outfit planning failed for user {user_id}: {e}")
+        finally:
+            db.close()
+        return {"users": users, "plans": plans, "failed": failed}
+
+    def forecast_for(self, cell: str, plan_date: datetime.date) -> Dict:
+        """
+        {"temp", "condition"} expected on `plan_date` in a geohash cell (daily mean temperature).
+        Raises WeatherUnavailable; the cell is not marked active, so nightly planning does not
+        trigger prefetching.
+        """
+        lat, lon = geohash_decode(cell)
+        weather = weather_service.get_forecast(lat, lon)
+        offset = (plan_date - self.local_today()).days
+        day = next((d for d in weather.get("forecast", []) if d["day"] == offset), None)
+        if day is None:
+            return {"temp": weather["temp"], "condition": weather["condition"]}
+        return {"temp": round((day["max_temp"] + day["min_temp"]) / 2, 1), "condition": day["condition"]}
+
+    def contexts_for(self, db: Session, user: User, plan_date: datetime.date) -> List[Tuple[OccasionEnum, Optional[str]]]:
+        """(occasion, event_name) pairs to plan: each calendar event of the day, then plain occasions."""
+        contexts = []
+        if user.google_token:
+            calendar_event_store.sync(db, user)
+            # The local day as naive UTC bounds, like the mirror stores them
+            zone = ZoneInfo(settings.OUTFIT_PLAN_TIMEZONE)
+            start, end = (datetime.datetime.combine(plan_date, t, zone).astimezone(datetime.timezone.utc).replace(tzinfo=None)
+                          for t in (datetime.time.min, datetime.time.max))
+            for event in calendar_event_store.events_between(db, user.id, start, end):
+                if event.get("summary"):
+                    contexts.append((calendar_service.classify_event(event), event["summary"]))
+        contexts.extend((OccasionEnum(name), None) for name in settings.OUTFIT_PLAN_OCCASIONS)
+        return list(dict.fromkeys(contexts))
+
+    def _store(self, db: Session, user_id: int, plan_date: datetime.date, occasion: OccasionEnum,
+               event_name: Optional[str], weather: Dict, outfits: List[Dict], version: int):
+        plan = self._find(db, user_id, plan_date, occasion, event_name)
+        if plan is None:
+            plan = OutfitPlan(user_id=user_id, plan_date=plan_date, occasion=OccasionEnum(occasion).value,
+                              event_name=event_name or "")
+            db.add(plan)
+        plan.weather = weather
+        plan.outfits = outfits
+        plan.wardrobe_version = version
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # Planned concurrently by another worker
+
+    # --- Serving ---
+
+    def lookup(self, db: Session, user_id: int, occasion: OccasionEnum, weather: Dict,
+               event_name: str = None) -> Optional[List[Dict]]:
+        """Today's planned outfits for this context, hydrated like cached ones; None if there is no usable plan."""
+        if not settings.OUTFIT_PLAN_ENABLED:
+            return None
+        plan = self._find(db, user_id, self.local_today(), occasion, event_name)
+        if plan is None or plan.wardrobe_version != recommendation_engine.wardrobe_version(user_id):
+            return None
+        planned = plan.weather or {}
+        if planned.get("condition") != weather.get("condition") or \
+                abs(planned.get("temp", 0) - weather.get("temp", 25)) > settings.OUTFIT_PLAN_TEMP_TOLERANCE:
+            return None
+        return recommendation_engine._hydrate_cached(db, user_id, plan.outfits)
+
+    def _find(self, db: Session, user_id: int, plan_date: datetime.date, occasion: OccasionEnum,
+              event_name: Optional[str]) -> Optional[OutfitPlan]:
+        return db.query(OutfitPlan).filter(
+            OutfitPlan.user_id == user_id,
+            OutfitPlan.plan_date == plan_date,
+            OutfitPlan.occasion == OccasionEnum(occasion).value,
+            OutfitPlan.event_name == (event_name or "")
+        ).first()
+
+
+# Singleton instance
+outfit_planner = OutfitPlanner()
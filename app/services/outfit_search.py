@@ -0,0 +1,238 @@
+from typing import List, Dict, Optional, Callable, Set
+from app.domain.fashion_taxonomy import FashionCategory, ClassificationStatus
+
+# Safety margin added to every bound so float rounding can never prune an exact optimum
+BOUND_EPSILON = 1e-6
+
+
+class ItemFeatures:
+    """
+    Per-item scoring inputs for one request context (weather + occasion).
+    Every term of RecommendationEngine._evaluate_outfit is a function of these fields.
+    """
+    __slots__ = ("item", "id", "occ_match", "is_outer", "heavy", "colored", "good_color",
+                 "confirmed", "conf", "penalty")
+
+    def __init__(self, item, engine, temp: float, occasion):
+        label = (item.category_label or "").lower()
+        self.item = item
+        self.id = item.id
+        self.occ_match = item.occasion == occasion
+        self.is_outer = item.category == FashionCategory.OUTERWEAR
+        self.heavy = "coat" in label or "jacket" in label
+        self.colored = bool(item.main_color_hex)
+        self.good_color = False
+        if self.colored:
+            brightness = engine._get_color_brightness(item.main_color_hex)
+            self.good_color = brightness > 0.6 if temp > 25 else brightness < 0.4
+        self.confirmed = item.classification_status == ClassificationStatus.CONFIRMED
+        self.conf = item.confidence_score or 0.0
+        self.penalty = 0
+        if item.classification_status == ClassificationStatus.LOW_CONFIDENCE:
+            self.penalty = engine.LOW_CONFIDENCE_PENALTY
+        elif item.classification_status == ClassificationStatus.UNKNOWN:
+            self.penalty = engine.UNKNOWN_CATEGORY_PENALTY
+
+    def additive(self, n: int) -> float:
+        """Confidence, penalty and tie-breaker contribution of this item in an n-item outfit."""
+        quality = (10 + 5 * self.conf) if self.confirmed else 0.0
+        return quality / n + self.penalty + self.id / 1000000.0
+
+
+def score_features(engine, feats: List[ItemFeatures], temp: float) -> int:
+    """
+    Exact integer score of an outfit from its item features.
+    Mirrors the operation order of RecommendationEngine._evaluate_outfit so results are bit-identical.
+    """
+    n = len(feats)
+    score = engine.MATCH_BASE_SCORE
+
+    match_count = sum(1 for f in feats if f.occ_match)
+    if match_count > 0:
+        score += (match_count / n) * engine.OCCASION_MATCH_BONUS
+        if match_count == n:
+            score += 10
+    else:
+        score -= 10
+
+    if temp < 18:
+        score += engine.WEATHER_MATCH_BONUS if any(f.is_outer for f in feats) else -20
+    elif temp > 28:
+        score += -15 if any(f.heavy for f in feats) else engine.WEATHER_MATCH_BONUS
+
+    colored = [f for f in feats if f.colored]
+    if colored:
+        score += (sum(1 for f in colored if f.good_color) / len(colored)) * 15
+
+    confirmed_count = sum(1 for f in feats if f.confirmed)
+    if confirmed_count > 0:
+        extra_granular = sum(f.conf for f in feats if f.confirmed)
+        score += (confirmed_count / n) * 10 + (extra_granular * (5 / n))
+
+    score += sum(f.id for f in feats) / 1000000.0
+
+    for f in feats:
+        if f.penalty:
+            score += f.penalty
+    return int(score)
+
+
+class RankedCandidates:
+    """
+    Candidate source over a pre-built list (BASELINE strategy and partial-wardrobe fallback).
+    Ordering matches the historical sort: score descending, then sorted item IDs.
+    """
+    def __init__(self, candidates: List[Dict]):
+        self.desc = sorted(candidates, key=lambda x: (-x["score"], tuple(sorted(i.id for i in x["items"]))))
+        self.asc = sorted(self.desc, key=lambda x: x["score"])
+
+    def best(self, used_ids: Set[int], accept: Optional[Callable] = None) -> Optional[Dict]:
+        return self._first(self.desc, used_ids, accept)
+
+    def worst(self, used_ids: Set[int], accept: Optional[Callable] = None) -> Optional[Dict]:
+        return self._first(self.asc, used_ids, accept)
+
+    def _first(self, ordered: List[Dict], used_ids: Set[int], accept: Optional[Callable]) -> Optional[Dict]:
+        for c in ordered:
+            if not used_ids.isdisjoint(i.id for i in c["items"]):
+                continue
+            if accept and not accept(c["items"]):
+                continue
+            return c
+        return None
+
+
+class OutfitSearch:
+    """
+    Branch-and-bound search over top x bottom x shoe (x optional outerwear) outfits.
+
+    The outfit score decomposes into per-item additive terms (confidence, penalties, tie-breaker)
+    and count-based terms (occasion matches, colour harmony, heavy layers). For a partial outfit
+    each term is bounded from the remaining slots, so whole subtrees whose bound cannot beat the
+    incumbent are skipped. `best`/`worst` return exactly the outfit a full enumeration sorted by
+    (score, sorted item IDs) would pick.
+    """
+    def __init__(self, engine, weather: Dict, occasion, user=None,
+                 tops: List = None, bottoms: List = None, shoes: List = None, outerwear: List = None):
+        self.engine = engine
+        self.weather = weather
+        self.occasion = occasion
+        self.user = user
+        self.temp = weather.get("temp", 25)
+        self.groups = [[ItemFeatures(i, engine, self.temp, occasion) for i in group or []]
+                       for group in (tops, bottoms, shoes, outerwear)]
+        self.leaves_scored = 0
+
+    def best(self, used_ids: Set[int], accept: Optional[Callable] = None) -> Optional[Dict]:
+        return self._search(used_ids, accept, maximize=True)
+
+    def worst(self, used_ids: Set[int], accept: Optional[Callable] = None) -> Optional[Dict]:
+        return self._search(used_ids, accept, maximize=False)
+
+    # --- Internals ---
+
+    def _search(self, used_ids: Set[int], accept: Optional[Callable], maximize: bool) -> Optional[Dict]:
+        available = [[f for f in group if f.id not in used_ids] for group in self.groups]
+        if not all(available[:3]):
+            return None
+
+        self._maximize = maximize
+        self._accept = accept
+        self._incumbent = None  # (score, sorted_ids, feats)
+
+        self._run_pass(available[:3])
+        if available[3]:
+            self._run_pass(available)
+
+        if self._incumbent is None:
+            return None
+        feats = self._incumbent[2]
+        return self.engine._evaluate_outfit([f.item for f in feats], self.weather, self.occasion, self.user)
+
+    def _run_pass(self, slots: List[List[ItemFeatures]]):
+        n = len(slots)
+        sign = -1 if self._maximize else 1
+        ordered = [sorted(slot, key=lambda f: (sign * f.additive(n), f.id)) for slot in slots]
+
+        # Suffix aggregates over the slots not yet assigned (index i..n-1)
+        suf = {k: [0] * (n + 1) for k in ("max_a", "min_a", "any_match", "all_match",
+                                           "k_good", "k_bad", "any_heavy", "all_heavy")}
+        for i in range(n - 1, -1, -1):
+            slot = ordered[i]
+            adds = [f.additive(n) for f in slot]
+            suf["max_a"][i] = suf["max_a"][i + 1] + max(adds)
+            suf["min_a"][i] = suf["min_a"][i + 1] + min(adds)
+            suf["any_match"][i] = suf["any_match"][i + 1] + any(f.occ_match for f in slot)
+            suf["all_match"][i] = suf["all_match"][i + 1] + all(f.occ_match for f in slot)
+            suf["k_good"][i] = suf["k_good"][i + 1] + any(f.colored and f.good_color for f in slot)
+            suf["k_bad"][i] = suf["k_bad"][i + 1] + any(f.colored and not f.good_color for f in slot)
+            suf["any_heavy"][i] = suf["any_heavy"][i + 1] or any(f.heavy for f in slot)
+            suf["all_heavy"][i] = suf["all_heavy"][i + 1] or all(f.heavy for f in slot)
+        self._min_ids = [min(f.id for f in slot) for slot in ordered]
+        self._adds = {f.id: f.additive(n) for slot in ordered for f in slot}
+        self._suf = suf
+        self._n = n
+        self._dfs(ordered, 0, [], 0, 0, 0, False, 0.0)
+
+    def _occasion_term(self, match_count: int, n: int) -> float:
+        if match_count == 0:
+            return -10
+        return (match_count / n) * self.engine.OCCASION_MATCH_BONUS + (10 if match_count == n else 0)
+
+    def _weather_term(self, n: int, heavy: bool) -> float:
+        if self.temp < 18:
+            return self.engine.WEATHER_MATCH_BONUS if n == 4 else -20
+        if self.temp > 28:
+            return -15 if heavy else self.engine.WEATHER_MATCH_BONUS
+        return 0
+
+    def _bound(self, i: int, m: int, g: int, c: int, heavy: bool, a_sum: float) -> float:
+        """Optimistic score (upper bound when maximizing, lower bound when minimizing)."""
+        suf, n = self._suf, self._n
+        if self._maximize:
+            occ = self._occasion_term(m + suf["any_match"][i], n)
+            weather = self._weather_term(n, heavy or suf["all_heavy"][i])
+            k = suf["k_good"][i]
+            color = 15 * (g + k) / (c + k) if c + k else 0
+            return self.engine.MATCH_BASE_SCORE + occ + weather + color + a_sum + suf["max_a"][i] + BOUND_EPSILON
+        occ = self._occasion_term(m + suf["all_match"][i], n)
+        weather = self._weather_term(n, heavy or suf["any_heavy"][i])
+        k = suf["k_bad"][i]
+        color = 15 * g / (c + k) if c + k else 0
+        return self.engine.MATCH_BASE_SCORE + occ + weather + color + a_sum + suf["min_a"][i] - BOUND_EPSILON
+
+    def _beats_incumbent(self, score: int, ids: tuple) -> bool:
+        if self._incumbent is None:
+            return True
+        best_score, best_ids = self._incumbent[0], self._incumbent[1]
+        if score != best_score:
+            return score > best_score if self._maximize else score < best_score
+        return ids < best_ids
+
+    def _dfs(self, slots, i, chosen, m, g, c, heavy, a_sum):
+        n = self._n
+        if i == n:
+            score = score_features(self.engine, chosen, self.temp)
+            self.leaves_scored += 1
+            ids = tuple(sorted(f.id for f in chosen))
+            if self._beats_incumbent(score, ids):
+                if self._accept is None or self._accept([f.item for f in chosen]):
+                    self._incumbent = (score, ids, list(chosen))
+            return
+
+        if self._incumbent is not None:
+            bound = int(self._bound(i, m, g, c, heavy, a_sum))
+            # Smallest sorted-ID tuple any completion can reach (used for exact tie-breaking)
+            min_ids = tuple(sorted([f.id for f in chosen] + self._min_ids[i:]))
+            if not self._beats_incumbent(bound, min_ids):
+                return
+
+        for f in slots[i]:
+            chosen.append(f)
+            self._dfs(slots, i + 1, chosen,
+                      m + f.occ_match,
+                      g + (f.colored and f.good_color),
+                      c + f.colored,
+                      heavy or f.heavy,
+                      a_sum + self._adds[f.id])
+            chosen.pop()
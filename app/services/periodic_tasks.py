@@ -0,0 +1,46 @@
+import datetime
+import logging
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import User
+from app.services.outfit_planner import outfit_planner
+from app.services.weather_service import weather_service
+
+logger = logging.getLogger("app")
+
+
+@celery_app.task(name="prefetch_weather", ignore_result=True)
+def prefetch_weather():
+    """Beat job: keep forecasts of recently active grid cells warm (see WeatherService.prefetch_active_cells)."""
+    return weather_service.prefetch_active_cells()
+
+
+@celery_app.task(name="plan_next_day_outfits", ignore_result=True)
+def plan_next_day_outfits():
+    """Beat job: queue one planning task per recently active user for tomorrow (local date)."""
+    plan_date = outfit_planner.local_today() + datetime.timedelta(days=1)
+    db = SessionLocal()
+    try:
+        user_ids = outfit_planner.active_user_ids(db)
+    finally:
+        db.close()
+    for user_id in user_ids:
+        plan_user_outfits.delay(user_id, plan_date.isoformat())
+    logger.info(f"Outfit planning queued for {len(user_ids)} users ({plan_date})")
+    return len(user_ids)
+
+
+@celery_app.task(name="plan_user_outfits", ignore_result=True,
+                 soft_time_limit=settings.OUTFIT_PLAN_TASK_TIME_LIMIT, time_limit=settings.OUTFIT_PLAN_TASK_TIME_LIMIT + 30)
+def plan_user_outfits(user_id: int, plan_date: str):
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id)
+        if user is None:
+            return 0
+        plans = outfit_planner.plan_user(db, user, datetime.date.fromisoformat(plan_date))
+        logger.info(f"Stored {plans} outfit plans for user {user_id} ({plan_date})")
+        return plans
+    finally:
+        db.close()
@@ -1,8 +1,13 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 from sqlalchemy.orm import Session
 from app.db.models import ClothingItem, OccasionEnum
 from app.domain.fashion_taxonomy import FashionCategory, ClassificationStatus
+from app.services.outfit_search import OutfitSearch, RankedCandidates
+from app.services.vectorized_scoring import VectorizedOutfitScorer
+from app.core.config import settings
+from app.core.metrics import decision_metrics
 import os
+import hashlib
 import logging
 
 logger = logging.getLogger("app")
@@ -18,37 +23,76 @@ class RecommendationEngine:
 
     def recommend(self, db: Session, user_id: int, weather: Dict, occasion: OccasionEnum, 
                   strategy: str = "CONTEXT_AWARE", decision_layer_enabled: bool = True,
-                  context_override: Dict = None, event_name: str = None) -> List[Dict]:
+                  context_override: Dict = None, event_name: str = None, explain: bool = True) -> List[Dict]:
         """
         Deterministic Recommendation Engine with Research Support.
+        Decision metrics recorded while scoring are aggregated and flushed once per request.
+        With explain=False, outfits carry their deterministic fallback reason and are flagged
+        `reason_pending`; stream_explanations() fills in the Stylist AI texts afterwards.
         """
+        with decision_metrics.batch("recommendation"):
+            return self._recommend(db, user_id, weather, occasion, strategy, decision_layer_enabled,
+                                   context_override, event_name, explain)
+
+    def _recommend(self, db: Session, user_id: int, weather: Dict, occasion: OccasionEnum,
+                   strategy: str, decision_layer_enabled: bool,
+                   context_override: Dict, event_name: str, explain: bool) -> List[Dict]:
         if context_override:
             if "temp" in context_override: weather["temp"] = context_override["temp"]
             if "condition" in context_override: weather["condition"] = context_override["condition"]
 
         from app.core.cache import cache
         
-        # 0. Cache (Only for CONTEXT_AWARE without overrides)
+        # 0. Overnight plan, then cache (Only for CONTEXT_AWARE without overrides)
         if strategy == "CONTEXT_AWARE" and not context_override:
-            temp_sig = int(round(weather.get("temp", 25)))
-            cond_sig = weather.get("condition", "Clear")
-            weather_sig = f"{temp_sig}_{cond_sig}"
-            cache_key = f"rec:{user_id}:{occasion.value}:{weather_sig}"
-            cached_recs = cache.get(cache_key)
-            if cached_recs:
+            from app.services.outfit_planner import outfit_planner
+            planned = outfit_planner.lookup(db, user_id, occasion, weather, event_name)
+            if planned is not None:
+                logger.info(f"Recommendation served from outfit plan for user {user_id}")
+                return planned
+
+            cache_key = self._cache_key(user_id, occasion, weather, event_name)
+            if not explain:
+                # Streaming: a miss is cached by stream_explanations once the AI reasons are in
+                cached_recs = cache.get(cache_key)
+                final_recs = self._hydrate_cached(db, user_id, cached_recs) if cached_recs is not None else None
+                if final_recs is not None:
+                    logger.info(f"Recommendation cache HIT for user {user_id}")
+                    return final_recs
+                return self._compute_recommendations(db, user_id, weather, occasion, strategy,
+                                                     decision_layer_enabled, event_name, explain, cache_key)
+
+            # Concurrent misses for the same key run scoring and the LLM calls only once
+            computed = []
+            def compute():
+                recs = self._compute_recommendations(db, user_id, weather, occasion, strategy,
+                                                     decision_layer_enabled, event_name, explain)
+                computed.append(recs)
+                return self._serialize(recs)
+
+            cached_recs = cache.get_or_compute(cache_key, compute, ttl=settings.RECOMMENDATION_CACHE_TTL)
+            if computed:
+                return computed[0]
+            final_recs = self._hydrate_cached(db, user_id, cached_recs)
+            if final_recs is not None:
                 logger.info(f"Recommendation cache HIT for user {user_id}")
-                final_recs = []
-                for entry in cached_recs:
-                    db_items = db.query(ClothingItem).filter(ClothingItem.id.in_(entry["items"])).all()
-                    item_map = {item.id: item for item in db_items}
-                    final_recs.append({
-                        "items": [item_map[iid] for iid in entry["items"] if iid in item_map],
-                        "score": entry["score"],
-                        "reason": entry["reason"],
-                        "decision_status": entry.get("decision_status", "CONFIRMED")
-                    })
                 return final_recs
+            logger.info(f"Recommendation cache STALE for user {user_id}")
+            cache.delete(cache_key)
 
+        return self._compute_recommendations(db, user_id, weather, occasion, strategy,
+                                             decision_layer_enabled, event_name, explain)
+
+    def plan(self, db: Session, user_id: int, weather: Dict, occasion: OccasionEnum, event_name: str = None) -> List[Dict]:
+        """Serialized top outfits with Stylist AI reasons for an overnight outfit plan (same scoring as recommend)."""
+        with decision_metrics.batch("outfit_plan"):
+            recs = self._compute_recommendations(db, user_id, weather, occasion, "CONTEXT_AWARE", True,
+                                                 event_name, explain=True)
+        return self._serialize(recs)
+
+    def _compute_recommendations(self, db: Session, user_id: int, weather: Dict, occasion: OccasionEnum,
+                                 strategy: str, decision_layer_enabled: bool, event_name: str,
+                                 explain: bool, cache_key: str = None) -> List[Dict]:
         logger.info(f"Rec Request: User={user_id}, Strategy={strategy}, DecisionLayer={decision_layer_enabled}")
         
         from app.db import models
@@ -60,8 +104,8 @@ class RecommendationEngine:
         # 1. Group items by taxonomy
         inventory = {cat: [i for i in all_items if i.category == cat] for cat in FashionCategory}
         
-        temp = weather.get("temp", 25)
         candidates = []
+        source = None
 
         # Strategy Switch
         if strategy == "BASELINE":
@@ -85,18 +129,15 @@ class RecommendationEngine:
             shoes = inventory[FashionCategory.FOOTWEAR]
             
             if tops and bottoms and shoes:
-                potential_outerwear = inventory[FashionCategory.OUTERWEAR]
-                for top in tops:
-                    for bottom in bottoms:
-                        for shoe in shoes:
-                            base_items = [top, bottom, shoe]
-                            # 1. Add base 3-item outfit
-                            candidates.append(self._evaluate_outfit(base_items, weather, occasion, user))
-                            
-                            # 2. Add optional 4-item outfits with each available outerwear
-                            if potential_outerwear:
-                                for outer in potential_outerwear:
-                                    candidates.append(self._evaluate_outfit(base_items + [outer], weather, occasion, user))
+                # Every top x bottom x shoe outfit, alone and with each outerwear piece, is a candidate.
+                # Both backends find the same winners as full enumeration without building every explanation.
+                outerwear = inventory[FashionCategory.OUTERWEAR]
+                combinations = len(tops) * len(bottoms) * len(shoes) * (1 + len(outerwear))
+                backend = OutfitSearch
+                if settings.RECOMMENDATION_BACKEND == "vectorized" and combinations <= settings.VECTORIZED_MAX_COMBINATIONS:
+                    backend = VectorizedOutfitScorer
+                source = backend(self, weather, occasion, user,
+                                 tops=tops, bottoms=bottoms, shoes=shoes, outerwear=outerwear)
             else:
                 # RELAXED: If full outfit not possible, suggest pairs or individuals
                 # Research: Academic users prefer knowing WHY they have few options
@@ -109,30 +150,28 @@ class RecommendationEngine:
                         "reason": f"Món đồ lẻ gợi ý vì bạn chưa có đủ bộ phối đầy đủ (thiếu {'Giày' if not shoes else 'Quần' if not bottoms else 'Áo'})."
                     })
 
-        # 2. Ranking
-        candidates.sort(key=lambda x: (-x["score"], tuple(sorted([i.id for i in x["items"]]))))
+        # 2. Ranking (score descending, ties broken by sorted item IDs)
+        if source is None:
+            source = RankedCandidates(candidates)
 
         # 3. Decision Layer Application (if enabled)
         from app.services.decision_engine import DecisionEngine
         final_recs = []
         used_item_ids = set() # Track INDIVIDUAL items to prevent reuse
 
-        # Sort again by score primarily
-        candidates.sort(key=lambda x: -x["score"])
+        accept = None
+        if decision_layer_enabled:
+            # Skip rejected for research clarity
+            accept = lambda items: DecisionEngine.validate_outfit_safety(items, weather)["status"] != "REJECTED"
+
+        # Pick 3 top outfits that share no item with a higher-ranked one
+        while len(final_recs) < 3:
+            c = source.best(used_item_ids, accept)
+            if c is None:
+                break
 
-        for c in candidates:
-            # Check if ANY item in this outfit has already been used in a higher-ranked outfit
-            current_item_ids = set(i.id for i in c["items"])
-            if not current_item_ids.isdisjoint(used_item_ids):
-                continue
-            
             decision_status = "CONFIRMED"
             if decision_layer_enabled:
-                validation = DecisionEngine.validate_outfit_safety(c["items"], weather)
-                decision_status = validation["status"]
-                if decision_status == "REJECTED":
-                    continue # Skip rejected for research clarity
-                
                 # Check for low-confidence items
                 for item in c["items"]:
                     if item.classification_status == ClassificationStatus.LOW_CONFIDENCE:
@@ -141,51 +180,120 @@ class RecommendationEngine:
 
             c["decision_status"] = decision_status
             final_recs.append(c)
-            used_item_ids.update(current_item_ids) # Mark these items as consumed
-            
-            # Change: Pick 3 top, then stop to pick 2 wildcards later
-            if len(final_recs) >= 3: break
+            used_item_ids.update(i.id for i in c["items"]) # Mark these items as consumed
 
         # 4. Wildcard Selection: Find the 2 LOWEST scoring unique-item outfits for baseline comparison
-        if len(final_recs) < 5:
-            # Sort candidates by score ASCENDING this time
-            candidates_asc = sorted(candidates, key=lambda x: x["score"])
-            for c in candidates_asc:
-                current_item_ids = set(i.id for i in c["items"])
-                if current_item_ids.isdisjoint(used_item_ids):
-                    # Found a unique low-scoring outfit
-                    decision_status = "CONFIRMED"
-                    if decision_layer_enabled:
-                        validation = DecisionEngine.validate_outfit_safety(c["items"], weather)
-                        if validation["status"] == "REJECTED": continue
-                    
-                    c["decision_status"] = "CONFIRMED"
-                    final_recs.append(c)
-                    used_item_ids.update(current_item_ids)
-                    
-                    if len(final_recs) >= 5: break
-
-
-        # Only generate LLM explanations for the top selected outfits (massive speedup)
-        for c in final_recs:
-            if "explanations" in c and "reason" not in c:
-                c["reason"] = DecisionEngine.get_recommendation_explanation(
-                    c["items"], weather, occasion.value, c["score"], c["explanations"],
-                    event_name=event_name
-                )
-
-        # 4. Cache (only for valid CONTEXT_AWARE results)
-        if strategy == "CONTEXT_AWARE" and not context_override:
-            serializable_results = [{
-                "items": [i.id for i in r["items"]],
-                "score": r["score"],
-                "reason": r["reason"],
-                "decision_status": r["decision_status"]
-            } for r in final_recs[:5]]
-            cache.set(cache_key, serializable_results, ttl=300)
+        while len(final_recs) < 5:
+            c = source.worst(used_item_ids, accept)
+            if c is None:
+                break
+            c["decision_status"] = "CONFIRMED"
+            final_recs.append(c)
+            used_item_ids.update(i.id for i in c["items"])
+
+        # Only generate LLM explanations for the top selected outfits, concurrently under one deadline
+        pending = [c for c in final_recs if "explanations" in c and "reason" not in c]
+        if not explain:
+            # Streaming: send deterministic reasons now, Stylist AI texts follow
+            for c in pending:
+                c["reason"] = DecisionEngine.get_fallback_explanation(c["items"], weather, occasion.value, c["score"], event_name)
+                c["reason_pending"] = True
+                # Key resolved before scoring: a wardrobe change mid-stream must not be cached as current
+                c["cache_key"] = cache_key
+            return final_recs[:5]
+
+        reasons = DecisionEngine.get_recommendation_explanations(pending, weather, occasion.value, event_name=event_name)
+        for c, reason in zip(pending, reasons):
+            c["reason"] = reason
 
         return final_recs[:5]
 
+    def stream_explanations(self, user_id: int, outfits: List[Dict], weather: Dict, occasion: OccasionEnum,
+                            strategy: str = "CONTEXT_AWARE", context_override: Dict = None, event_name: str = None):
+        """
+        Yields (index, reason) as Stylist AI explanations arrive for outfits returned by
+        recommend(..., explain=False). Once all are in, the final set is cached under the key
+        (and wardrobe version) resolved by recommend().
+        """
+        from app.services.decision_engine import DecisionEngine
+
+        cache_key = next((k for k in [c.pop("cache_key", None) for c in outfits] if k), None)
+        pending = [i for i, c in enumerate(outfits) if c.pop("reason_pending", False)]
+        for position, reason in DecisionEngine.iter_recommendation_explanations(
+                [outfits[i] for i in pending], weather, occasion.value, event_name=event_name):
+            index = pending[position]
+            outfits[index]["reason"] = reason
+            yield index, reason
+
+        if pending and cache_key:
+            self._cache_results(cache_key, outfits)
+
+    def _hydrate_cached(self, db: Session, user_id: int, cached_recs: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Rebuilds cached outfits with ONE bulk query for all their items.
+        Returns None when a cached item no longer exists, so the caller recomputes.
+        """
+        all_ids = {iid for entry in cached_recs for iid in entry["items"]}
+        db_items = db.query(ClothingItem).filter(
+            ClothingItem.id.in_(all_ids),
+            ClothingItem.user_id == user_id
+        ).all()
+        item_map = {item.id: item for item in db_items}
+        if len(item_map) != len(all_ids):
+            return None
+
+        return [{
+            "items": [item_map[iid] for iid in entry["items"]],
+            "score": entry["score"],
+            "reason": entry["reason"],
+            "decision_status": entry.get("decision_status", "CONFIRMED")
+        } for entry in cached_recs]
+
+    def wardrobe_version(self, user_id: int) -> int:
+        """Current wardrobe version of a user (0 until their first mutation)."""
+        from app.core.cache import cache
+        return cache.get_counter(self._version_key(user_id))
+
+    def bump_wardrobe_version(self, user_id: int) -> int:
+        """
+        Called on every wardrobe mutation (AI completion, edit, delete). Cached recommendations
+        are keyed by version, so older entries simply stop being read and expire on their own.
+        """
+        from app.core.cache import cache
+        version = cache.incr(self._version_key(user_id))
+        logger.info(f"Wardrobe version for user {user_id} -> {version}")
+        return version
+
+    async def bump_wardrobe_version_async(self, user_id: int) -> int:
+        """bump_wardrobe_version for `async def` handlers (does not block the event loop)."""
+        from app.core.cache import async_cache
+        version = await async_cache.incr(self._version_key(user_id))
+        logger.info(f"Wardrobe version for user {user_id} -> {version}")
+        return version
+
+    def _version_key(self, user_id: int) -> str:
+        return f"wardrobe_ver:{user_id}"
+
+    def _cache_key(self, user_id: int, occasion: OccasionEnum, weather: Dict, event_name: str = None) -> str:
+        temp_sig = int(round(weather.get("temp", 25)))
+        cond_sig = weather.get("condition", "Clear")
+        weather_sig = f"{temp_sig}_{cond_sig}"
+        event_sig = hashlib.sha1(event_name.encode("utf-8")).hexdigest()[:10] if event_name else "-"
+        version = self.wardrobe_version(user_id)
+        return f"rec:{user_id}:v{version}:{occasion.value}:{weather_sig}:{event_sig}"
+
+    def _serialize(self, final_recs: List[Dict]) -> List[Dict]:
+        return [{
+            "items": [i.id for i in r["items"]],
+            "score": r["score"],
+            "reason": r["reason"],
+            "decision_status": r["decision_status"]
+        } for r in final_recs[:5]]
+
+    def _cache_results(self, cache_key: str, final_recs: List[Dict]):
+        from app.core.cache import cache
+        cache.set(cache_key, self._serialize(final_recs), ttl=settings.RECOMMENDATION_CACHE_TTL)
+
     def _get_color_brightness(self, hex_color: str) -> float:
         """Returns 0 (very dark) to 1 (very bright) from a hex color string."""
         try:
@@ -280,15 +388,14 @@ class RecommendationEngine:
                 score += self.UNKNOWN_CATEGORY_PENALTY
                 explanations.append(f"Unknown item penalty: {self.UNKNOWN_CATEGORY_PENALTY}")
         
-        from app.services.decision_engine import DecisionEngine
-        DecisionEngine.log_decision_metrics(
-            action_type="recommendation",
-            status="SUCCESS",
-            metadata={
+        # Counted in the sampled metrics sink; the full breakdown is only kept for sampled events
+        decision_metrics.record(
+            "recommendation", "SUCCESS", value=int(score),
+            metadata=lambda: {
                 "items_count": len(items),
-                "weather": weather,
+                "weather": dict(weather),
                 "score": int(score),
-                "breakdown": explanations
+                "breakdown": list(explanations)
             }
         )
 
@@ -3,6 +3,7 @@ import io
 import certifi
 from PIL import Image
 import logging
+from typing import List
 
 # Force correct SSL certificate path to avoid system-level conflicts (e.g. PostgreSQL)
 os.environ['SSL_CERT_FILE'] = certifi.where()
@@ -12,12 +13,209 @@ from celery import shared_task
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
 from app.db import models
-from app.services.ai_service import analyze_image, enhance_classification_with_llm
+from app.services.ai_service import (analyze_image, analyze_images, enhance_classification_with_llm,
+                                     enhance_classifications_with_llm, record_batch_size)
 from app.domain.fashion_taxonomy import map_imagenet_label, ClassificationStatus
+from app.services.analysis_store import analysis_store
 from celery.exceptions import SoftTimeLimitExceeded
 
 logger = logging.getLogger("app")
 
+def _bump_wardrobe_version(user_id: int):
+    """Invalidate the owner's cached recommendations now that a new item is usable."""
+    try:
+        from app.services.recommendation_engine import recommendation_engine
+        recommendation_engine.bump_wardrobe_version(user_id)
+    except Exception as e:
+        logger.error(f"Wardrobe version bump failed for user {user_id}: {e}")
+
+def _find_near_duplicate(db: Session, item: models.ClothingItem):
+    """
+    Closest completed item of the same owner whose perceptual hash is within
+    NEAR_DUPLICATE_MAX_DISTANCE bits (a re-photographed or recompressed copy).
+    Candidates come from the indexed hash bands; the distance is checked here.
+    """
+    from sqlalchemy import or_
+    from app.core.config import settings
+    from app.core.image_hash import hamming, hash_bands
+
+    if not item.perceptual_hash:
+        return None
+    bands = hash_bands(item.perceptual_hash)
+    candidates = db.query(models.ClothingItem).filter(
+        models.ClothingItem.user_id == item.user_id,
+        models.ClothingItem.status == "COMPLETED",
+        models.ClothingItem.id != item.id,
+        or_(*(getattr(models.ClothingItem, f"phash_band{i}") == band for i, band in enumerate(bands)))
+    ).all()
+    scored = [(hamming(item.perceptual_hash, c.perceptual_hash), c.id, c) for c in candidates if c.perceptual_hash]
+    best = min(scored, default=None)
+    if best is not None and best[0] <= settings.NEAR_DUPLICATE_MAX_DISTANCE:
+        return best[2]
+    return None
+
+def _item_results(item: models.ClothingItem):
+    """(ai_results, enhancement) of a completed item, in analyze_image and LLM enhancement shape."""
+    raw_output = dict(item.raw_model_output or {})
+    palette = raw_output.pop("palette", [])
+    ai_results = {
+        "processed_image_path": item.processed_image_path,
+        "color_hex": item.main_color_hex,
+        "palette": palette,
+        "category_raw": item.category_raw,
+        "confidence": item.confidence_score,
+        "raw_output": raw_output
+    }
+    occasion = item.occasion.value if item.occasion else "casual"
+    return ai_results, {"occasion": occasion, "style_tag": item.category_label or item.category_raw}
+
+def _apply_stored(item: models.ClothingItem, analysis: models.ImageAnalysis):
+    """Fill an item from a stored analysis (decision rules are re-applied, they are cheap)."""
+    ai_results = analysis_store.results(analysis)
+    category, decision = _decide(item.id, ai_results, log=False)
+    _apply_analysis(item, ai_results, category, decision, analysis_store.enhancement(analysis))
+    item.analysis_id = analysis.id
+
+def _copy_item(item: models.ClothingItem, existing: models.ClothingItem):
+    """Row-to-row copy, for items analyzed before the analysis store existed."""
+    item.category = existing.category
+    item.category_label = existing.category_label
+    item.category_raw = existing.category_raw
+    item.confidence_score = existing.confidence_score
+    item.classification_status = existing.classification_status
+    item.raw_model_output = existing.raw_model_output
+    item.processed_image_path = existing.processed_image_path
+    item.main_color_hex = existing.main_color_hex
+    item.type = existing.type
+    item.occasion = existing.occasion
+    item.status = "COMPLETED"
+
+def _copy_duplicate(db: Session, item: models.ClothingItem, owners: set, old_paths: list) -> bool:
+    """
+    Reuse the analysis of the same image content instead of running the pipeline. True on a
+    hit: from the analysis store (same SHA-256, any user), else from a legacy completed item
+    with the same SHA-256, whose analysis is then backfilled into the store. Hits are counted
+    as "exact" deduplication decision metrics; see `_store` for `owners` and `old_paths`.
+    """
+    from app.core.metrics import decision_metrics
+
+    analysis = analysis_store.lookup(db, item.image_hash)
+    if analysis is not None:
+        logger.info(f"AI Deduplication HIT (exact) for item {item.id} from stored analysis {analysis.id}")
+        _apply_stored(item, analysis)
+        decision_metrics.record("deduplication", "exact")
+        return True
+    if not item.image_hash:
+        return False
+    existing = db.query(models.ClothingItem).filter(
+        models.ClothingItem.image_hash == item.image_hash,
+        models.ClothingItem.status == "COMPLETED",
+        models.ClothingItem.analysis_id.is_(None),
+        models.ClothingItem.id != item.id
+    ).first()
+    if existing is None:
+        return False
+
+    logger.info(f"AI Deduplication HIT (exact) for item {item.id} from item {existing.id}")
+    _copy_item(item, existing)
+    if existing.category_raw and existing.processed_image_path:
+        ai_results, enhancement = _item_results(existing)
+        _store(db, existing, ai_results, enhancement, owners, old_paths)
+        item.analysis_id = existing.analysis_id
+    decision_metrics.record("deduplication", "exact")
+    return True
+
+def _near_duplicate(db: Session, item: models.ClothingItem):
+    """
+    (classification, enhancement) of a near-duplicate of the owner's (see
+    `_find_near_duplicate`), or None. Only these are reused: dHash is a grayscale gradient hash
+    that ignores color, so the same garment outline in another color matches too, and the
+    cutout and color must still come from this image. Counted as "near" or "miss".
+    """
+    from app.core.metrics import decision_metrics
+
+    existing = _find_near_duplicate(db, item)
+    if existing is None or not existing.category_raw:
+        decision_metrics.record("deduplication", "miss")
+        return None
+    decision_metrics.record("deduplication", "near")
+    logger.info(f"AI Deduplication HIT (near) for item {item.id} from item {existing.id}, reusing its classification")
+    ai_results, enhancement = _item_results(existing)
+    classification = {**ai_results["raw_output"], "label": ai_results["category_raw"], "confidence": ai_results["confidence"]}
+    return classification, enhancement
+
+def _after_commit(db: Session, owners: set, old_paths: list):
+    """Release replaced cutouts and invalidate the owners' cached recommendations."""
+    for path in old_paths:
+        analysis_store.release_file(db, path)
+    for user_id in owners:
+        _bump_wardrobe_version(user_id)
+
+def _decide(item_id: int, ai_results: dict, log: bool = True):
+    """(FashionCategory, decision) for an analysis result; logs the decision metrics unless `log` is False."""
+    raw_label = ai_results['category_raw']
+    confidence = ai_results['confidence']
+    
+    # Parse Gemini direct enum output if applicable
+    from app.domain.fashion_taxonomy import FashionCategory
+    try:
+        category = FashionCategory(raw_label.upper())
+    except ValueError:
+        category = map_imagenet_label(raw_label)
+    
+    # Decision Layer
+    from app.services.decision_engine import DecisionEngine
+    decision = DecisionEngine.classify_decision(raw_label, confidence)
+    if not log:
+        return category, decision
+    
+    # Log decision metrics for performance audit
+    DecisionEngine.log_decision_metrics(
+        action_type="classification",
+        status=decision["status"],
+        value=confidence,
+        metadata={
+            "item_id": item_id,
+            "confidence": confidence,
+            "raw_label": raw_label,
+            "mapped_category": category.name
+        }
+    )
+    return category, decision
+
+def _apply_analysis(item: models.ClothingItem, ai_results: dict, category, decision: dict, enhancement: dict):
+    raw_label = ai_results['category_raw']
+    item.category = category
+    item.category_raw = raw_label
+    item.category_label = enhancement.get('style_tag', raw_label)
+    item.confidence_score = ai_results['confidence']
+    item.classification_status = decision["status"]
+    item.failure_code = decision["failure_code"]
+    item.suggested_action = decision["suggested_action"]
+    item.raw_model_output = {**ai_results['raw_output'], "palette": ai_results.get('palette', [])}
+    item.processed_image_path = ai_results['processed_image_path']
+    item.main_color_hex = ai_results['color_hex']
+    
+    # Map occasion string to Enum safely
+    from app.db.models import OccasionEnum
+    occ_str = enhancement.get('occasion', 'casual').lower()
+    try:
+        item.occasion = OccasionEnum(occ_str)
+    except ValueError:
+        item.occasion = OccasionEnum.CASUAL
+        
+    item.status = "COMPLETED"
+    
+    from app.db.models import ClothingTypeEnum
+    type_map = {
+        "TOP": ClothingTypeEnum.TOP,
+        "BOTTOM": ClothingTypeEnum.BOTTOM,
+        "FOOTWEAR": ClothingTypeEnum.SHOES,
+        "OUTERWEAR": ClothingTypeEnum.OUTERWEAR,
+        "FULL_BODY": ClothingTypeEnum.FULL
+    }
+    item.type = type_map.get(category.name)
+
 def process_clothing_ai(item_id: int, image_hex: str, request_id: str = None, db: Session = None):
     # Use provided session or create a new one
     local_session = False
@@ -38,94 +236,33 @@ def process_clothing_ai(item_id: int, image_hex: str, request_id: str = None, db
         db.commit()
 
         # 1. Deduplication Check
-        if item.image_hash:
-            existing = db.query(models.ClothingItem).filter(
-                models.ClothingItem.image_hash == item.image_hash,
-                models.ClothingItem.status == "completed",
-                models.ClothingItem.id != item_id
-            ).first()
-            
-            if existing:
-                logger.info(f"AI Deduplication HIT for item {item_id}")
-                item.category = existing.category
-                item.category_label = existing.category_label
-                item.category_raw = existing.category_raw
-                item.confidence_score = existing.confidence_score
-                item.classification_status = existing.classification_status
-                item.raw_model_output = existing.raw_model_output
-                item.processed_image_path = existing.processed_image_path
-                item.main_color_hex = existing.main_color_hex
-                item.type = existing.type
-                item.occasion = existing.occasion
-                item.status = "COMPLETED"
-                db.commit()
-                return {"status": "COMPLETED", "item_id": item_id, "deduplicated": True}
+        owners, old_paths = {item.user_id}, []
+        if _copy_duplicate(db, item, owners, old_paths):
+            db.commit()
+            _after_commit(db, owners, old_paths)
+            return {"status": "COMPLETED", "item_id": item_id, "deduplicated": True}
+
+        near = _near_duplicate(db, item)
+        if near is None:
+            logger.info(f"AI Deduplication MISS for item {item_id}")
+        classification, deepseek_enhancement = near or (None, None)
 
-        logger.info(f"AI Deduplication MISS for item {item_id}")
-        # 2. Process with AI
+        # 2. Process with AI (a near-duplicate's classification skips the vision call)
         image_bytes = bytes.fromhex(image_hex)
-        ai_results = analyze_image(image_bytes)
-        
-        raw_label = ai_results['category_raw']
-        confidence = ai_results['confidence']
-        
-        # Parse Gemini direct enum output if applicable
-        from app.domain.fashion_taxonomy import FashionCategory
-        try:
-            category = FashionCategory(raw_label.upper())
-        except ValueError:
-            category = map_imagenet_label(raw_label)
+        ai_results = analyze_image(image_bytes, classification=classification)
         
         # 3. Decision Layer
-        from app.services.decision_engine import DecisionEngine
-        decision = DecisionEngine.classify_decision(raw_label, confidence)
-        
-        # Log decision metrics for performance audit
-        DecisionEngine.log_decision_metrics(
-            action_type="classification",
-            status=decision["status"],
-            metadata={
-                "item_id": item_id,
-                "confidence": confidence,
-                "raw_label": raw_label,
-                "mapped_category": category.name
-            }
-        )
+        category, decision = _decide(item_id, ai_results)
 
         # 4. Enhance with DeepSeek LLM
-        deepseek_enhancement = enhance_classification_with_llm(raw_label, ai_results['color_hex'])
+        if deepseek_enhancement is None:
+            deepseek_enhancement = enhance_classification_with_llm(ai_results['category_raw'], ai_results['color_hex'])
         
         # 5. Update Database
-        item.category = category
-        item.category_label = deepseek_enhancement.get('style_tag', raw_label)
-        item.confidence_score = confidence
-        item.classification_status = decision["status"]
-        item.failure_code = decision["failure_code"]
-        item.suggested_action = decision["suggested_action"]
-        item.raw_model_output = ai_results['raw_output']
-        item.processed_image_path = ai_results['processed_image_path']
-        item.main_color_hex = ai_results['color_hex']
-        
-        # Map occasion string to Enum safely
-        from app.db.models import OccasionEnum
-        occ_str = deepseek_enhancement.get('occasion', 'casual').lower()
-        try:
-            item.occasion = OccasionEnum(occ_str)
-        except ValueError:
-            item.occasion = OccasionEnum.CASUAL
-            
-        item.status = "COMPLETED"
-        
-        from app.db.models import ClothingTypeEnum
-        type_map = {
-            "TOP": ClothingTypeEnum.TOP,
-            "BOTTOM": ClothingTypeEnum.BOTTOM,
-            "FOOTWEAR": ClothingTypeEnum.SHOES,
-            "OUTERWEAR": ClothingTypeEnum.OUTERWEAR,
-            "FULL_BODY": ClothingTypeEnum.FULL
-        }
-        item.type = type_map.get(category.name)
+        _apply_analysis(item, ai_results, category, decision, deepseek_enhancement)
+        _store(db, item, ai_results, deepseek_enhancement, owners, old_paths)
         db.commit()
+        _after_commit(db, owners, old_paths)
         return {"status": "COMPLETED", "item_id": item_id}
 
     except SoftTimeLimitExceeded:
@@ -145,3 +282,213 @@ def process_clothing_ai(item_id: int, image_hex: str, request_id: str = None, db
     finally:
         if local_session and db:
             db.close()
+
+def _store(db: Session, item: models.ClothingItem, ai_results: dict, enhancement: dict, owners: set, old_paths: list):
+    """
+    Put a fresh analysis in the shared store and link the item to it. An entry of another
+    pipeline version is refreshed in place, so the items already linked to it are refreshed
+    as well; their owners and the replaced cutout are added to `owners` and `old_paths` for
+    `_after_commit`.
+    """
+    previous = analysis_store.get(db, item.image_hash)
+    replaced = previous is not None and previous.pipeline_version != analysis_store.current_version()
+    old_path = previous.processed_image_path if replaced else None
+    analysis = analysis_store.put(db, item.image_hash, ai_results, enhancement)
+    if analysis is None:
+        return
+    item.analysis_id = analysis.id
+    if not replaced:
+        return
+    linked = db.query(models.ClothingItem).filter(
+        models.ClothingItem.analysis_id == analysis.id,
+        models.ClothingItem.id != item.id
+    ).all()
+    for other in linked:
+        _apply_stored(other, analysis)
+        owners.add(other.user_id)
+    old_paths.append(old_path)
+
+def _analyze_batch(item_ids: List[int], images: List[bytes], log: bool = True, near: List = None) -> List:
+    """
+    analyze_images, decision rules and batched DeepSeek enhancement for a group of images.
+    Per image: (ai_results, category, decision, enhancement), or an error message. Images with
+    a near-duplicate's (classification, enhancement) in `near` only get their cutout and color.
+    """
+    from app.core.config import settings
+
+    near = near or [None] * len(images)
+    outcomes, analyzed = [], []
+    results = analyze_images(images, classifications=[known[0] if known else None for known in near])
+    for item_id, ai_results, known in zip(item_ids, results, near):
+        if "error" in ai_results:
+            outcomes.append(ai_results["error"])
+        elif known:
+            outcomes.append((ai_results,) + _decide(item_id, ai_results, log=log) + (known[1],))
+        else:
+            outcomes.append(None)
+            analyzed.append((len(outcomes) - 1, ai_results) + _decide(item_id, ai_results, log=log))
+
+    for start in range(0, len(analyzed), settings.AI_ENHANCE_BATCH_SIZE):
+        chunk = analyzed[start:start + settings.AI_ENHANCE_BATCH_SIZE]
+        record_batch_size("enhancement", len(chunk))
+        enhancements = enhance_classifications_with_llm([(r['category_raw'], r['color_hex']) for _, r, _, _ in chunk])
+        for (index, ai_results, category, decision), enhancement in zip(chunk, enhancements):
+            outcomes[index] = (ai_results, category, decision, enhancement)
+    return outcomes
+
+def _fail(item: models.ClothingItem, reason: str):
+    item.status = "FAILED"
+    item.failure_reason = reason
+
+def process_clothing_batch(item_ids: List[int], request_id: str = None, db: Session = None):
+    """
+    Bulk ingestion path for /items/upload/batch. Items are read from their saved originals and
+    analyzed AI_INGEST_CHUNK_SIZE at a time with analyze_images (batched background removal and
+    multi-image classification) and batched DeepSeek enhancement; each chunk is committed as
+    soon as it is done so the per-item task status endpoint shows progress. Per-stage batch
+    sizes are recorded as histograms in the decision metrics.
+    """
+    from app.core.config import settings
+    from app.core.metrics import decision_metrics
+
+    local_session = False
+    if db is None:
+        db = SessionLocal()
+        local_session = True
+
+    summary = {"status": "COMPLETED", "completed": 0, "deduplicated": 0, "failed": 0}
+    items, owners, old_paths = [], set(), []
+    try:
+        logger.info(f"Processing AI batch of {len(item_ids)} items")
+        items = db.query(models.ClothingItem).filter(models.ClothingItem.id.in_(item_ids)).all()
+        for item in items:
+            item.status = "PROCESSING"
+        db.commit()
+
+        # 1. Deduplication and loading originals
+        pending = []
+        for item in items:
+            if _copy_duplicate(db, item, owners, old_paths):
+                summary["deduplicated"] += 1
+                continue
+            near = _near_duplicate(db, item)
+            try:
+                with open(item.original_image_path, "rb") as f:
+                    pending.append((item, f.read(), near))
+            except OSError as e:
+                _fail(item, f"Original image unavailable: {e}")
+        db.commit()
+
+        # 2. Analyze in chunks
+        with decision_metrics.batch("ingestion"):
+            for start in range(0, len(pending), settings.AI_INGEST_CHUNK_SIZE):
+                chunk = pending[start:start + settings.AI_INGEST_CHUNK_SIZE]
+                try:
+                    outcomes = _analyze_batch([item.id for item, _, _ in chunk], [image for _, image, _ in chunk],
+                                              near=[near for _, _, near in chunk])
+                    for (item, _, _), outcome in zip(chunk, outcomes):
+                        if isinstance(outcome, str):
+                            _fail(item, outcome)
+                            continue
+                        ai_results, category, decision, enhancement = outcome
+                        _apply_analysis(item, ai_results, category, decision, enhancement)
+                        _store(db, item, ai_results, enhancement, owners, old_paths)
+                except SoftTimeLimitExceeded:
+                    raise
+                except Exception as e:
+                    logger.error(f"AI batch chunk error: {str(e)}", exc_info=True)
+                    for item, _, _ in chunk:
+                        if item.status != "COMPLETED":
+                            _fail(item, str(e))
+                db.commit()
+
+    except SoftTimeLimitExceeded:
+        logger.error(f"Task timeout (soft) for batch of {len(item_ids)} items")
+        for item in items:
+            if item.status not in ("COMPLETED", "FAILED"):
+                _fail(item, "AI timeout exceeded")
+        db.commit()
+    except Exception as e:
+        logger.error(f"AI batch error: {str(e)}", exc_info=True)
+        db.rollback()
+        for item in items:
+            if item.status not in ("COMPLETED", "FAILED"):
+                _fail(item, str(e))
+        db.commit()
+    finally:
+        for item in items:
+            if item.status == "COMPLETED":
+                summary["completed"] += 1
+            elif item.status == "FAILED":
+                summary["failed"] += 1
+        owners.update(item.user_id for item in items if item.status == "COMPLETED")
+        _after_commit(db, owners, old_paths)
+        if local_session and db:
+            db.close()
+    return summary
+
+def reanalyze_stale_analyses(limit: int = None, db: Session = None) -> dict:
+    """
+    Re-run the pipeline for stored analyses of an older AI_PIPELINE_VERSION (after a model or
+    prompt change) and refresh every item using them. The source image is the original of any
+    linked item; analyses without one left are dropped and get recomputed on the next upload.
+    """
+    from app.core.config import settings
+
+    local_session = False
+    if db is None:
+        db = SessionLocal()
+        local_session = True
+
+    summary = {"stale": 0, "refreshed": 0, "dropped": 0, "failed": 0}
+    owners, old_paths = set(), []
+    try:
+        stale = analysis_store.stale(db, limit)
+        summary["stale"] = len(stale)
+        sources = []
+        for analysis in stale:
+            items = db.query(models.ClothingItem).filter(models.ClothingItem.analysis_id == analysis.id).all()
+            image = None
+            for item in items:
+                try:
+                    with open(item.original_image_path, "rb") as f:
+                        image = f.read()
+                    break
+                except (OSError, TypeError):
+                    continue
+            if image is None:
+                for item in items:
+                    item.analysis_id = None
+                old_paths.append(analysis.processed_image_path)
+                db.delete(analysis)
+                summary["dropped"] += 1
+            else:
+                sources.append((analysis, items, image))
+        db.commit()
+
+        for start in range(0, len(sources), settings.AI_INGEST_CHUNK_SIZE):
+            chunk = sources[start:start + settings.AI_INGEST_CHUNK_SIZE]
+            outcomes = _analyze_batch([a.id for a, _, _ in chunk], [image for _, _, image in chunk], log=False)
+            for (analysis, items, _), outcome in zip(chunk, outcomes):
+                if isinstance(outcome, str):
+                    logger.warning(f"Re-analysis of stored analysis {analysis.id} failed: {outcome}")
+                    summary["failed"] += 1
+                    continue
+                ai_results, _, _, enhancement = outcome
+                old_paths.append(analysis.processed_image_path)
+                analysis_store.put(db, analysis.image_hash, ai_results, enhancement)
+                for item in items:
+                    _apply_stored(item, analysis)
+                    owners.add(item.user_id)
+                summary["refreshed"] += 1
+            db.commit()
+
+        for path in old_paths:
+            analysis_store.release_file(db, path)
+    finally:
+        for user_id in owners:
+            _bump_wardrobe_version(user_id)
+        if local_session and db:
+            db.close()
+    logger.info(f"Analysis re-run to {analysis_store.current_version()}: {summary}")
+    return summary
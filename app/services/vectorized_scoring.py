@@ -0,0 +1,173 @@
+from typing import List, Dict, Optional, Callable, Set
+import numpy as np
+from app.db.models import OccasionEnum
+from app.domain.fashion_taxonomy import ClassificationStatus
+
+# Status codes used in the packed `status` arrays
+STATUS_CODES = {
+    ClassificationStatus.CONFIRMED: 0,
+    ClassificationStatus.LOW_CONFIDENCE: 1,
+    ClassificationStatus.UNKNOWN: 2,
+}
+STATUS_OTHER = 3
+OCCASIONS = list(OccasionEnum)
+
+
+class CategoryFeatures:
+    """
+    One wardrobe category packed into NumPy feature arrays:
+    occasion one-hot, colour brightness, confidence, classification status and is-heavy flag.
+    """
+    def __init__(self, items: List, engine):
+        self.items = list(items)
+        self.ids = np.array([i.id for i in self.items], dtype=np.int64)
+        self.occasion = np.zeros((len(self.items), len(OCCASIONS)), dtype=np.int8)
+        for row, item in enumerate(self.items):
+            if item.occasion in OCCASIONS:
+                self.occasion[row, OCCASIONS.index(item.occasion)] = 1
+        self.has_color = np.array([bool(i.main_color_hex) for i in self.items], dtype=bool)
+        self.brightness = np.array(
+            [engine._get_color_brightness(i.main_color_hex) if i.main_color_hex else 0.5 for i in self.items],
+            dtype=np.float64)
+        self.confidence = np.array([i.confidence_score or 0.0 for i in self.items], dtype=np.float64)
+        self.status = np.array([STATUS_CODES.get(i.classification_status, STATUS_OTHER) for i in self.items],
+                               dtype=np.int8)
+        self.is_heavy = np.array(
+            ["coat" in (i.category_label or "").lower() or "jacket" in (i.category_label or "").lower()
+             for i in self.items], dtype=bool)
+
+
+class VectorizedOutfitScorer:
+    """
+    Alternate scoring backend: scores every top x bottom x shoe (x outerwear) combination in one
+    broadcasted NumPy computation and selects from the score tensors. Explanation strings are only
+    built (via RecommendationEngine._evaluate_outfit) for the outfits that survive selection.
+
+    Operation order follows _evaluate_outfit, so integer scores and rankings are identical to the
+    scalar path. Exposes the same best/worst interface as OutfitSearch.
+    """
+    def __init__(self, engine, weather: Dict, occasion, user=None,
+                 tops: List = None, bottoms: List = None, shoes: List = None, outerwear: List = None):
+        self.engine = engine
+        self.weather = weather
+        self.occasion = occasion
+        self.user = user
+        self.temp = weather.get("temp", 25)
+        self.slots = [CategoryFeatures(group or [], engine) for group in (tops, bottoms, shoes, outerwear)]
+        occasion_mask = np.array([o == occasion for o in OCCASIONS], dtype=np.int8)
+
+        # Per-slot item terms, reshaped so they broadcast along their own axis
+        self._terms = []
+        for axis, slot in enumerate(self.slots):
+            shape = [1, 1, 1, 1]
+            shape[axis] = len(slot.items)
+            good = slot.brightness > 0.6 if self.temp > 25 else slot.brightness < 0.4
+            confirmed = slot.status == STATUS_CODES[ClassificationStatus.CONFIRMED]
+            penalty = np.where(slot.status == STATUS_CODES[ClassificationStatus.LOW_CONFIDENCE],
+                               engine.LOW_CONFIDENCE_PENALTY,
+                               np.where(slot.status == STATUS_CODES[ClassificationStatus.UNKNOWN],
+                                        engine.UNKNOWN_CATEGORY_PENALTY, 0))
+            self._terms.append({
+                "match": (slot.occasion @ occasion_mask > 0).astype(np.int64).reshape(shape),
+                "colored": slot.has_color.astype(np.int64).reshape(shape),
+                "good": (slot.has_color & good).astype(np.int64).reshape(shape),
+                "confirmed": confirmed.astype(np.int64).reshape(shape),
+                "conf": np.where(confirmed, slot.confidence, 0.0).reshape(shape),
+                "heavy": slot.is_heavy.reshape(shape),
+                "penalty": penalty.astype(np.int64).reshape(shape),
+                "ids": slot.ids.reshape(shape),
+            })
+
+        # Integer score tensors for 3-item (outerwear axis of size 1) and 4-item outfits
+        self.scores = {3: self._score_tensor(3)}
+        if self.slots[3].items:
+            self.scores[4] = self._score_tensor(4)
+        self.blocked = {n: np.zeros(s.shape, dtype=bool) for n, s in self.scores.items()}
+
+    @property
+    def combinations(self) -> int:
+        return sum(s.size for s in self.scores.values())
+
+    def best(self, used_ids: Set[int], accept: Optional[Callable] = None) -> Optional[Dict]:
+        return self._select(used_ids, accept, maximize=True)
+
+    def worst(self, used_ids: Set[int], accept: Optional[Callable] = None) -> Optional[Dict]:
+        return self._select(used_ids, accept, maximize=False)
+
+    # --- Internals ---
+
+    def _score_tensor(self, n: int) -> np.ndarray:
+        terms = self._terms[:n]
+
+        def total(key):
+            acc = terms[0][key]
+            for t in terms[1:]:
+                acc = acc + t[key]
+            return acc
+
+        match_count = total("match")
+        score = np.where(match_count > 0,
+                         self.engine.MATCH_BASE_SCORE + (match_count / n) * self.engine.OCCASION_MATCH_BONUS,
+                         self.engine.MATCH_BASE_SCORE - 10.0)
+        score = np.where(match_count == n, score + 10, score)
+
+        if self.temp < 18:
+            score = score + (self.engine.WEATHER_MATCH_BONUS if n == 4 else -20)
+        elif self.temp > 28:
+            heavy = terms[0]["heavy"]
+            for t in terms[1:]:
+                heavy = heavy | t["heavy"]
+            score = np.where(heavy, score + -15, score + self.engine.WEATHER_MATCH_BONUS)
+
+        colored = total("colored")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            color_bonus = (total("good") / colored) * 15
+        score = np.where(colored > 0, score + color_bonus, score)
+
+        confirmed_count = total("confirmed")
+        conf_bonus = (confirmed_count / n) * 10 + (total("conf") * (5 / n))
+        score = np.where(confirmed_count > 0, score + conf_bonus, score)
+
+        score = score + total("ids") / 1000000.0
+        for t in terms:
+            score = score + t["penalty"]
+        return np.trunc(score).astype(np.int64)
+
+    def _select(self, used_ids: Set[int], accept: Optional[Callable], maximize: bool) -> Optional[Dict]:
+        available = [~np.isin(slot.ids, list(used_ids)) for slot in self.slots]
+        while True:
+            sentinel = np.iinfo(np.int64).min if maximize else np.iinfo(np.int64).max
+            masked = {}
+            for n, scores in self.scores.items():
+                mask = ~self.blocked[n]
+                for axis in range(n):
+                    shape = [1, 1, 1, 1]
+                    shape[axis] = len(available[axis])
+                    mask = mask & available[axis].reshape(shape)
+                masked[n] = np.where(mask, scores, sentinel)
+
+            extremes = [m.max() if maximize else m.min() for m in masked.values() if m.size]
+            if not extremes:
+                return None
+            target = max(extremes) if maximize else min(extremes)
+            if target == sentinel:
+                return None
+
+            # All combinations at the target score, ordered by their sorted item IDs
+            # (3-item ID rows are padded with -1 so they compare like shorter Python tuples)
+            positions, id_rows = [], []
+            for n, m in masked.items():
+                idx = np.argwhere(m == target)
+                ids = np.full((len(idx), 4), -1, dtype=np.int64)
+                ids[:, :n] = np.sort(np.stack([self.slots[axis].ids[idx[:, axis]] for axis in range(n)], axis=1), axis=1)
+                positions.extend((n, tuple(int(v) for v in row)) for row in idx)
+                id_rows.append(ids)
+            id_rows = np.concatenate(id_rows)
+            order = np.lexsort(id_rows.T[::-1])
+
+            for k in order:
+                n, idx = positions[k]
+                items = [self.slots[axis].items[idx[axis]] for axis in range(n)]
+                if accept is None or accept(items):
+                    return self.engine._evaluate_outfit(items, self.weather, self.occasion, self.user)
+                self.blocked[n][idx] = True
@@ -1,93 +1,257 @@
 import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from requests.adapters import HTTPAdapter
+from typing import Dict, List, Optional, Tuple
+from app.core.cache import LocalCache
 from app.core.config import settings
+from app.core.geo import geohash_encode, geohash_decode
 import logging
 
 logger = logging.getLogger("app")
 
+DEFAULT_LOCATION_NAME = "Vị trí của bạn"
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+ACTIVE_CELLS_KEY = "weather_active_cells"  # Sorted set: geohash cell -> last request time
+
+_session: Optional[requests.Session] = None
+_weather_pool: Optional[ThreadPoolExecutor] = None
+_weather_lock = threading.Lock()
+
+
+def _http_session() -> requests.Session:
+    """Shared keep-alive session for Open-Meteo and Nominatim (created lazily; urllib3 pools are thread-safe)."""
+    global _session
+    with _weather_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.WEATHER_HTTP_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session.headers["User-Agent"] = "OutfitAI/1.0"
+        return _session
+
+
+def _weather_executor() -> ThreadPoolExecutor:
+    """Pool for reverse-geocode lookups that run alongside the forecast fetch (created lazily)."""
+    global _weather_pool
+    with _weather_lock:
+        if _weather_pool is None:
+            _weather_pool = ThreadPoolExecutor(max_workers=settings.WEATHER_GEOCODE_WORKERS,
+                                               thread_name_prefix="geocode")
+        return _weather_pool
+
+class WeatherUnavailable(Exception):
+    """Forecast could not be fetched; carries whatever location name was resolved."""
+    def __init__(self, location_name: str):
+        super().__init__(location_name)
+        self.location_name = location_name
+
 class WeatherService:
     BASE_URL = "https://api.openweathermap.org/data/2.5/weather"
     
     def __init__(self, api_key: str):
         self.api_key = api_key
+        self._marked = LocalCache(max_entries=4096, default_ttl=60)  # Throttles active-cell writes
 
     def get_current_weather(self, lat: float, lon: float):
         """
         Fetches current weather data and 3-day forecast from Open-Meteo with 20-min caching.
+        Entries are keyed by geohash cell (WEATHER_GEOHASH_PRECISION) and fetched for the cell
+        centre, so nearby users and GPS jitter share one entry. Concurrent misses for the same
+        cell trigger a single upstream fetch, and slightly expired entries are served while one
+        background refresh runs. An entry stored with the default location name (geocoder too
+        slow) gets the name from the geocode cache once the late answer has landed there.
+        """
+        self._mark_active(geohash_encode(lat, lon, settings.WEATHER_GEOHASH_PRECISION))
+        try:
+            return self.get_forecast(lat, lon)
+        except WeatherUnavailable as e:
+            return {
+                "temp": 25.0, 
+                "condition": "Trời quang", 
+                "location": e.location_name, 
+                "description": "Dữ liệu mẫu (mất kết nối)",
+                "forecast": []
+            }
+
+    def get_forecast(self, lat: float, lon: float) -> Dict:
+        """
+        The cached weather of get_current_weather for background jobs: the cell is not marked
+        active for prefetching, and WeatherUnavailable is raised instead of returning placeholder data.
         """
         from app.core.cache import cache
-        
-        # 1. Check Cache
-        cache_key = f"weather:{lat}:{lon}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            logger.info(f"Weather cache HIT for ({lat}, {lon})")
-            return cached_data
 
+        cell = geohash_encode(lat, lon, settings.WEATHER_GEOHASH_PRECISION)
+        cell_lat, cell_lon = geohash_decode(cell)
+        weather = cache.get_or_compute(f"weather:{cell}", lambda: self._fetch_weather(cell_lat, cell_lon),
+                                       ttl=settings.WEATHER_CACHE_TTL_SECONDS,
+                                       stale_ttl=settings.WEATHER_STALE_TTL_SECONDS)
+        return self._with_location(weather, cell_lat, cell_lon)
+
+    def _fetch_weather(self, lat: float, lon: float) -> Dict:
+        """
+        Reverse-geocode and forecast run concurrently within WEATHER_DEADLINE_SECONDS. The geocoder
+        never holds up the forecast: if it has not answered shortly after the forecast, the default
+        name is used and the late answer still lands in the geocode cache for the next request.
+        """
         logger.info(f"Weather cache MISS for ({lat}, {lon})")
-        
-        # 2. Geocoding (Fetch location name)
-        location_name = "Vị trí của bạn"
+        deadline = time.monotonic() + settings.WEATHER_DEADLINE_SECONDS
+
+        # 1. Geocoding (Fetch location name) in the background
+        geo_future = _weather_executor().submit(self.get_location_name, lat, lon)
+
+        # 2. Fetch Real Weather
         try:
-            geo_url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&zoom=10&addressdetails=1"
-            geo_resp = requests.get(geo_url, headers={'User-Agent': 'OutfitAI/1.0'}, timeout=3)
-            if geo_resp.ok:
-                geo_data = geo_resp.json()
-                address = geo_data.get("address", {})
-                location_name = address.get("city") or address.get("town") or address.get("village") or address.get("province") or address.get("state") or "Vị trí của bạn"
+            response = _http_session().get(FORECAST_URL, params=self._forecast_params([(lat, lon)]), verify=False,
+                                           timeout=max(0.1, deadline - time.monotonic()))
+            response.raise_for_status()
+            weather = self._parse_forecast(response.json())
         except Exception as e:
-            logger.warning(f"Geocoding failed: {e}")
+            logger.error(f"Weather API Error: {e}")
+            # Raised (not returned) so the placeholder is never cached
+            raise WeatherUnavailable(self._location_result(geo_future, deadline)) from e
+
+        weather["location"] = self._location_result(geo_future, deadline)
+        return weather
+
+    def prefetch_active_cells(self) -> Dict[str, int]:
+        """
+        Refresh forecasts of recently requested cells before they go stale, so requests keep
+        hitting warm entries. Cells seen within WEATHER_ACTIVE_WINDOW_SECONDS whose entry is missing
+        or fresh for less than WEATHER_PREFETCH_LEAD_SECONDS are fetched with multi-location
+        Open-Meteo calls of WEATHER_PREFETCH_BATCH_SIZE cells. Run periodically by Celery beat.
+        """
+        from app.core.cache import cache
+
+        now = time.time()
+        since = now - settings.WEATHER_ACTIVE_WINDOW_SECONDS
+        cache.zremrangebyscore(ACTIVE_CELLS_KEY, since)
+        cells = cache.zrangebyscore(ACTIVE_CELLS_KEY, since)
+        entries = cache.mget([f"weather:{cell}" for cell in cells])
+        due = [cell for cell, entry in zip(cells, entries)
+               if (cache.fresh_until(entry) or 0) < now + settings.WEATHER_PREFETCH_LEAD_SECONDS]
 
-        # 3. Fetch Real Weather
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
+        refreshed = 0
+        for start in range(0, len(due), settings.WEATHER_PREFETCH_BATCH_SIZE):
+            batch = due[start:start + settings.WEATHER_PREFETCH_BATCH_SIZE]
+            coords = [geohash_decode(cell) for cell in batch]
+            try:
+                forecasts = self._fetch_forecasts(coords)
+            except Exception as e:
+                logger.error(f"Weather prefetch failed for {len(batch)} cells: {e}")
+                continue
+            values = {}
+            for cell, (lat, lon), weather in zip(batch, coords, forecasts):
+                weather["location"] = self.get_location_name(lat, lon)
+                values[f"weather:{cell}"] = weather
+            cache.mstore(values, ttl=settings.WEATHER_CACHE_TTL_SECONDS, stale_ttl=settings.WEATHER_STALE_TTL_SECONDS)
+            refreshed += len(values)
+
+        logger.info(f"Weather prefetch: {len(cells)} active cells, {len(due)} due, {refreshed} refreshed")
+        return {"active": len(cells), "due": len(due), "refreshed": refreshed}
+
+    def _fetch_forecasts(self, coords: List[Tuple[float, float]]) -> List[Dict]:
+        """Forecasts (without "location") for several points in one Open-Meteo call."""
+        response = _http_session().get(FORECAST_URL, params=self._forecast_params(coords), verify=False,
+                                       timeout=settings.WEATHER_DEADLINE_SECONDS)
+        response.raise_for_status()
+        data = response.json()
+        # A single location comes back as an object, several as a list in request order
+        return [self._parse_forecast(item) for item in (data if isinstance(data, list) else [data])]
+
+    def _forecast_params(self, coords: List[Tuple[float, float]]) -> Dict:
+        return {
+            "latitude": ",".join(f"{lat:.5f}" for lat, _ in coords),
+            "longitude": ",".join(f"{lon:.5f}" for _, lon in coords),
             "current_weather": "true",
             "daily": "weathercode,temperature_2m_max,temperature_2m_min",
             "timezone": "auto"
         }
 
+    def _mark_active(self, cell: str):
+        from app.core.cache import cache
+
+        # One write per cell and process per minute is plenty for an hour-long activity window
+        if self._marked.get(cell) is None:
+            self._marked.set(cell, True)
+            cache.zadd(ACTIVE_CELLS_KEY, {cell: time.time()})
+
+    def _with_location(self, weather: Dict, lat: float, lon: float) -> Dict:
+        """The weather entry, with a default location name replaced by a cached geocode of the point."""
+        from app.core.cache import cache
+
+        if weather.get("location") != DEFAULT_LOCATION_NAME:
+            return weather
+        location_name = cache.get(f"geocode:{geohash_encode(lat, lon, settings.GEOCODE_GEOHASH_PRECISION)}")
+        return {**weather, "location": location_name} if location_name else weather
+
+    def _location_result(self, geo_future, deadline: float) -> str:
+        grace = min(settings.WEATHER_GEOCODE_GRACE_SECONDS, max(0.0, deadline - time.monotonic()))
         try:
-            response = requests.get(url, params=params, timeout=5, verify=False)
-            response.raise_for_status()
-            data = response.json()
-            
-            current = data["current_weather"]
-            curr_temp = current["temperature"]
-            curr_code = current["weathercode"]
-            curr_condition = self._map_weather_code(curr_code)
-            
-            daily = data["daily"]
-            forecast = []
-            for i in range(1, 4):
-                forecast.append({
-                    "day": i,
-                    "max_temp": daily["temperature_2m_max"][i],
-                    "min_temp": daily["temperature_2m_min"][i],
-                    "condition": self._map_weather_code(daily["weathercode"][i])
-                })
-            
-            result = {
-                "temp": curr_temp,
-                "condition": curr_condition,
-                "location": location_name,
-                "description": f"Hiện tại {curr_condition.lower()}",
-                "forecast": forecast
-            }
-            
-            # 4. Save to Cache (TTL 20 mins)
-            cache.set(cache_key, result, ttl=1200)
-            return result
+            return geo_future.result(timeout=grace)
+        except FuturesTimeout:
+            logger.warning("Geocoding still running after the forecast. Using default location name.")
+        except Exception as e:
+            logger.warning(f"Geocoding failed: {e}")
+        return DEFAULT_LOCATION_NAME
+
+    def _parse_forecast(self, data: Dict) -> Dict:
+        """Open-Meteo forecast response -> weather dict (without "location")."""
+        current = data["current_weather"]
+        curr_temp = current["temperature"]
+        curr_code = current["weathercode"]
+        curr_condition = self._map_weather_code(curr_code)
+        
+        daily = data["daily"]
+        forecast = []
+        for i in range(1, 4):
+            forecast.append({
+                "day": i,
+                "max_temp": daily["temperature_2m_max"][i],
+                "min_temp": daily["temperature_2m_min"][i],
+                "condition": self._map_weather_code(daily["weathercode"][i])
+            })
+        
+        return {
+            "temp": curr_temp,
+            "condition": curr_condition,
+            "description": f"Hiện tại {curr_condition.lower()}",
+            "forecast": forecast
+        }
+
+    def get_location_name(self, lat: float, lon: float) -> str:
+        """
+        City-level name for a coordinate. Names are cached per geohash cell (GEOCODE_GEOHASH_PRECISION)
+        for GEOCODE_CACHE_TTL_SECONDS, far longer than forecasts; lookup failures are not cached.
+        """
+        from app.core.cache import cache
+
+        cell = geohash_encode(lat, lon, settings.GEOCODE_GEOHASH_PRECISION)
+        cache_key = f"geocode:{cell}"
+        location_name = cache.get(cache_key)
+        if location_name:
+            return location_name
+
+        cell_lat, cell_lon = geohash_decode(cell)
+        location_name = self._reverse_geocode(cell_lat, cell_lon)
+        if location_name:
+            cache.set(cache_key, location_name, ttl=settings.GEOCODE_CACHE_TTL_SECONDS)
+            return location_name
+        return DEFAULT_LOCATION_NAME
 
+    def _reverse_geocode(self, lat: float, lon: float):
+        try:
+            geo_url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&zoom=10&addressdetails=1"
+            geo_resp = _http_session().get(geo_url, timeout=settings.WEATHER_GEOCODE_TIMEOUT_SECONDS)
+            if geo_resp.ok:
+                geo_data = geo_resp.json()
+                address = geo_data.get("address", {})
+                return address.get("city") or address.get("town") or address.get("village") or address.get("province") or address.get("state")
         except Exception as e:
-            logger.error(f"Weather API Error: {e}")
-            return {
-                "temp": 25.0, 
-                "condition": "Trời quang", 
-                "location": location_name, 
-                "description": "Dữ liệu mẫu (mất kết nối)",
-                "forecast": []
-            }
+            logger.warning(f"Geocoding failed: {e}")
+        return None
 
     def _map_weather_code(self, code: int) -> str:
         if code <= 3: return "Trời quang"
@@ -125,6 +125,55 @@ class ApiClient {
         });
     }
 
+    /**
+     * Streams /recommend/stream (NDJSON). Calls onMessage for every line:
+     * {type: 'outfits', ...}, then {type: 'reason', index, reason} as each AI explanation arrives, then {type: 'done'}.
+     */
+    async streamRecommendations(params, onMessage) {
+        try {
+            const response = await fetch(`${API_BASE_URL}/recommend/stream`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    ...(this.accessToken ? { 'Authorization': `Bearer ${this.accessToken}` } : {})
+                },
+                body: JSON.stringify(params)
+            });
+
+            if (!response.ok || !response.body) {
+                const data = await response.json().catch(() => ({}));
+                return {
+                    success: false,
+                    error_code: data.error_code || `HTTP_${response.status}`,
+                    message: data.message || 'An unexpected error occurred',
+                    request_id: data.request_id
+                };
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let newline;
+                while ((newline = buffer.indexOf('\n')) >= 0) {
+                    const line = buffer.slice(0, newline).trim();
+                    buffer = buffer.slice(newline + 1);
+                    if (line) onMessage(JSON.parse(line));
+                }
+            }
+            return { success: true };
+        } catch (error) {
+            return {
+                success: false,
+                error_code: 'NETWORK_ERROR',
+                message: 'Cannot connect to the backend server.'
+            };
+        }
+    }
+
     async getMyItems() {
         return this.request('/items/me');
     }
@@ -138,10 +138,15 @@ async function runRecommendation() {
     };
 
     try {
-        const res = await api.getRecommendations(params);
-        if (res.success) {
-            renderOutfits(res.data.outfits);
-        } else {
+        // Outfits render as soon as scoring is done; Stylist AI reasons replace the placeholders as they arrive
+        const res = await api.streamRecommendations(params, (msg) => {
+            if (msg.type === 'outfits') {
+                renderOutfits(msg.outfits);
+            } else if (msg.type === 'reason') {
+                updateOutfitReason(msg.index, msg.reason);
+            }
+        });
+        if (!res.success) {
             showToast(res.message || "Lỗi lấy gợi ý", "error");
         }
     } catch (e) {
@@ -262,9 +267,9 @@ function renderOutfits(outfits) {
                 `).join('')}
             </div>
             <div class="outfit-footer">
-                <p class="explanation-text">
+                <p class="explanation-text" data-outfit-index="${idx}">
                     <ion-icon name="information-circle-outline"></ion-icon>
-                    ${o.reason || 'Sự kết hợp hoàn hảo.'}
+                    <span class="reason-text">${o.reason || 'Sự kết hợp hoàn hảo.'}</span>
                 </p>
                 ${renderBreakdown(o.breakdown)}
                 ${o.decision_status === 'LOW_CONFIDENCE' ? '<p class="text-warning" style="font-size:11px;"><ion-icon name="warning-outline"></ion-icon> AI chưa tin cậy 100%.</p>' : ''}
@@ -273,6 +278,11 @@ function renderOutfits(outfits) {
     `}).join('');
 }
 
+function updateOutfitReason(index, reason) {
+    const el = document.querySelector(`.explanation-text[data-outfit-index="${index}"] .reason-text`);
+    if (el && reason) el.textContent = reason;
+}
+
 async function updateWeather() {
     try {
         const res = await api.getWeather(10.7626, 106.6601);
@@ -60,3 +60,34 @@ def test_admin_task_inspection(client, db, mocker):
     response = client.get("/api/v1/admin/tasks/fake-uuid", headers=headers)
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["status"] == "SUCCESS"
+
+def test_admin_decision_metrics_endpoint(client, db, mocker):
+    from app.core.metrics import decision_metrics
+    hashed_pass = security.get_password_hash("adminpass")
+    admin_user = models.User(username="admin_decisions", email="ad@ex.com", hashed_password=hashed_pass, role=models.UserRole.ADMIN)
+    db.add(admin_user)
+    db.commit()
+
+    login_res = client.post("/api/v1/auth/login", data={"username": "admin_decisions", "password": "adminpass"})
+    token = login_res.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    decision_metrics.reset()
+    mocker.patch.object(decision_metrics, "sample_rate", 1.0)
+    breakdown = mocker.Mock(return_value={"breakdown": ["Base score: +20"]})
+    with decision_metrics.batch("recommendation"):
+        decision_metrics.record("recommendation", "SUCCESS", value=72, metadata=breakdown)
+        decision_metrics.record("recommendation", "SUCCESS", value=15)
+        # Nothing is merged until the batch is flushed
+        assert decision_metrics.snapshot()["counters"] == {}
+
+    response = client.get("/api/v1/admin/decision-metrics?reset=true", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["flushes"] == 1
+    assert data["counters"] == {"recommendation:SUCCESS": 2}
+    assert data["histograms"]["recommendation"]["<=80"] == 1
+    assert data["histograms"]["recommendation"]["<=20"] == 1
+    assert data["samples"][0]["metadata"] == {"breakdown": ["Base score: +20"]}
+    assert breakdown.call_count == 1
+    assert decision_metrics.snapshot()["counters"] == {}
@@ -19,3 +19,148 @@ def test_confidence_status_logic():
 
     assert get_status_logic(0.8) == ClassificationStatus.CONFIRMED
     assert get_status_logic(0.3) == ClassificationStatus.LOW_CONFIDENCE
+
+def _outfits():
+    from app.db import models
+    return [
+        {"items": [models.ClothingItem(id=i, category_label=f"Item {i}")], "score": 50 + i}
+        for i in range(1, 4)
+    ]
+
+@pytest.fixture
+def fresh_explanation_cache(mocker):
+    from app.core.cache import LocalCache
+    from app.services.explanation_cache import explanation_cache
+    explanation_cache.local.clear()
+    mocker.patch.object(explanation_cache, "backend", LocalCache())
+    return explanation_cache
+
+def test_parallel_explanations_respect_shared_deadline(mocker, fresh_explanation_cache):
+    """Slow LLM calls must not hold the request: they get the deterministic fallback."""
+    import time
+    from app.services.decision_engine import DecisionEngine
+    mocker.patch("app.core.config.settings.DEEPSEEK_API_KEY", "sk-test")
+    mocker.patch("app.core.config.settings.EXPLANATION_MODE", "parallel")
+
+    def fake_llm(items, weather, occasion, pct, event_name, timeout):
+        if items[0].id == 2:
+            time.sleep(1.0)
+        return f"AI {items[0].id}"
+
+    mocker.patch.object(DecisionEngine, "_request_llm_explanation", side_effect=fake_llm)
+    started = time.monotonic()
+    reasons = DecisionEngine.get_recommendation_explanations(_outfits(), {"temp": 25, "condition": "Nắng"}, "casual", deadline=0.3)
+
+    assert time.monotonic() - started < 0.9
+    assert reasons[0].endswith("Stylist AI: AI 1")
+    assert "Phân tích" in reasons[1]
+    assert reasons[2].endswith("Stylist AI: AI 3")
+
+def test_batched_explanations_single_round_trip(mocker, fresh_explanation_cache):
+    from app.services.decision_engine import DecisionEngine
+    mocker.patch("app.core.config.settings.DEEPSEEK_API_KEY", "sk-test")
+    mocker.patch("app.core.config.settings.EXPLANATION_MODE", "batched")
+    response = mocker.Mock(status_code=200)
+    response.json.return_value = {"choices": [{"message": {"content": '{"1": "Hợp trời nắng", "3": "Hơi nóng"}'}}]}
+    mock_post = mocker.patch("requests.post", return_value=response)
+
+    reasons = DecisionEngine.get_recommendation_explanations(_outfits(), {"temp": 30, "condition": "Nắng"}, "casual")
+
+    assert mock_post.call_count == 1
+    assert reasons[0] == "🎯 Độ phù hợp: 51/100 | ✨ Stylist AI: Hợp trời nắng"
+    assert "Phân tích" in reasons[1]
+    assert reasons[2] == "🎯 Độ phù hợp: 53/100 | ✨ Stylist AI: Hơi nóng"
+
+def test_explanation_cache_skips_repeat_llm_calls(mocker, fresh_explanation_cache):
+    from app.services.decision_engine import DecisionEngine
+    mocker.patch("app.core.config.settings.DEEPSEEK_API_KEY", "sk-test")
+    mocker.patch("app.core.config.settings.EXPLANATION_MODE", "parallel")
+    llm = mocker.patch.object(DecisionEngine, "_request_llm_explanation", return_value="Phối màu hài hòa")
+    weather = {"temp": 24.6, "condition": "Nắng"}
+
+    first = DecisionEngine.get_recommendation_explanations(_outfits(), weather, "casual", event_name="Họp team")
+    # Same outfits, same rounded temperature and event: served from cache
+    second = DecisionEngine.get_recommendation_explanations(_outfits(), {"temp": 25.2, "condition": "Nắng"}, "casual", event_name="Họp team")
+    assert first == second
+    assert llm.call_count == 3
+
+    # A different event is a different context
+    DecisionEngine.get_recommendation_explanations(_outfits()[:1], weather, "casual", event_name="Đi gym")
+    assert llm.call_count == 4
+
+    stats = fresh_explanation_cache.stats()
+    assert stats["hits"] >= 3
+    assert stats["local"]["size"] == 4
+
+def test_batched_classification_falls_back_per_image(mocker):
+    """A multi-image answer that does not line up with the images is retried image by image."""
+    from app.services import ai_service
+    mocker.patch("app.core.config.settings.DEEPSEEK_API_KEY", "sk-test")
+    mocker.patch.object(ai_service, "_vision_image_part", return_value={"type": "text", "text": "img"})
+    response = mocker.Mock(status_code=200)
+    response.json.return_value = {"choices": [{"message": {"content": '```json\n{"labels": ["TOP", "FOOTWEAR"]}\n```'}}]}
+    post = mocker.patch.object(ai_service.requests, "post", return_value=response)
+
+    assert [r["label"] for r in ai_service.classify_apparel_batch([b"a", b"b"])] == ["TOP", "FOOTWEAR"]
+    assert post.call_count == 1
+
+    single = mocker.patch.object(ai_service, "classify_apparel", return_value={"label": "BOTTOM", "confidence": 0.99})
+    assert [r["label"] for r in ai_service.classify_apparel_batch([b"a", b"b", b"c"])] == ["BOTTOM"] * 3
+    assert single.call_count == 3
+
+def test_color_palette_coverage():
+    """Dominant color and coverage come from opaque pixels only; shading merges into one color."""
+    import numpy as np
+    from PIL import Image
+    from app.services.color_palette import extract_palette, dominant_color
+    img = np.zeros((100, 100, 4), dtype=np.uint8)
+    img[:, :75, :3] = [30, 50, 120]
+    img[:40, :75, :3] = [36, 58, 128]  # Lighter shade of the same fabric
+    img[:, 75:, :3] = [230, 230, 230]
+    img[:, :, 3] = 255
+    img[:, 90:, 3] = 0  # Transparent background
+    palette = extract_palette(Image.fromarray(img))
+
+    assert len(palette) == 2
+    assert abs(palette[0]["coverage"] - 75 / 90) < 0.02 and abs(palette[1]["coverage"] - 15 / 90) < 0.02
+    assert palette[1]["hex"] == "#e6e6e6"
+    assert dominant_color(Image.fromarray(img)) == palette[0]["hex"]
+    assert dominant_color(Image.new("RGBA", (10, 10))) == "#000000"
+
+def test_background_removal_engine_warm_up_and_batching(mocker):
+    """The engine loads the configured model with its thread budget, warms up, and batches inference."""
+    import io
+    import numpy as np
+    from PIL import Image
+    from app.services.background_removal import BackgroundRemovalEngine
+
+    runs = []
+
+    class FakeSession:
+        def normalize(self, img, mean, std, size):
+            return {"input.1": np.zeros((1, 3) + size, dtype=np.float32)}
+
+        class inner_session:
+            @staticmethod
+            def run(outputs, feed):
+                batch = feed["input.1"]
+                runs.append(batch.shape[0])
+                return [np.random.rand(batch.shape[0], 1, 320, 320).astype(np.float32)]
+
+    new_session = mocker.patch("rembg.new_session", return_value=FakeSession())
+    engine = BackgroundRemovalEngine("u2netp", intra_op_threads=3, inter_op_threads=1)
+    assert engine.status()["state"] == "COLD"
+
+    assert engine.warm_up() and engine.status()["state"] == "READY"
+    assert new_session.call_args[0][0] == "u2netp"
+    assert new_session.call_args[1]["sess_opts"].intra_op_num_threads == 3
+
+    png = io.BytesIO()
+    Image.new("RGB", (800, 600), "red").save(png, format="PNG")
+    cutouts = engine.remove_batch([png.getvalue()] * 3)
+    assert runs == [1, 3]  # Warm-up, then one inference for the whole batch
+    assert all(Image.open(io.BytesIO(c)).mode == "RGBA" for c in cutouts)
+    assert Image.open(io.BytesIO(cutouts[0])).size == (640, 480)
+
+    with pytest.raises(ValueError):
+        BackgroundRemovalEngine("bria-rmbg")
@@ -49,3 +49,462 @@ def test_ai_deduplication_hit(mocker, db):
     assert new_item.status == "COMPLETED"
     assert new_item.category == FashionCategory.TOP
     mock_analyze.assert_not_called()
+
+def test_wardrobe_version_invalidates_recommendation_cache(mocker):
+    mocker.patch.object(cache, "client", None)
+    mocker.patch.object(cache, "_counters", {})
+    weather = {"temp": 25, "condition": "Clear"}
+
+    key_before = recommendation_engine._cache_key(7, models.OccasionEnum.CASUAL, weather)
+    assert key_before == recommendation_engine._cache_key(7, models.OccasionEnum.CASUAL, weather)
+
+    assert recommendation_engine.bump_wardrobe_version(7) == 1
+    key_after = recommendation_engine._cache_key(7, models.OccasionEnum.CASUAL, weather)
+    assert key_after != key_before
+    assert ":v1:" in key_after
+    # Other users keep their entries
+    assert ":v0:" in recommendation_engine._cache_key(8, models.OccasionEnum.CASUAL, weather)
+
+def test_memory_fallback_is_bounded_and_expires(mocker):
+    from app.core.cache import Cache, LocalCache
+    fallback = Cache()
+    fallback.client = None
+    fallback.local = LocalCache(max_entries=2)
+    clock = mocker.patch("app.core.cache.time.monotonic", return_value=1000.0)
+
+    fallback.set("a", {"v": 1}, ttl=10)
+    fallback.set("b", {"v": 2}, ttl=100)
+    assert fallback.get("a") == {"v": 1}
+    fallback.set("c", {"v": 3}, ttl=100)  # evicts "b", the least recently used
+    assert fallback.get("b") is None
+
+    clock.return_value = 1011.0
+    assert fallback.get("a") is None
+    assert fallback.get("c") == {"v": 3}
+    assert fallback.local.stats()["evictions"] == 1
+    assert fallback.local.stats()["expirations"] == 1
+
+def test_l1_tier_saves_redis_round_trips(mocker):
+    import json
+    from app.core.cache import Cache, LocalCache
+    l1_cache = Cache()
+    l1_cache.client = mocker.Mock()
+    l1_cache.client.get.return_value = json.dumps({"temp": 30})
+    l1_cache.local = LocalCache()
+
+    assert l1_cache.get("weather:abc") == {"temp": 30}
+    assert l1_cache.get("weather:abc") == {"temp": 30}
+    assert l1_cache.client.get.call_count == 1
+    # Keys outside CACHE_L1_PREFIXES always go to Redis
+    l1_cache.get("rec:1")
+    l1_cache.get("rec:1")
+    assert l1_cache.client.get.call_count == 3
+
+def _memory_cache():
+    from app.core.cache import Cache, LocalCache
+    memory = Cache()
+    memory.client = None
+    memory.local = LocalCache()
+    return memory
+
+def test_get_or_compute_coalesces_concurrent_misses():
+    import threading
+    import time
+    memory = _memory_cache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"temp": 31}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(memory.get_or_compute("weather:x", compute, ttl=60)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"temp": 31}] * 8
+    assert memory.get_or_compute("weather:x", compute, ttl=60) == {"temp": 31}
+    assert len(calls) == 1
+
+def test_get_or_compute_serves_stale_while_revalidating(mocker):
+    import time
+    memory = _memory_cache()
+    memory.get_or_compute("weather:y", lambda: {"temp": 20}, ttl=60, stale_ttl=600)
+
+    later = time.time() + 120  # past the fresh window, inside the stale one
+    mocker.patch("app.core.cache.time.time", return_value=later)
+    submit = mocker.patch("app.core.cache._refresh_executor").return_value.submit
+    assert memory.get_or_compute("weather:y", lambda: {"temp": 25}, ttl=60, stale_ttl=600) == {"temp": 20}
+    assert submit.call_count == 1
+
+    submit.call_args.args[0]()  # run the queued refresh inline
+    assert memory.get("weather:y")["value"] == {"temp": 25}
+
+def test_get_or_compute_waits_for_other_worker_lock(mocker):
+    import json
+    from app.core.cache import Cache, LocalCache
+    shared = Cache()
+    shared.local = LocalCache()
+    shared.client = mocker.Mock()
+    shared.client.set.return_value = False  # SET NX lost: another worker is computing
+    shared.client.get.side_effect = [None, json.dumps({"temp": 18})]
+    mocker.patch("app.core.cache.time.sleep")
+    compute = mocker.Mock(return_value={"temp": 99})
+
+    assert shared.get_or_compute("weather:z", compute, ttl=60) == {"temp": 18}
+    compute.assert_not_called()
+
+def _fake_upstream(url, **kwargs):
+    from unittest.mock import Mock
+    if "nominatim" in url:
+        return Mock(ok=True, json=Mock(return_value={"address": {"city": "Hà Nội"}}))
+    daily = {"weathercode": [0, 1, 2, 3], "temperature_2m_max": [30] * 4, "temperature_2m_min": [22] * 4}
+    return Mock(json=Mock(return_value={"current_weather": {"temperature": 28.0, "weathercode": 1}, "daily": daily}))
+
+def test_weather_cache_shared_by_nearby_coordinates(mocker):
+    from app.services.weather_service import WeatherService
+    memory = _memory_cache()
+    mocker.patch("app.core.cache.cache", memory)
+    upstream = mocker.patch("app.services.weather_service._http_session").return_value.get
+    upstream.side_effect = _fake_upstream
+    service = WeatherService("key")
+
+    first = service.get_current_weather(21.02851, 105.85422)
+    # A few metres away (GPS jitter): same geohash cell, no upstream call
+    second = service.get_current_weather(21.02853, 105.85419)
+    assert first == second and first["location"] == "Hà Nội"
+    assert upstream.call_count == 2
+
+    # Forecast expired: only the forecast is refetched, the city name comes from its own cache
+    from app.core.geo import geohash_encode
+    memory.delete(f"weather:{geohash_encode(21.02851, 105.85422, 5)}")
+    service.get_current_weather(21.02851, 105.85422)
+    assert [c.args[0] for c in upstream.call_args_list].count("https://api.open-meteo.com/v1/forecast") == 2
+    assert sum("nominatim" in c.args[0] for c in upstream.call_args_list) == 1
+
+def test_slow_geocoder_does_not_delay_forecast(mocker):
+    import threading
+    import time
+    from app.services.weather_service import WeatherService, DEFAULT_LOCATION_NAME
+    memory = _memory_cache()
+    mocker.patch("app.core.cache.cache", memory)
+    release = threading.Event()
+
+    def slow_upstream(url, **kwargs):
+        if "nominatim" in url:
+            release.wait(5)
+        return _fake_upstream(url, **kwargs)
+
+    upstream = mocker.patch("app.services.weather_service._http_session").return_value.get
+    upstream.side_effect = slow_upstream
+    service = WeatherService("key")
+    started = time.perf_counter()
+    weather = service.get_current_weather(16.0544, 108.2022)
+
+    assert time.perf_counter() - started < 1.0
+    assert weather["temp"] == 28.0 and weather["location"] == DEFAULT_LOCATION_NAME
+    release.set()
+
+    # The late answer lands in the geocode cache; the cached forecast picks it up on the next read
+    from app.core.geo import geohash_encode
+    for _ in range(50):
+        if memory.get(f"geocode:{geohash_encode(16.0544, 108.2022, 5)}"):
+            break
+        time.sleep(0.02)
+    assert service.get_current_weather(16.0544, 108.2022)["location"] == "Hà Nội"
+    assert upstream.call_count == 2
+
+def test_prefetch_refreshes_active_cells_in_one_multi_location_call(mocker):
+    import time
+    from app.core.geo import geohash_encode
+    from app.services.weather_service import WeatherService, ACTIVE_CELLS_KEY
+    memory = _memory_cache()
+    mocker.patch("app.core.cache.cache", memory)
+    hanoi, hue, saigon, idle = (geohash_encode(lat, lon, 5) for lat, lon in
+                                [(21.03, 105.85), (16.46, 107.59), (10.78, 106.70), (12.24, 109.19)])
+    memory.zadd(ACTIVE_CELLS_KEY, {hanoi: time.time(), hue: time.time(), saigon: time.time(),
+                                   idle: time.time() - 2 * 3600})  # idle: outside the activity window
+    memory.mstore({f"weather:{saigon}": {"temp": 31}}, ttl=1200, stale_ttl=600)  # still fresh for 20 min
+    memory.set(f"geocode:{hanoi}", "Hà Nội")
+    memory.set(f"geocode:{hue}", "Huế")
+
+    daily = {"weathercode": [0, 1, 2, 3], "temperature_2m_max": [30] * 4, "temperature_2m_min": [22] * 4}
+    forecast = {"current_weather": {"temperature": 27.0, "weathercode": 61}, "daily": daily}
+    session_get = mocker.patch("app.services.weather_service._http_session").return_value.get
+    session_get.return_value.json.return_value = [forecast, forecast]
+
+    assert WeatherService("key").prefetch_active_cells() == {"active": 3, "due": 2, "refreshed": 2}
+    assert session_get.call_count == 1
+    assert session_get.call_args.kwargs["params"]["latitude"].count(",") == 1
+    assert memory.get(f"weather:{hanoi}")["value"]["location"] == "Hà Nội"
+    assert memory.get(f"weather:{hue}")["value"]["condition"] == "Mưa lớn"
+    assert idle not in memory.zrangebyscore(ACTIVE_CELLS_KEY, 0)
+
+def test_codec_compresses_large_payloads_and_reads_legacy_json():
+    from app.core.serialization import CacheCodec, COMPRESSED_BIT
+    codec = CacheCodec(serializer="json", compress_min_bytes=256)
+    recs = [{"items": [1, 2, 3], "score": 88, "reason": "🎯 Độ phù hợp: 88/100 | ✨ Stylist AI: Phối đồ thanh lịch " * 5}] * 5
+
+    small = codec.encode({"temp": 30})
+    large = codec.encode(recs)
+    assert not small[0] & COMPRESSED_BIT
+    assert large[0] & COMPRESSED_BIT
+    assert len(large) < len(codec.encode(recs, compress=False))
+    assert codec.decode(large) == recs
+    assert codec.decode('{"temp": 30}') == {"temp": 30}  # written before the codec existed
+
+def test_mget_uses_one_pipelined_round_trip(mocker):
+    from app.core.cache import Cache, LocalCache
+    pipelined = Cache()
+    pipelined.local = LocalCache()
+    pipelined.client = mocker.Mock()
+    pipe = pipelined.client.pipeline.return_value
+    pipe.execute.return_value = [pipelined.codec.encode("a"), None, pipelined.codec.encode({"b": 2})]
+
+    assert pipelined.mget(["k1", "k2", "k3"]) == ["a", None, {"b": 2}]
+    assert pipe.execute.call_count == 1
+    pipelined.client.get.assert_not_called()
+    assert pipelined.stats()["operations"]["mget"]["keys"] == 3
+
+async def test_async_cache_shares_keys_and_codec_with_sync_cache(mocker):
+    from app.core.cache import AsyncCache, Cache, LocalCache
+    store = {}
+
+    async def fake_setex(key, ttl, data):
+        store[key] = data
+
+    async def fake_get(key):
+        return store.get(key)
+
+    client = mocker.AsyncMock()
+    client.setex.side_effect = fake_setex
+    client.get.side_effect = fake_get
+    sync = Cache()
+    sync.local = LocalCache()
+    sync.client = mocker.Mock()
+    sync.client.get.side_effect = lambda key: store.get(key)
+    async_side = AsyncCache(sync)
+    assert await async_side.connect(client)
+
+    await async_side.set("rec:1:v0:casual", [{"items": [1, 2, 3], "reason": "Hợp thời tiết"}], ttl=60)
+    assert sync.get("rec:1:v0:casual") == [{"items": [1, 2, 3], "reason": "Hợp thời tiết"}]
+    assert await async_side.get("rec:1:v0:casual") == [{"items": [1, 2, 3], "reason": "Hợp thời tiết"}]
+    assert "async_set" in sync.stats()["operations"]
+
+async def test_async_mget_checks_l1_like_sync_mget(mocker):
+    from app.core.cache import AsyncCache, Cache, LocalCache
+    sync = Cache()
+    sync.local = LocalCache()
+    sync.local.set("weather:w3gvk", sync.codec.encode({"temp": 30}))
+    client = mocker.AsyncMock()
+    client.mget.return_value = [sync.codec.encode("rec"), sync.codec.encode({"temp": 27})]
+    async_side = AsyncCache(sync)
+    async_side.client = client
+
+    assert await async_side.mget(["weather:w3gvk", "rec:1", "weather:w3gvm"]) == [{"temp": 30}, "rec", {"temp": 27}]
+    client.mget.assert_awaited_once_with(["rec:1", "weather:w3gvm"])
+    # The Redis answer for the weather key now serves both clients from L1
+    assert sync.mget(["weather:w3gvm"]) == [{"temp": 27}]
+    assert sync.stats()["operations"]["async_mget"]["keys"] == 2
+
+def test_near_duplicate_reuses_analysis(mocker, db):
+    """A resized, recompressed re-upload matches by perceptual hash and skips classification."""
+    import io
+    import numpy as np
+    from PIL import Image
+    from app.core.image_hash import dhash, hamming, perceptual_hash_columns
+    from app.core.metrics import decision_metrics
+
+    rng = np.random.default_rng(7)
+    photo = Image.fromarray(rng.integers(0, 255, (12, 16, 3), dtype=np.uint8)).resize((640, 480), Image.Resampling.BICUBIC)
+    original, copy = io.BytesIO(), io.BytesIO()
+    photo.save(original, format="PNG")
+    photo.resize((320, 240)).save(copy, format="JPEG", quality=70)
+    assert hamming(dhash(original.getvalue()), dhash(copy.getvalue())) <= 3
+
+    user = models.User(username="phash_user", email="phash@test.com")
+    other = models.User(username="phash_other", email="phash_other@test.com")
+    db.add_all([user, other])
+    db.commit()
+    existing = models.ClothingItem(user_id=user.id, image_hash="sha-a", status="COMPLETED", category=FashionCategory.BOTTOM,
+                                   category_raw="BOTTOM", confidence_score=0.99, category_label="Quần jean",
+                                   occasion=models.OccasionEnum.CASUAL, raw_model_output={"label": "BOTTOM", "confidence": 0.99},
+                                   **perceptual_hash_columns(dhash(original.getvalue())))
+    new_item = models.ClothingItem(user_id=user.id, image_hash="sha-b", status="QUEUED",
+                                   **perceptual_hash_columns(dhash(copy.getvalue())))
+    # Another user's near-identical photo is never reused
+    foreign = models.ClothingItem(user_id=other.id, image_hash="sha-c", status="QUEUED",
+                                  **perceptual_hash_columns(dhash(copy.getvalue())))
+    db.add_all([existing, new_item, foreign])
+    db.commit()
+
+    def fake_analyze(image_bytes, classification=None):
+        if classification is None:
+            raise ValueError("no AI in tests")
+        return {"processed_image_path": "copy.png", "color_hex": "#224488", "palette": [],
+                "category_raw": classification["label"], "confidence": classification["confidence"], "raw_output": classification}
+
+    mock_analyze = mocker.patch("app.services.tasks.analyze_image", side_effect=fake_analyze)
+    enhance = mocker.patch("app.services.tasks.enhance_classification_with_llm")
+    decision_metrics.reset()
+    process_clothing_ai(new_item.id, "00", db=db)
+    process_clothing_ai(foreign.id, "00", db=db)
+
+    db.refresh(new_item)
+    db.refresh(foreign)
+    assert new_item.status == "COMPLETED" and new_item.category == FashionCategory.BOTTOM
+    assert new_item.category_label == "Quần jean" and new_item.processed_image_path == "copy.png"
+    assert foreign.status == "FAILED"
+    assert mock_analyze.call_count == 2
+    enhance.assert_not_called()
+    assert decision_metrics.rates("deduplication", ("exact", "near")) == {
+        "counts": {"near": 1, "miss": 1}, "total": 2, "hit_rate": 0.5}
+
+def test_near_duplicate_of_other_color_gets_own_cutout_and_color(mocker, db, tmp_path):
+    """dHash ignores color: a same-outline shirt in another color reuses only the classification."""
+    import io
+    from PIL import Image, ImageDraw
+    from app.core.image_hash import dhash, hamming, perceptual_hash_columns
+
+    def shirt(color):
+        img = Image.new("RGB", (480, 480), (200, 200, 190))
+        ImageDraw.Draw(img).polygon([(160, 80), (320, 80), (420, 160), (370, 210), (340, 180), (340, 420),
+                                     (140, 420), (140, 180), (110, 210), (60, 160)], fill=color)
+        buffered = io.BytesIO()
+        img.save(buffered, format="PNG")
+        return buffered.getvalue()
+
+    black, red = shirt((20, 20, 20)), shirt((200, 30, 30))
+    assert hamming(dhash(black), dhash(red)) <= 3
+
+    user = models.User(username="closet_user", email="closet@test.com")
+    db.add(user)
+    db.commit()
+    black_item = models.ClothingItem(user_id=user.id, image_hash="sha-black", status="QUEUED", **perceptual_hash_columns(dhash(black)))
+    red_item = models.ClothingItem(user_id=user.id, image_hash="sha-red", status="QUEUED", **perceptual_hash_columns(dhash(red)))
+    db.add_all([black_item, red_item])
+    db.commit()
+
+    def fake_analyze(image_bytes, classification=None):
+        name, color = ("black", "#141414") if image_bytes == black else ("red", "#c81e1e")
+        classification = classification or {"label": "TOP", "confidence": 0.97}
+        return {"processed_image_path": str(tmp_path / f"{name}.png"), "color_hex": color, "palette": [],
+                "category_raw": classification["label"], "confidence": classification["confidence"], "raw_output": classification}
+
+    analyze = mocker.patch("app.services.tasks.analyze_image", side_effect=fake_analyze)
+    enhance = mocker.patch("app.services.tasks.enhance_classification_with_llm", return_value={"occasion": "formal", "style_tag": "Áo sơ mi"})
+    process_clothing_ai(black_item.id, black.hex(), db=db)
+    process_clothing_ai(red_item.id, red.hex(), db=db)
+
+    db.refresh(black_item)
+    db.refresh(red_item)
+    assert analyze.call_count == 2
+    assert analyze.call_args.kwargs["classification"]["label"] == "TOP"
+    assert enhance.call_count == 1
+    assert red_item.category == FashionCategory.TOP and red_item.category_label == "Áo sơ mi"
+    assert red_item.main_color_hex == "#c81e1e" and red_item.processed_image_path.endswith("red.png")
+    assert black_item.main_color_hex == "#141414"
+    # Each image keeps its own stored analysis, the near hit is not linked to the other one
+    assert red_item.analysis_id != black_item.analysis_id
+    assert db.get(models.ImageAnalysis, red_item.analysis_id).color_hex == "#c81e1e"
+
+def test_analysis_store_shared_across_users_and_rerun(mocker, db, tmp_path):
+    """One analysis per image content serves every uploader; a pipeline version bump re-runs it."""
+    from app.core.metrics import decision_metrics
+    from app.services.analysis_store import analysis_store
+    from app.services.tasks import reanalyze_stale_analyses
+
+    alice = models.User(username="store_alice", email="alice@test.com")
+    bob = models.User(username="store_bob", email="bob@test.com")
+    db.add_all([alice, bob])
+    db.commit()
+    original = tmp_path / "shirt.jpg"
+    original.write_bytes(b"shirt")
+    first = models.ClothingItem(user_id=alice.id, image_hash="sha-shirt", original_image_path=str(original), status="QUEUED")
+    second = models.ClothingItem(user_id=bob.id, image_hash="sha-shirt", status="QUEUED")
+    db.add_all([first, second])
+    db.commit()
+
+    def results(label):
+        return {"processed_image_path": str(tmp_path / f"{label}.png"), "color_hex": "#123456", "palette": [],
+                "category_raw": label, "confidence": 0.95, "raw_output": {"label": label}}
+
+    analyze = mocker.patch("app.services.tasks.analyze_image", return_value=results("TOP"))
+    mocker.patch("app.services.tasks.enhance_classification_with_llm", return_value={"occasion": "formal", "style_tag": "Áo sơ mi"})
+    decision_metrics.reset()
+    process_clothing_ai(first.id, "00", db=db)
+    process_clothing_ai(second.id, "00", db=db)
+
+    db.refresh(first)
+    db.refresh(second)
+    assert analyze.call_count == 1
+    assert second.status == "COMPLETED" and second.analysis_id == first.analysis_id is not None
+    assert second.category == FashionCategory.TOP and second.category_label == "Áo sơ mi"
+    assert analysis_store.stats(db)["counts"] == {"miss": 1, "hit": 1}
+
+    # New model: the stored analysis goes stale and is re-run from the original upload
+    mocker.patch("app.core.config.settings.AI_PIPELINE_VERSION", "2")
+    mocker.patch("app.services.tasks.analyze_images", return_value=[results("OUTERWEAR")])
+    mocker.patch("app.services.tasks.enhance_classifications_with_llm",
+                 return_value=[{"occasion": "casual", "style_tag": "Áo khoác"}])
+    assert reanalyze_stale_analyses(db=db) == {"stale": 1, "refreshed": 1, "dropped": 0, "failed": 0}
+
+    db.refresh(first)
+    db.refresh(second)
+    assert first.category == second.category == FashionCategory.OUTERWEAR
+    assert second.category_label == "Áo khoác"
+    assert analysis_store.stats(db)["stale"] == 0
+
+def test_upload_refreshing_stale_analysis_updates_linked_items_and_backfills_legacy(mocker, db, tmp_path):
+    """A stale entry recomputed by an upload refreshes every item using it; legacy hits are stored."""
+    from app.services.analysis_store import analysis_store
+    from app.services.tasks import process_clothing_ai
+
+    alice = models.User(username="stale_alice", email="stale_alice@test.com")
+    bob = models.User(username="stale_bob", email="stale_bob@test.com")
+    db.add_all([alice, bob])
+    db.commit()
+    old_cutout = tmp_path / "old.png"
+    old_cutout.write_bytes(b"old")
+    stale = models.ImageAnalysis(image_hash="sha-coat", pipeline_version="0/u2net", processed_image_path=str(old_cutout),
+                                 color_hex="#000000", palette=[], category_raw="TOP", confidence=0.9, raw_output={})
+    db.add(stale)
+    db.commit()
+    linked = models.ClothingItem(user_id=alice.id, image_hash="sha-coat", status="COMPLETED", analysis_id=stale.id,
+                                 category=FashionCategory.TOP, processed_image_path=str(old_cutout))
+    upload = models.ClothingItem(user_id=bob.id, image_hash="sha-coat", status="QUEUED")
+    db.add_all([linked, upload])
+    db.commit()
+
+    mocker.patch("app.services.tasks.analyze_image", return_value={
+        "processed_image_path": str(tmp_path / "new.png"), "color_hex": "#654321", "palette": [],
+        "category_raw": "OUTERWEAR", "confidence": 0.95, "raw_output": {"label": "OUTERWEAR"}})
+    mocker.patch("app.services.tasks.enhance_classification_with_llm", return_value={"occasion": "casual", "style_tag": "Áo khoác"})
+    process_clothing_ai(upload.id, "00", db=db)
+
+    db.refresh(linked)
+    db.refresh(upload)
+    assert upload.analysis_id == linked.analysis_id == stale.id
+    assert linked.category == FashionCategory.OUTERWEAR and linked.main_color_hex == "#654321"
+    assert analysis_store.get(db, "sha-coat").pipeline_version == analysis_store.current_version()
+    assert not old_cutout.exists()
+
+    # A completed item from before the store is copied once, then served from the store
+    legacy = models.ClothingItem(user_id=alice.id, image_hash="sha-legacy", status="COMPLETED", category=FashionCategory.BOTTOM,
+                                 category_raw="BOTTOM", confidence_score=0.99, processed_image_path="legacy.png",
+                                 main_color_hex="#333333", raw_model_output={"label": "BOTTOM", "palette": []})
+    copy = models.ClothingItem(user_id=bob.id, image_hash="sha-legacy", status="QUEUED")
+    db.add_all([legacy, copy])
+    db.commit()
+    process_clothing_ai(copy.id, "00", db=db)
+
+    db.refresh(legacy)
+    db.refresh(copy)
+    assert copy.status == "COMPLETED" and copy.category == FashionCategory.BOTTOM
+    assert copy.analysis_id == legacy.analysis_id is not None
+    assert analysis_store.lookup(db, "sha-legacy").color_hex == "#333333"
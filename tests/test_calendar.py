@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+import datetime
+import pytest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from app.db import models
+
+# Credentials that are valid without a refresh, so no call ever leaves the fake server
+TOKEN_JSON = json.dumps({"token": "fake-access", "refresh_token": "fake-refresh", "client_id": "cid",
+                         "client_secret": "secret", "expiry": "2099-01-01T00:00:00Z"})
+
+EVENTS = {"items": [{"id": "evt1", "summary": "Họp team",
+                     "start": {"dateTime": "2026-10-20T09:00:00+07:00"},
+                     "end": {"dateTime": "2026-10-20T10:00:00+07:00"}}]}
+
+
+@pytest.fixture
+def fake_google(mocker):
+    """Local HTTP server standing in for the Google Calendar API."""
+    state = {"delay": 0.0, "paths": [], "changes": [], "status": 200}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["paths"].append(self.path)
+            time.sleep(state["delay"])
+            if "syncToken=" in self.path:
+                status, payload = state["status"], {"items": state["changes"], "nextSyncToken": "sync-2"}
+            else:
+                status, payload = 200, {**EVENTS, "nextSyncToken": "sync-1"}
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    mocker.patch("app.core.config.settings.GOOGLE_CALENDAR_API_ENDPOINT", f"http://127.0.0.1:{server.server_port}/")
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+async def test_async_client_fetches_day_events_from_fake_server(fake_google):
+    from app.services.calendar_service import calendar_client
+    events, new_token = await calendar_client.get_events_for_day(TOKEN_JSON, datetime.date(2026, 10, 20))
+
+    assert new_token is None
+    assert [e["id"] for e in events] == ["evt1"]
+    assert events[0]["occasion"] == models.OccasionEnum.FORMAL
+    assert fake_google["paths"][0].startswith("/calendars/primary/events?")
+
+
+def test_slow_calendar_returns_504_without_blocking(client, db, mocker, fake_google):
+    from app.core import security
+    mocker.patch("app.core.config.settings.CALENDAR_TIMEOUT_SECONDS", 0.2)
+    fake_google["delay"] = 1.0
+
+    user = models.User(username="cal_user", email="cal@ex.com", hashed_password=security.get_password_hash("pass"),
+                       google_token=TOKEN_JSON)
+    db.add(user)
+    db.commit()
+    token = client.post("/api/v1/auth/login", data={"username": "cal_user", "password": "pass"}).json()["access_token"]
+
+    started = time.perf_counter()
+    response = client.get("/api/v1/calendar/events/month?year=2026&month=10", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 504
+    assert response.json()["error_code"] == "CALENDAR_TIMEOUT"
+    assert time.perf_counter() - started < 1.0
+
+
+def test_service_cached_per_token_fingerprint_and_refreshed_when_expired(mocker):
+    from app.services.calendar_service import CalendarService
+    service_cache = CalendarService()
+    build = mocker.spy(service_cache, "_build_calendar")
+
+    first, new_token = service_cache.get_calendar_service(TOKEN_JSON)
+    again, _ = service_cache.get_calendar_service(TOKEN_JSON)
+    assert first is again and new_token is None
+    assert build.call_count == 1
+
+    # Same grant with an expired access token: the cached entry is refreshed, not rebuilt
+    expired = json.dumps({**json.loads(TOKEN_JSON), "token": "old-access", "expiry": "2000-01-01T00:00:00Z"})
+    entry = service_cache._services.get(service_cache._fingerprint(json.loads(expired)))
+    entry.creds.expiry = datetime.datetime(2000, 1, 1)
+
+    def fake_refresh(request):
+        entry.creds.token = "new-access"
+        entry.creds.expiry = datetime.datetime(2099, 1, 1)
+
+    mocker.patch.object(type(entry.creds), "refresh", side_effect=fake_refresh, autospec=False)
+    refreshed, new_token = service_cache.get_calendar_service(expired)
+    assert refreshed is first
+    assert json.loads(new_token)["token"] == "new-access"
+    assert build.call_count == 1
+
+
+def test_event_store_syncs_incrementally_and_serves_ranges_locally(db, fake_google):
+    from app.services.calendar_store import calendar_event_store
+    user = models.User(username="sync_user", email="sync@ex.com", hashed_password="x", google_token=TOKEN_JSON)
+    db.add(user)
+    db.commit()
+
+    assert calendar_event_store.sync(db, user)
+    state = db.get(models.CalendarSyncState, user.id)
+    assert state.sync_token == "sync-1"
+    events = calendar_event_store.get_events_for_day(db, user.id, datetime.date(2026, 10, 20))
+    assert [e["id"] for e in events] == ["evt1"]
+    assert calendar_event_store.get_events_for_month(db, user.id, 2026, 11) == []
+
+    # Within the sync interval nothing is fetched
+    assert not calendar_event_store.sync(db, user)
+    assert len(fake_google["paths"]) == 1
+
+    # Next sync sends the token and applies only the changes: one new event, one cancellation
+    fake_google["changes"] = [
+        {"id": "evt2", "summary": "Đi gym", "start": {"dateTime": "2026-10-21T07:00:00Z"}, "end": {"dateTime": "2026-10-21T08:00:00Z"}},
+        {"id": "evt1", "status": "cancelled"},
+    ]
+    assert calendar_event_store.sync(db, user, force=True)
+    assert "syncToken=sync-1" in fake_google["paths"][-1]
+    assert db.get(models.CalendarSyncState, user.id).sync_token == "sync-2"
+    month = calendar_event_store.get_events_for_month(db, user.id, 2026, 10)
+    assert [e["id"] for e in month] == ["evt2"]
+    assert month[0]["occasion"] == models.OccasionEnum.SPORT
+
+
+def test_event_store_full_resync_when_sync_token_expires(db, fake_google):
+    from app.services.calendar_store import calendar_event_store
+    user = models.User(username="gone_user", email="gone@ex.com", hashed_password="x", google_token=TOKEN_JSON)
+    db.add(user)
+    db.commit()
+    db.add(models.CalendarEvent(user_id=user.id, event_id="stale", start_at=datetime.datetime(2026, 10, 20),
+                                end_at=datetime.datetime(2026, 10, 20, 1), raw={"id": "stale"}))
+    db.add(models.CalendarSyncState(user_id=user.id, sync_token="expired", last_synced_at=datetime.datetime(2000, 1, 1)))
+    db.commit()
+    fake_google["status"] = 410
+
+    assert calendar_event_store.sync(db, user)
+    assert db.get(models.CalendarSyncState, user.id).sync_token == "sync-1"
+    assert calendar_event_store.get_event(db, user.id, "stale") is None
+    assert calendar_event_store.get_event(db, user.id, "evt1")["summary"] == "Họp team"
+
+
+def test_occasion_matcher_diacritics_rule_order_and_memoization(mocker):
+    import unicodedata
+    from app.services.occasion_matcher import OccasionMatcher
+    matcher = OccasionMatcher()
+
+    assert matcher.match("Họp team") == models.OccasionEnum.FORMAL
+    assert matcher.match("hop doi tac") == models.OccasionEnum.FORMAL
+    assert matcher.match("ĐÁ BÓNG cuối tuần") == models.OccasionEnum.SPORT
+    assert matcher.match("Họp xong đi tập gym") == models.OccasionEnum.SPORT  # sport is listed first
+    assert matcher.match("Software update") == models.OccasionEnum.CASUAL  # "date" only at a word start
+    assert matcher.match("") == models.OccasionEnum.CASUAL
+    # Accented summaries keep their diacritics: distinct words must not collide once folded
+    assert matcher.match("Ăn chay cùng gia đình") == models.OccasionEnum.CASUAL  # "chay" is not "chạy"
+    assert matcher.match("Mua hộp quà") == models.OccasionEnum.CASUAL  # "hộp" is not "họp"
+    assert matcher.match("Đi chợ tạp hóa") == models.OccasionEnum.CASUAL  # "tạp" is not "tập"
+    assert matcher.match(unicodedata.normalize("NFD", "Họp team")) == models.OccasionEnum.FORMAL
+
+    custom = OccasionMatcher(rules={"formal": ["hội thảo"], "sport": ["bơi"]})
+    assert custom.match("Hoi thao AI") == models.OccasionEnum.FORMAL
+
+    match = mocker.spy(matcher, "match")
+    event = {"id": "e1", "etag": '"v1"', "summary": "Yoga sáng"}
+    assert matcher.classify_event(event) == models.OccasionEnum.SPORT
+    assert matcher.classify_event(dict(event)) == models.OccasionEnum.SPORT
+    assert match.call_count == 1
+    assert matcher.classify_event({**event, "etag": '"v2"', "summary": "Phỏng vấn"}) == models.OccasionEnum.FORMAL
+    assert match.call_count == 2
@@ -19,3 +19,12 @@ def test_version_endpoint_unauthenticated(client):
     assert data["service_name"] == "Outfit AI Backend"
     assert "api_version" in data
     assert "build_time" in data
+
+def test_readiness_reports_background_removal(client, mocker):
+    """Uploads depend on the background removal model: warming or failed means DEGRADED."""
+    from app.services.background_removal import bg_engine
+    mocker.patch.object(bg_engine, "state", "WARMING")
+    data = client.get("/api/v1/admin/readiness").json()
+    assert data["status"] == "DEGRADED"
+    assert data["background_removal"] == "WARMING"
+    assert data["background_removal_model"] == bg_engine.model_name
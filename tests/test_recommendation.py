@@ -39,3 +39,185 @@ def test_low_confidence_penalty(engine):
     result_low = engine._evaluate_outfit([item_low], weather, "casual")
     
     assert result_low["score"] < result_confirmed["score"]
+
+def _random_wardrobe(seed, sizes=(6, 5, 4, 3)):
+    import random
+    from app.domain.fashion_taxonomy import ClassificationStatus
+    rng = random.Random(seed)
+    labels = ["T-shirt", "Denim jacket", "Wool coat", "Sneakers", "Chinos", ""]
+    statuses = [ClassificationStatus.CONFIRMED, ClassificationStatus.CONFIRMED,
+                ClassificationStatus.LOW_CONFIDENCE, ClassificationStatus.UNKNOWN]
+    categories = [FashionCategory.TOP, FashionCategory.BOTTOM, FashionCategory.FOOTWEAR, FashionCategory.OUTERWEAR]
+    groups, next_id = [], 1
+    for category, size in zip(categories, sizes):
+        group = []
+        for _ in range(size):
+            group.append(models.ClothingItem(
+                id=next_id,
+                category=category,
+                category_label=rng.choice(labels),
+                main_color_hex=rng.choice(["#FFFFFF", "#101010", "#808080", None]),
+                occasion=rng.choice(list(models.OccasionEnum)),
+                classification_status=rng.choice(statuses),
+                confidence_score=rng.choice([None, 0.55, 0.9, 0.99]),
+            ))
+            next_id += 1
+        groups.append(group)
+    return groups
+
+def _pick(source, accept):
+    picks, used = [], set()
+    for finder, limit in ((source.best, 3), (source.worst, 5)):
+        while len(picks) < limit:
+            c = finder(used, accept)
+            if c is None:
+                break
+            picks.append((c["score"], sorted(i.id for i in c["items"])))
+            used.update(i.id for i in c["items"])
+    return picks
+
+@pytest.mark.parametrize("temp", [10, 22, 27, 31, 37])
+def test_outfit_search_matches_full_enumeration(engine, temp):
+    """Branch-and-bound must select exactly what scoring every combination selects."""
+    from app.services.outfit_search import OutfitSearch, RankedCandidates
+    from app.services.decision_engine import DecisionEngine
+
+    weather = {"temp": temp, "condition": "Clear"}
+    accept = lambda items: DecisionEngine.validate_outfit_safety(items, weather)["status"] != "REJECTED"
+    for seed in range(8):
+        tops, bottoms, shoes, outers = _random_wardrobe(seed)
+        occasion = models.OccasionEnum.CASUAL
+        candidates = []
+        for t in tops:
+            for b in bottoms:
+                for s in shoes:
+                    candidates.append(engine._evaluate_outfit([t, b, s], weather, occasion))
+                    for o in outers:
+                        candidates.append(engine._evaluate_outfit([t, b, s, o], weather, occasion))
+
+        search = OutfitSearch(engine, weather, occasion, tops=tops, bottoms=bottoms, shoes=shoes, outerwear=outers)
+        assert _pick(search, accept) == _pick(RankedCandidates(candidates), accept)
+        assert search.leaves_scored < len(candidates)
+
+@pytest.mark.parametrize("temp", [10, 22, 27, 31, 37])
+def test_vectorized_backend_matches_scalar_scoring(engine, temp):
+    """The NumPy backend must reproduce _evaluate_outfit scores and the same selection."""
+    from app.services.outfit_search import RankedCandidates
+    from app.services.vectorized_scoring import VectorizedOutfitScorer
+    from app.services.decision_engine import DecisionEngine
+
+    weather = {"temp": temp, "condition": "Clear"}
+    accept = lambda items: DecisionEngine.validate_outfit_safety(items, weather)["status"] != "REJECTED"
+    for seed in range(8):
+        tops, bottoms, shoes, outers = _random_wardrobe(seed)
+        occasion = models.OccasionEnum.FORMAL
+        candidates = []
+        for t in tops:
+            for b in bottoms:
+                for s in shoes:
+                    candidates.append(engine._evaluate_outfit([t, b, s], weather, occasion))
+                    for o in outers:
+                        candidates.append(engine._evaluate_outfit([t, b, s, o], weather, occasion))
+
+        scorer = VectorizedOutfitScorer(engine, weather, occasion, tops=tops, bottoms=bottoms, shoes=shoes, outerwear=outers)
+        assert scorer.combinations == len(candidates)
+        assert scorer.scores[3][1, 2, 3, 0] == engine._evaluate_outfit([tops[1], bottoms[2], shoes[3]], weather, occasion)["score"]
+        assert _pick(scorer, accept) == _pick(RankedCandidates(candidates), accept)
+
+def test_recommend_stream_sends_outfits_before_reasons(client, db, mocker):
+    """The NDJSON stream sends ranked outfits with fallback reasons first, then AI reasons."""
+    import json
+    from app.core import security
+    from app.core.cache import cache
+    from app.domain.fashion_taxonomy import ClassificationStatus
+    from app.services.decision_engine import DecisionEngine
+
+    user = models.User(username="stream_user", email="stream@ex.com", hashed_password=security.get_password_hash("pass"))
+    db.add(user)
+    db.commit()
+    for category, label in [(FashionCategory.TOP, "Áo thun"), (FashionCategory.BOTTOM, "Quần jean"), (FashionCategory.FOOTWEAR, "Giày")]:
+        db.add(models.ClothingItem(user_id=user.id, category=category, category_label=label, status="COMPLETED",
+                                   classification_status=ClassificationStatus.CONFIRMED, confidence_score=0.99,
+                                   occasion=models.OccasionEnum.CASUAL, main_color_hex="#FFFFFF"))
+    db.commit()
+
+    mocker.patch.object(cache, "get", return_value=None)
+    mock_set = mocker.patch.object(cache, "set", return_value=True)
+    mocker.patch.object(DecisionEngine, "_llm_enabled", return_value=True)
+    mocker.patch.object(DecisionEngine, "_request_llm_explanation", return_value="Rất hợp")
+
+    token = client.post("/api/v1/auth/login", data={"username": "stream_user", "password": "pass"}).json()["access_token"]
+    response = client.post("/api/v1/recommend/stream", json={"lat": 10.0, "lon": 106.0},
+                           headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    assert [line["type"] for line in lines] == ["outfits", "reason", "done"]
+    assert "Phân tích" in lines[0]["outfits"][0]["reason"]
+    assert lines[1]["index"] == 0
+    assert lines[1]["reason"].endswith("Stylist AI: Rất hợp")
+    # Final reasons are cached once the stream completes
+    rec_sets = [c for c in mock_set.call_args_list if c.args[0].startswith("rec:")]
+    assert rec_sets and rec_sets[0].args[1][0]["reason"].endswith("Rất hợp")
+
+def test_cache_hit_hydrates_items_in_one_query(engine, db, mocker):
+    """Cached recommendations are rebuilt with a single bulk query; a deleted item forces a recompute."""
+    from app.core import security
+    user = models.User(username="cache_hit_user", email="cachehit@ex.com", hashed_password=security.get_password_hash("pass"))
+    db.add(user)
+    db.commit()
+    items = [models.ClothingItem(user_id=user.id, category=FashionCategory.TOP, category_label="Áo thun") for _ in range(6)]
+    db.add_all(items)
+    db.commit()
+    ids = [i.id for i in items]
+    cached = [{"items": ids[k:k + 3], "score": 80, "reason": "cached", "decision_status": "CONFIRMED"} for k in (0, 3)]
+
+    query_spy = mocker.spy(db, "query")
+    recs = engine._hydrate_cached(db, user.id, cached)
+    assert query_spy.call_count == 1
+    assert [[i.id for i in r["items"]] for r in recs] == [ids[0:3], ids[3:6]]
+
+    db.delete(items[4])
+    db.commit()
+    assert engine._hydrate_cached(db, user.id, cached) is None
+
+def test_nightly_plan_serves_matching_recommendation(db, mocker):
+    """Plans are stored per context and served while the wardrobe and weather still match."""
+    import datetime
+    from app.services.outfit_planner import outfit_planner
+    from app.services.recommendation_engine import recommendation_engine
+    from app.services.weather_service import WeatherUnavailable, weather_service
+    user = models.User(username="plan_user", email="plan@ex.com", last_location_cell="w3gvk",
+                       last_active_at=datetime.datetime.utcnow())
+    db.add(user)
+    db.commit()
+    items = [models.ClothingItem(user_id=user.id, category=c, category_label="x")
+             for c in (FashionCategory.TOP, FashionCategory.BOTTOM, FashionCategory.FOOTWEAR)]
+    db.add_all(items)
+    db.commit()
+    planned = [{"items": [i.id for i in items], "score": 90, "reason": "planned", "decision_status": "CONFIRMED"}]
+    plan = mocker.patch.object(recommendation_engine, "plan", return_value=planned)
+    mocker.patch.object(recommendation_engine, "wardrobe_version", return_value=3)
+    forecast = mocker.patch.object(weather_service, "get_forecast", side_effect=WeatherUnavailable("Hà Nội"))
+
+    # No real forecast: nothing is planned against placeholder weather
+    today = outfit_planner.local_today()
+    assert user.id in outfit_planner.active_user_ids(db)
+    assert outfit_planner.plan_user(db, user, today) == 0
+    plan.assert_not_called()
+
+    forecast.side_effect, forecast.return_value = None, {"temp": 25, "condition": "Clear", "forecast": []}
+    assert outfit_planner.plan_user(db, user, today) == 3  # casual, formal, sport
+    assert plan.call_args_list[0].args[2] == {"temp": 25, "condition": "Clear"}
+    weather_service.get_current_weather.assert_not_called()  # Planning does not mark cells active
+
+    compute = mocker.spy(recommendation_engine, "_compute_recommendations")
+    recs = recommendation_engine.recommend(db, user.id, {"temp": 27, "condition": "Clear"}, models.OccasionEnum.FORMAL)
+    assert recs[0]["reason"] == "planned" and [i.id for i in recs[0]["items"]] == planned[0]["items"]
+    compute.assert_not_called()
+
+    # Too far from the forecast, or the wardrobe changed since planning: no plan
+    assert outfit_planner.lookup(db, user.id, models.OccasionEnum.FORMAL, {"temp": 33, "condition": "Clear"}) is None
+    mocker.patch.object(recommendation_engine, "wardrobe_version", return_value=4)
+    assert outfit_planner.lookup(db, user.id, models.OccasionEnum.FORMAL, {"temp": 25, "condition": "Clear"}) is None
@@ -106,3 +106,42 @@ def test_task_api_retryable_logic(client, db, mocker):
     # Case 2
     res2 = client.get("/api/v1/items/task/logic-task-1", headers=headers)
     assert res2.json()["retryable"] is False
+
+def test_batch_ingestion_groups_stages(mocker, db, tmp_path):
+    """Bulk uploads are analyzed in one batched call per stage, with per-item results."""
+    from app.core.metrics import decision_metrics
+    from app.services.tasks import process_clothing_batch
+    user = models.User(username="batch_user", email="batch@test.com")
+    db.add(user)
+    db.commit()
+
+    items = []
+    for i in range(3):
+        path = tmp_path / f"item{i}.jpg"
+        path.write_bytes(b"img%d" % i)
+        items.append(models.ClothingItem(user_id=user.id, original_image_path=str(path), status="QUEUED"))
+    items.append(models.ClothingItem(user_id=user.id, original_image_path=str(tmp_path / "missing.jpg"), status="QUEUED"))
+    db.add_all(items)
+    db.commit()
+
+    def fake_analyze(images, classifications=None):
+        return [{"error": "Unreadable image"} if image == b"img1" else {
+            "processed_image_path": "proc.png", "color_hex": "#123456",
+            "category_raw": "TOP", "confidence": 0.95, "raw_output": {}
+        } for image in images]
+
+    analyze = mocker.patch("app.services.tasks.analyze_images", side_effect=fake_analyze)
+    enhance = mocker.patch("app.services.tasks.enhance_classifications_with_llm",
+                           side_effect=lambda pairs: [{"occasion": "formal", "style_tag": "Áo đẹp"}] * len(pairs))
+    decision_metrics.reset()
+
+    result = process_clothing_batch([item.id for item in items], db=db)
+
+    assert analyze.call_count == 1 and len(analyze.call_args[0][0]) == 3
+    assert enhance.call_count == 1 and len(enhance.call_args[0][0]) == 2
+    assert result == {"status": "COMPLETED", "completed": 2, "deduplicated": 0, "failed": 2}
+    for item in items:
+        db.refresh(item)
+    assert [item.status for item in items] == ["COMPLETED", "FAILED", "COMPLETED", "FAILED"]
+    assert items[0].category == FashionCategory.TOP and items[0].category_label == "Áo đẹp"
+    assert "enhancement_batch" in decision_metrics.snapshot()["histograms"]